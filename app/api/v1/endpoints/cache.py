@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.api import deps
+from app.core.cache import cache
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.user import User
+
+router = APIRouter()
+logger = get_logger(__name__)
+
+
+@router.get("/namespaces")
+async def get_cache_namespaces(
+    current_user: User = Depends(deps.get_current_superuser),
+):
+    """
+    Generación vigente de cada namespace del caché (solo admin)
+    """
+    logger.info(f"Admin {current_user.username} checking cache namespaces")
+    return cache.get_generations()
+
+
+@router.post("/namespaces/{namespace}/invalidate")
+async def invalidate_cache_namespace(
+    namespace: str,
+    current_user: User = Depends(deps.get_current_superuser),
+):
+    """
+    Invalida todas las llaves de un namespace subiendo su generación (solo
+    admin). No borra llaves: las anteriores expiran con su TTL
+    """
+    if namespace not in settings.CACHE_NAMESPACES:
+        raise HTTPException(
+            status_code=404, detail=f"Unknown cache namespace: {namespace}"
+        )
+
+    generation = await cache.ainvalidate_namespace(namespace)
+    if generation is None:
+        raise HTTPException(status_code=503, detail="Cache temporarily unavailable")
+
+    logger.info(
+        f"Admin {current_user.username} invalidated cache namespace {namespace}"
+    )
+    return {"namespace": namespace, "generation": generation}
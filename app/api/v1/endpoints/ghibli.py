@@ -1,6 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 
 from app.api import deps
+from app.core.config import settings
 from app.core.logging import get_logger
 from app.models.user import User
 from app.services.ghibli import GhibliService
@@ -9,21 +13,213 @@ router = APIRouter()
 logger = get_logger(__name__)
 
 
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Compara If-None-Match con el ETag (comparación débil, RFC 9110)
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in [c.removeprefix("W/") for c in candidates]
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> List[str]:
+    """
+    Codificaciones pre-comprimidas aceptadas por el cliente, ordenadas por
+    su q-value y luego por la preferencia configurada
+    """
+    if not accept_encoding:
+        return []
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[coding.strip().lower()] = quality
+
+    preferred = settings.GHIBLI_RESPONSE_ENCODINGS
+    ranked = [
+        (weights.get(coding, weights.get("*", 0.0)), -position, coding)
+        for position, coding in enumerate(preferred)
+    ]
+    return [coding for quality, _, coding in sorted(ranked, reverse=True) if quality]
+
+
 @router.get("/")
-async def get_ghibli_data(current_user: User = Depends(deps.get_current_active_user)):
+async def get_ghibli_data(
+    response: Response,
+    resource: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=settings.PAGINATION_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    current_user: User = Depends(deps.get_current_active_user),
+):
     """
     Obtiene datos de Studio Ghibli API según el rol del usuario
+    Soporta paginación (limit/cursor), proyección de campos (fields=id,title)
+    y expansión de relaciones (expand=people)
+    Responde 304 si If-None-Match coincide con el ETag del dataset cacheado
+    La respuesta por defecto se sirve en la variante pre-comprimida
+    (br/gzip) que acepte el cliente
     """
     logger.info(
         f"Fetching Ghibli data for user: {current_user.username} with role: {current_user.role}"
     )
 
+    params = {"limit": limit, "cursor": cursor, "fields": fields, "expand": expand}
+    default_route = all(value is None for value in params.values())
+    encodings = accepted_encodings(accept_encoding) if default_route else []
+    cache_headers = {
+        "Cache-Control": f"private, max-age={settings.GHIBLI_RESPONSE_MAX_AGE}",
+        "Vary": "Authorization, Accept-Encoding",
+    }
+
     try:
-        data = GhibliService.get_data_by_role(current_user.role)
+        etag = await GhibliService.aget_response_etag(
+            current_user.role, resource, **params
+        )
+        if etag and etag_matches(if_none_match, etag):
+            # Mismo ETag que el 200: débil si se serviría una variante comprimida
+            encoding = await GhibliService.aget_response_encoding(
+                current_user.role, resource, encodings
+            )
+            return Response(
+                status_code=304,
+                headers={"ETag": f"W/{etag}" if encoding else etag, **cache_headers},
+            )
+
+        # Respuesta por defecto: bytes ya serializados (y comprimidos al
+        # refrescar), sin decode/encode ni compresión por request
+        if default_route:
+            cached = await GhibliService.aget_response_body(
+                current_user.role,
+                resource,
+                encodings,
+                # Si hay ETag, el refresco (XFetch) ya se decidió al calcularlo
+                revalidate=etag is None,
+            )
+            if cached is not None:
+                body, encoding = cached
+                headers = dict(cache_headers)
+                if encoding:
+                    headers["Content-Encoding"] = encoding
+                if etag:
+                    # La variante comprimida no es idéntica byte a byte: ETag débil
+                    headers["ETag"] = f"W/{etag}" if encoding else etag
+                return Response(
+                    content=body, media_type="application/json", headers=headers
+                )
+
+        data = await GhibliService.aquery_data(
+            current_user.role, resource=resource, revalidate=etag is None, **params
+        )
+
+        etag = etag or await GhibliService.aget_response_etag(
+            current_user.role, resource, revalidate=False, **params
+        )
+        if etag:
+            response.headers["ETag"] = etag
+        response.headers.update(cache_headers)
         return data
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching Ghibli data: {str(e)}")
-        raise HTTPException(
-            status_code=500, 
-            detail="Error fetching Ghibli data"
-        )
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Error fetching Ghibli data")
+
+
+@router.get("/snapshots")
+async def get_snapshot_status(
+    current_user: User = Depends(deps.get_current_superuser),
+):
+    """
+    Muestra qué tan frescos están los snapshots en disco (solo admin)
+    """
+    logger.info(f"Admin {current_user.username} checking Ghibli snapshots")
+    return GhibliService.get_snapshot_status()
+
+
+@router.get("/export")
+async def export_ghibli_data(
+    format: Literal["ndjson"] = "ndjson",
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Exporta en streaming (NDJSON, un registro por línea) los datos de
+    Studio Ghibli visibles para el rol, sin armar la respuesta en memoria
+    """
+    logger.info(f"Exporting Ghibli data for user: {current_user.username}")
+    return StreamingResponse(
+        GhibliService.export_ndjson(current_user.role),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "private, no-store", "Vary": "Authorization"},
+    )
+
+
+@router.get("/diagnostics")
+async def get_upstream_diagnostics(
+    current_user: User = Depends(deps.get_current_superuser),
+):
+    """
+    Estado de los circuit breakers de la API de Ghibli y del caché, con el
+    hit ratio de cada nivel (solo admin)
+    """
+    logger.info(f"Admin {current_user.username} checking Ghibli diagnostics")
+    return GhibliService.get_upstream_status()
+
+
+@router.get("/search")
+async def search_ghibli_data(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=settings.PAGINATION_MAX_LIMIT),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Busca por texto en los datos de Studio Ghibli visibles para el rol
+    """
+    logger.info(f"Searching Ghibli data for user: {current_user.username}")
+    return await GhibliService.asearch(current_user.role, q, limit)
+
+
+@router.get("/{resource}/changes")
+async def get_ghibli_changes(
+    resource: str,
+    since: int = Query(0, ge=0),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Cambios de un recurso desde la versión `since`: registros agregados,
+    modificados y los ids eliminados, junto con la versión actual
+    """
+    logger.info(
+        f"Fetching Ghibli {resource} changes since {since} for user: "
+        f"{current_user.username}"
+    )
+    return await GhibliService.aget_changes(current_user.role, resource, since)
+
+
+@router.get("/{resource}/{entity_id}")
+async def get_ghibli_entity(
+    resource: str,
+    entity_id: str,
+    expand: Optional[str] = None,
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Obtiene un registro de Studio Ghibli por id, con el mismo control por rol
+    """
+    logger.info(
+        f"Fetching Ghibli {resource}/{entity_id} for user: {current_user.username}"
+    )
+    return await GhibliService.aget_entity(
+        current_user.role, resource, entity_id, expand=expand
+    )
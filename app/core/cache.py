@@ -1,16 +1,430 @@
+import asyncio
+import gzip
+import hashlib
 import json
-from typing import Any, Optional
+import math
+import random
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
 
 import redis
+import redis.asyncio
 from redis.exceptions import ConnectionError, RedisError
 
+from app.core import metrics
 from app.core.config import settings
 from app.core.logging import get_logger
 
+# Dependencias opcionales del codec
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
 logger = get_logger(__name__)
 
 
+# Libera el lock solo si el token coincide con el del dueño
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Renueva la expiración de los cuerpos pre-serializados sin reescribirlos:
+# solo se sobreescribe el prefijo de ancho fijo con el nuevo soft_expires_at.
+# Un cuerpo cuyo prefijo no tiene ese ancho (formato anterior) se borra
+TOUCH_BODIES_SCRIPT = """
+local touched = 0
+local width = string.len(ARGV[1])
+for _, key in ipairs(KEYS) do
+    if redis.call('getrange', key, width, width) == '\\n' then
+        redis.call('setrange', key, 0, ARGV[1])
+        redis.call('expire', key, ARGV[2])
+        touched = touched + 1
+    else
+        redis.call('del', key)
+    end
+end
+return touched
+"""
+
+# Prefijo de los cuerpos con ancho fijo (30 bytes + "\n"): soft_expires_at y
+# el costo de recalcular la entrada, para decidir el refresco sin leerla
+BODY_HEADER_FORMAT = b"%017.6f %012.6f\n"
+BODY_MAX_COMPUTE_SECONDS = 99999.0
+
+
+def compute_etag(value: Any) -> str:
+    """
+    ETag fuerte derivado del contenido (JSON canónico)
+    """
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.sha256(canonical.encode()).hexdigest()[:32] + '"'
+
+
+def render_json(value: Any) -> bytes:
+    """
+    Serializa igual que JSONResponse de Starlette (cuerpo final de la respuesta)
+    """
+    return json.dumps(
+        value,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+# Content-Encoding de las variantes pre-comprimidas de los cuerpos de respuesta.
+# Se comprime al máximo nivel porque ocurre una vez por refresco, no por request
+BODY_ENCODERS = {"gzip": lambda body: gzip.compress(body, compresslevel=9, mtime=0)}
+if brotli is not None:
+    BODY_ENCODERS["br"] = lambda body: brotli.compress(body, quality=11)
+
+
+def compress_body_variants(body: bytes, encodings, min_size: int) -> Dict[str, bytes]:
+    """
+    Genera las variantes comprimidas de un cuerpo para las codificaciones
+    disponibles (solo si el cuerpo es suficientemente grande)
+    """
+    if len(body) < min_size:
+        return {}
+    return {
+        encoding: BODY_ENCODERS[encoding](body)
+        for encoding in encodings
+        if encoding in BODY_ENCODERS
+    }
+
+
+class Codec:
+    """
+    Serializador de valores del caché; `id` se guarda en la cabecera
+    """
+
+    id = 0
+    name = ""
+
+    def dumps(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    id = 1
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(Codec):
+    id = 2
+    name = "orjson"
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec(Codec):
+    id = 3
+    name = "msgpack"
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+CODECS = {codec.id: codec for codec in (JsonCodec(), OrjsonCodec(), MsgpackCodec())}
+CODEC_AVAILABLE = {
+    "json": True,
+    "orjson": orjson is not None,
+    "msgpack": msgpack is not None,
+}
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+COMPRESSIONS = {
+    "none": COMPRESSION_NONE,
+    "zlib": COMPRESSION_ZLIB,
+    "zstd": COMPRESSION_ZSTD,
+}
+
+
+class CacheSerializer:
+    """
+    Formato auto-descriptivo de los valores en Redis:
+
+        b"\x00GC" + version + codec_id + compression_id + payload
+
+    Los valores sin la cabecera son entradas JSON en texto del formato
+    anterior y se siguen pudiendo leer durante un despliegue.
+    """
+
+    MAGIC = b"\x00GC"
+    VERSION = 1
+    HEADER_SIZE = len(MAGIC) + 3
+
+    def __init__(self, codec: str, compression: str, threshold: int):
+        if codec == "auto":
+            codec = "orjson" if CODEC_AVAILABLE["orjson"] else "json"
+        if not CODEC_AVAILABLE.get(codec, False):
+            logger.warning(f"Cache codec {codec} not available, using json")
+            codec = "json"
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard not installed, using zlib compression")
+            compression = "zlib"
+
+        self.codec = next(c for c in CODECS.values() if c.name == codec)
+        self.compression = COMPRESSIONS[compression]
+        self.threshold = threshold
+
+    def encode(self, value: Any) -> Tuple[bytes, int]:
+        """
+        Codifica un valor; retorna (bytes a guardar, tamaño sin comprimir)
+        """
+        payload = self.codec.dumps(value)
+        raw_size = len(payload)
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and raw_size >= self.threshold:
+            compression = self.compression
+            if compression == COMPRESSION_ZSTD:
+                payload = zstandard.ZstdCompressor().compress(payload)
+            else:
+                payload = zlib.compress(payload)
+        header = self.MAGIC + bytes((self.VERSION, self.codec.id, compression))
+        return header + payload, raw_size
+
+    def dumps(self, value: Any) -> bytes:
+        return self.encode(value)[0]
+
+    def loads(self, data: bytes) -> Any:
+        """
+        Decodifica un valor; lanza ValueError si está corrupto
+        """
+        if not data.startswith(self.MAGIC):
+            return json.loads(data)
+
+        try:
+            codec_id, compression = data[len(self.MAGIC) + 1], data[len(self.MAGIC) + 2]
+            payload = data[self.HEADER_SIZE :]
+            if compression == COMPRESSION_ZLIB:
+                payload = zlib.decompress(payload)
+            elif compression == COMPRESSION_ZSTD:
+                if zstandard is None:
+                    raise ValueError("zstandard is required to read this value")
+                payload = zstandard.ZstdDecompressor().decompress(payload)
+            return CODECS[codec_id].loads(payload)
+        except (KeyError, IndexError, zlib.error) as e:
+            raise ValueError(f"Invalid cache value: {str(e)}") from e
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Invalid cache value: {str(e)}") from e
+
+
+# Llave de Redis con la generación de cada namespace (`ns:ghibli`)
+GENERATION_KEY_PREFIX = "ns:"
+
+# Incrementa la generación y avisa a los demás workers en un solo round trip
+BUMP_GENERATION_SCRIPT = """
+local generation = redis.call("incr", KEYS[1])
+redis.call("publish", ARGV[1], ARGV[2] .. generation)
+return generation
+"""
+
+# Llaves derivadas que pertenecen al namespace de la llave que acompañan
+DERIVED_KEY_KINDS = ("meta", "body")
+
+
+def key_namespace(key: str) -> Optional[str]:
+    """
+    Namespace configurado al que pertenece una llave (`ghibli:/films`,
+    `meta:ghibli:/films` y `body:ghibli:/films:gzip` -> `ghibli`)
+    """
+    head, _, rest = key.partition(":")
+    if head in DERIVED_KEY_KINDS:
+        head = rest.partition(":")[0]
+    return head if head in settings.CACHE_NAMESPACES else None
+
+
+def key_prefix(key: str) -> str:
+    """
+    Prefijo de una llave para agrupar métricas (`ghibli:/films` -> `ghibli`)
+    """
+    return key.split(":", 1)[0]
+
+
+def xfetch_due(soft_expires_at: float, compute_seconds: float, beta: float) -> bool:
+    """
+    Expiración anticipada probabilística (XFetch): decide refrescar antes
+    de la expiración suave, con probabilidad que crece a medida que se
+    acerca y escala con el costo de recalcular (compute_seconds * beta).
+    Así los lectores no refrescan todos en el mismo instante
+    """
+    if beta <= 0 or compute_seconds <= 0:
+        return False
+    # 1 - random() está en (0, 1], así el log nunca es infinito
+    gap = -compute_seconds * beta * math.log(1.0 - random.random())
+    return time.time() + gap >= soft_expires_at
+
+
+@dataclass
+class CacheEntry:
+    """
+    Valor cacheado junto con sus tiempos de expiración suave y dura y lo que
+    costó calcularlo (para la expiración anticipada)
+    """
+
+    value: Any
+    soft_expires_at: float
+    hard_expires_at: float
+    meta: Dict[str, Any] = field(default_factory=dict)
+    compute_seconds: float = 0.0
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() >= self.soft_expires_at
+
+    def refresh_early(self, beta: float) -> bool:
+        return xfetch_due(self.soft_expires_at, self.compute_seconds, beta)
+
+    def header(self) -> Dict[str, Any]:
+        """
+        Todo menos el valor: se guarda en `meta:<key>` para poder extender la
+        entrada sin volver a codificar el payload
+        """
+        data = self.to_dict()
+        del data["value"]
+        return data
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "value": self.value,
+            "soft_expires_at": self.soft_expires_at,
+            "hard_expires_at": self.hard_expires_at,
+            "meta": self.meta,
+            "compute_seconds": self.compute_seconds,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CacheEntry":
+        return cls(
+            value=data["value"],
+            soft_expires_at=data["soft_expires_at"],
+            hard_expires_at=data["hard_expires_at"],
+            meta=dict(data.get("meta") or {}),
+            compute_seconds=data.get("compute_seconds", 0.0),
+        )
+
+
+@dataclass
+class CachedBody:
+    """
+    Cuerpo JSON pre-serializado con lo que guarda su prefijo: la expiración
+    suave y el costo de la entrada de la que sale
+    """
+
+    body: bytes
+    soft_expires_at: float
+    compute_seconds: float = 0.0
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() >= self.soft_expires_at
+
+    def refresh_early(self, beta: float) -> bool:
+        return xfetch_due(self.soft_expires_at, self.compute_seconds, beta)
+
+
+class LocalCache:
+    """
+    Caché LRU con TTL en memoria del worker (L1)
+
+    Guarda los valores ya deserializados: quien los lee no debe mutarlos.
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int = None) -> None:
+        ttl = min(ttl or self.ttl, self.ttl)
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
 class RedisCache:
+    """
+    Caché en Redis con un L1 en memoria por worker
+
+    Las operaciones (con prefijo `a`: aget, aset_entry, ...) usan redis.asyncio
+    sobre un pool compartido para no bloquear el event loop. El cliente
+    síncrono solo se usa para conectar, la reconexión en segundo plano y el
+    listener de invalidaciones, que corren fuera del event loop.
+    """
+
     _instance = None
     _is_connected = False
 
@@ -22,109 +436,1047 @@ class RedisCache:
     def __init__(self):
         if not hasattr(self, "initialized"):
             self.redis_client = None
+            # Un solo pool para todo el worker: si se agota, se espera hasta
+            # REDIS_POOL_TIMEOUT en vez de abrir conexiones sin límite
+            self.async_client = redis.asyncio.Redis(
+                connection_pool=redis.asyncio.BlockingConnectionPool(
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    db=0,
+                    max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+                    timeout=settings.REDIS_POOL_TIMEOUT,
+                    socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                )
+            )
             self.default_ttl = settings.REDIS_TTL
+            self.serializer = CacheSerializer(
+                settings.CACHE_CODEC,
+                settings.CACHE_COMPRESSION,
+                settings.CACHE_COMPRESSION_THRESHOLD,
+            )
+            self.local = (
+                LocalCache(settings.CACHE_L1_MAX_ENTRIES, settings.CACHE_L1_TTL)
+                if settings.CACHE_L1_ENABLED
+                else None
+            )
+            # Identifica a este worker en los mensajes de invalidación
+            self.instance_id = uuid.uuid4().hex
+            self._pubsub_thread = None
+            # Generación vigente de cada namespace (se recarga al conectar y
+            # se actualiza por pub/sub)
+            self.generations: Dict[str, int] = {}
+            self.stats = {
+                "l1": {"hits": 0, "misses": 0},
+                "l2": {"hits": 0, "misses": 0},
+            }
+            # Estado de salud: mientras Redis está caído, is_available()
+            # responde desde memoria y un thread reintenta la conexión
+            self._down_since: Optional[float] = None
+            self._reconnect_attempts = 0
+            self._next_reconnect_at: Optional[float] = None
+            self._reconnect_thread: Optional[threading.Thread] = None
+            self._reconnect_stop = threading.Event()
+            self._health_lock = threading.Lock()
             self.initialized = True
             self._connect()
+            if not self._is_connected:
+                self._mark_down()
 
     def _connect(self) -> None:
         """
         Intenta establecer conexión con Redis
         """
         try:
+            # Sin decode_responses: los valores se guardan como bytes del codec
             self.redis_client = redis.Redis(
                 host=settings.REDIS_HOST,
                 port=settings.REDIS_PORT,
                 db=0,
-                decode_responses=True,
-                socket_connect_timeout=1,
-                socket_timeout=1,
+                socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
             )
             # Verificar conexión
             self.redis_client.ping()
+            self._load_generations()
             self._is_connected = True
             logger.info("Successfully connected to Redis")
+            self._start_invalidation_listener()
         except (ConnectionError, RedisError) as e:
             self._is_connected = False
             logger.warning(f"Could not connect to Redis: {str(e)}")
             self.redis_client = None
 
-    def is_available(self) -> bool:
+    def _load_generations(self) -> None:
+        """
+        Lee de Redis la generación de cada namespace (la fuente de verdad)
+        """
+        namespaces = list(settings.CACHE_NAMESPACES)
+        values = self.redis_client.mget(
+            [GENERATION_KEY_PREFIX + namespace for namespace in namespaces]
+        )
+        self.generations = {
+            namespace: int(value or 0) for namespace, value in zip(namespaces, values)
+        }
+
+    def _physical_key(self, key: str) -> str:
+        """
+        Llave real en Redis y en el L1: se intercala la generación del
+        namespace (`ghibli:/films` -> `ghibli:g3:/films`); en la generación 0
+        la llave no cambia
+        """
+        namespace = key_namespace(key)
+        generation = self.generations.get(namespace, 0) if namespace else 0
+        if not generation:
+            return key
+        head, _, rest = key.partition(f"{namespace}:")
+        return f"{head}{namespace}:g{generation}:{rest}"
+
+    def _start_invalidation_listener(self) -> None:
+        """
+        Se suscribe al canal de invalidación para mantener coherentes el L1 y
+        las generaciones de los namespaces
+        """
+        if self._pubsub_thread is not None:
+            return
+
+        try:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(
+                **{settings.CACHE_INVALIDATION_CHANNEL: self._on_invalidation}
+            )
+            self._pubsub_thread = pubsub.run_in_thread(
+                sleep_time=1,
+                daemon=True,
+                exception_handler=self._on_listener_error,
+            )
+            # Lo escrito mientras no había suscripción pudo quedar obsoleto
+            if self.local is not None:
+                self.local.clear()
+        except (ConnectionError, RedisError) as e:
+            logger.warning(f"Could not subscribe to cache invalidations: {str(e)}")
+
+    def _on_listener_error(self, error, pubsub, thread) -> None:
+        """
+        Si se pierde la suscripción, el L1 deja de ser confiable y se vacía
+        """
+        logger.error(f"Cache invalidation listener stopped: {str(error)}")
+        thread.stop()
+        pubsub.close()
+        self._pubsub_thread = None
+        self._mark_down()
+        if self.local is not None:
+            self.local.clear()
+
+    def _on_invalidation(self, message: Dict[str, Any]) -> None:
         """
-        Verifica si Redis está disponible
+        Aplica una invalidación publicada por otro worker: una llave del L1 o
+        la nueva generación de un namespace
         """
-        if not self._is_connected:
+        data = message["data"]
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        origin, _, key = data.partition(":")
+        if origin == self.instance_id:
+            return
+        if key.startswith(GENERATION_KEY_PREFIX):
+            namespace, _, generation = key[len(GENERATION_KEY_PREFIX) :].rpartition(":")
+            self.generations[namespace] = int(generation)
+            logger.info(f"Cache namespace {namespace} moved to generation {generation}")
+            return
+        if self.local is None:
+            return
+        if key == "*":
+            self.local.clear()
+        else:
+            self.local.delete(key)
+
+    def _invalidation_message(self, key: str) -> str:
+        return f"{self.instance_id}:{key}"
+
+    def _mark_down(self) -> None:
+        """
+        Marca Redis como caído y arranca la reconexión en segundo plano
+        Las llamadas siguientes no vuelven a intentar conectar en el request
+        """
+        with self._health_lock:
+            self._is_connected = False
+            if self._down_since is None:
+                self._down_since = time.time()
+                logger.warning("Redis marked as down, serving without cache")
+            if self._reconnect_stop.is_set() or (
+                self._reconnect_thread is not None and self._reconnect_thread.is_alive()
+            ):
+                return
+            self._reconnect_thread = threading.Thread(
+                target=self._reconnect_loop, name="redis-reconnect", daemon=True
+            )
+            self._reconnect_thread.start()
+
+    def _reconnect_delay(self, attempt: int) -> float:
+        """
+        Backoff exponencial con jitter completo, acotado por el máximo
+        """
+        ceiling = min(
+            settings.REDIS_RECONNECT_BACKOFF_MAX,
+            settings.REDIS_RECONNECT_BACKOFF_BASE * (2**attempt),
+        )
+        return random.uniform(ceiling / 2, ceiling)
+
+    def _reconnect_loop(self) -> None:
+        """
+        Reintenta la conexión hasta lograrla o hasta que se cierre el caché
+        """
+        attempt = 0
+        while True:
+            delay = self._reconnect_delay(attempt)
+            self._next_reconnect_at = time.time() + delay
+            if self._reconnect_stop.wait(delay):
+                return
+            attempt += 1
+            self._reconnect_attempts = attempt
             self._connect()
+            if self._is_connected:
+                break
+
+        with self._health_lock:
+            logger.info(f"Redis reconnected after {attempt} attempts")
+            self._down_since = None
+            self._reconnect_attempts = 0
+            self._next_reconnect_at = None
+
+    def get_health(self) -> Dict[str, Any]:
+        """
+        Estado de la conexión con Redis para diagnóstico
+        """
+        with self._health_lock:
+            if self._is_connected:
+                return {"state": "up"}
+            return {
+                "state": "down",
+                "down_since": self._down_since,
+                "reconnect_attempts": self._reconnect_attempts,
+                "next_attempt_in": (
+                    round(max(self._next_reconnect_at - time.time(), 0.0), 3)
+                    if self._next_reconnect_at is not None
+                    else None
+                ),
+            }
+
+    def close(self) -> None:
+        """
+        Detiene el listener de invalidaciones y la reconexión
+        """
+        self._reconnect_stop.set()
+        if self._pubsub_thread is not None:
+            self._pubsub_thread.stop()
+            self._pubsub_thread = None
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Retorna hits, misses y hit ratio de cada nivel del caché en este
+        worker (el total de todos los workers está en /metrics)
+        """
+        result = {}
+        for tier, counters in self.stats.items():
+            total = counters["hits"] + counters["misses"]
+            result[tier] = {
+                **counters,
+                "hit_ratio": counters["hits"] / total if total else 0.0,
+            }
+        return result
+
+    def _encode(self, key: str, value: Any) -> bytes:
+        started = time.perf_counter()
+        payload, raw_size = self.serializer.encode(value)
+        prefix = key_prefix(key)
+        metrics.cache_codec_latency.labels(prefix, "encode").observe(
+            time.perf_counter() - started
+        )
+        metrics.cache_uncompressed_bytes.labels(prefix).inc(raw_size)
+        self._count_write(key, len(payload))
+        return payload
+
+    def _decode(self, key: str, payload: bytes) -> Any:
+        started = time.perf_counter()
+        value = self.serializer.loads(payload)
+        metrics.cache_codec_latency.labels(key_prefix(key), "decode").observe(
+            time.perf_counter() - started
+        )
+        return value
+
+    def _count_lookup(self, tier: str, key: str, hit: bool, size: int = 0) -> None:
+        """
+        Registra un hit/miss del nivel (y los bytes leídos) por prefijo
+        """
+        self.stats[tier]["hits" if hit else "misses"] += 1
+        prefix = key_prefix(key)
+        metrics.cache_requests.labels(prefix, tier, "hit" if hit else "miss").inc()
+        if size:
+            metrics.cache_payload_bytes.labels(prefix, "read").inc(size)
+
+    @staticmethod
+    def _count_write(key: str, size: int) -> None:
+        prefix = key_prefix(key)
+        metrics.cache_sets.labels(prefix).inc()
+        metrics.cache_payload_bytes.labels(prefix, "written").inc(size)
+
+    @staticmethod
+    def _count_error(operation: str, key: str) -> None:
+        metrics.cache_errors.labels(key_prefix(key), operation).inc()
+
+    def _command_failed(self, operation: str, key: str) -> None:
+        """
+        Cuenta el comando fallido y marca Redis como caído
+        """
+        self._count_error(operation, key)
+        self._mark_down()
+
+    @staticmethod
+    @contextmanager
+    def _timed(operation: str, key: str):
+        """
+        Mide el round trip a Redis de una operación (histograma por prefijo)
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            metrics.cache_latency.labels(key_prefix(key), operation).observe(
+                time.perf_counter() - started
+            )
+
+    def is_available(self) -> bool:
+        """
+        Verifica si Redis está disponible sin tocar la red: si está caído la
+        reconexión corre en segundo plano
+        """
         return self._is_connected
 
-    def get(self, key: str) -> Optional[Any]:
+    def _local_get(self, key: str) -> Optional[Any]:
         """
-        Obtiene un valor del caché
+        Busca la llave en el L1 y registra el hit/miss
         """
-        if not self.is_available():
+        if self.local is None:
             return None
+        value = self.local.get(key)
+        self._count_lookup("l1", key, value is not None)
+        return value
 
-        try:
-            data = self.redis_client.get(key)
-            if data:
-                logger.debug(f"Cache hit for key: {key}")
-                return json.loads(data)
+    def _loaded(self, key: str, data: Optional[bytes]) -> Optional[Any]:
+        """
+        Decodifica un valor leído de Redis y lo deja en el L1
+        """
+        if not data:
             logger.debug(f"Cache miss for key: {key}")
+            self._count_lookup("l2", key, False)
+            return None
+
+        try:
+            value = self._decode(key, data)
+        except ValueError as e:
+            logger.error(f"Error decoding cache key {key}: {str(e)}")
+            self._count_error("decode", key)
             return None
-        except (ConnectionError, RedisError, json.JSONDecodeError) as e:
+
+        logger.debug(f"Cache hit for key: {key}")
+        self._count_lookup("l2", key, True, len(data))
+        if self.local is not None:
+            self.local.set(key, value)
+        return value
+
+    @staticmethod
+    def _meta_key(key: str) -> str:
+        return f"meta:{key}"
+
+    @staticmethod
+    def _parse_entry(key: str, value: Any, header: Any) -> Optional[CacheEntry]:
+        if not header:
+            return None
+        try:
+            return CacheEntry.from_dict({**header, "value": value})
+        except (KeyError, TypeError) as e:
+            logger.warning(f"Invalid cache entry for key {key}: {str(e)}")
+            return None
+
+    @staticmethod
+    def _new_entry(
+        value: Any,
+        soft_ttl: Optional[int],
+        hard_ttl: Optional[int],
+        meta: dict,
+        compute_seconds: float = 0.0,
+    ) -> Tuple[CacheEntry, int]:
+        """
+        Arma una entrada fresca por soft_ttl y servible hasta hard_ttl
+        """
+        soft_ttl = soft_ttl or settings.REDIS_SOFT_TTL
+        hard_ttl = max(hard_ttl or settings.REDIS_HARD_TTL, soft_ttl)
+        now = time.time()
+        entry = CacheEntry(
+            value=value,
+            soft_expires_at=now + soft_ttl,
+            hard_expires_at=now + hard_ttl,
+            meta=meta,
+            compute_seconds=compute_seconds,
+        )
+        return entry, hard_ttl
+
+    @staticmethod
+    def _body_key(key: str, encoding: Optional[str] = None) -> str:
+        return f"body:{key}:{encoding}" if encoding else f"body:{key}"
+
+    @classmethod
+    def _body_keys(cls, key: str) -> list:
+        return [cls._body_key(key)] + [
+            cls._body_key(key, encoding) for encoding in BODY_ENCODERS
+        ]
+
+    @staticmethod
+    def _body_header(soft_expires_at: float, compute_seconds: float) -> bytes:
+        return BODY_HEADER_FORMAT % (
+            soft_expires_at,
+            min(compute_seconds, BODY_MAX_COMPUTE_SECONDS),
+        )
+
+    @staticmethod
+    def _parse_body(payload: bytes) -> CachedBody:
+        header_end = payload.index(b"\n")
+        soft_expires_at, _, compute_seconds = payload[:header_end].partition(b" ")
+        return CachedBody(
+            body=payload[header_end + 1 :],
+            soft_expires_at=float(soft_expires_at),
+            compute_seconds=float(compute_seconds or 0),
+        )
+
+    @staticmethod
+    def _body_variants(body: bytes) -> Dict[str, bytes]:
+        return compress_body_variants(
+            body,
+            settings.GHIBLI_RESPONSE_ENCODINGS,
+            settings.GHIBLI_RESPONSE_COMPRESSION_MIN_SIZE,
+        )
+
+    def _local_get_many(self, keys: List[str]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Separa las llaves resueltas en el L1 de las que hay que pedir a Redis
+        """
+        found = {}
+        pending = []
+        for key in dict.fromkeys(keys):
+            value = self._local_get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                pending.append(key)
+        return found, pending
+
+    def _loaded_many(
+        self, keys: List[str], payloads: List[Optional[bytes]]
+    ) -> Dict[str, Any]:
+        loaded = {}
+        for key, data in zip(keys, payloads):
+            value = self._loaded(key, data)
+            if value is not None:
+                loaded[key] = value
+        return loaded
+
+    def get_generations(self) -> Dict[str, int]:
+        """
+        Generación vigente de cada namespace configurado
+        """
+        return {
+            namespace: self.generations.get(namespace, 0)
+            for namespace in settings.CACHE_NAMESPACES
+        }
+
+    def _bump_generation_args(self, namespace: str) -> list:
+        if namespace not in settings.CACHE_NAMESPACES:
+            raise ValueError(f"Unknown cache namespace: {namespace}")
+        return [
+            BUMP_GENERATION_SCRIPT,
+            1,
+            GENERATION_KEY_PREFIX + namespace,
+            settings.CACHE_INVALIDATION_CHANNEL,
+            self._invalidation_message(f"{GENERATION_KEY_PREFIX}{namespace}:"),
+        ]
+
+    def _bumped(self, namespace: str, generation: Any) -> int:
+        self.generations[namespace] = int(generation)
+        logger.info(
+            f"Cache namespace {namespace} invalidated (generation {generation})"
+        )
+        return int(generation)
+
+    async def _apublish_invalidation(self, key: str) -> None:
+        if self.local is None:
+            return
+        try:
+            await self.async_client.publish(
+                settings.CACHE_INVALIDATION_CHANNEL, self._invalidation_message(key)
+            )
+        except (ConnectionError, RedisError) as e:
+            logger.error(f"Error publishing invalidation for {key}: {str(e)}")
+
+    async def aclose(self) -> None:
+        """
+        Detiene el listener y cierra el pool asíncrono
+        """
+        self.close()
+        await self.async_client.aclose(close_connection_pool=True)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """
+        Obtiene un valor del caché (primero L1, luego Redis)
+        """
+        key = self._physical_key(key)
+        value = self._local_get(key)
+        if value is not None:
+            return value
+
+        if not self.is_available():
+            return None
+
+        try:
+            with self._timed("get", key):
+                data = await self.async_client.get(key)
+        except (ConnectionError, RedisError) as e:
             logger.error(f"Error getting cache key {key}: {str(e)}")
-            self._is_connected = False
+            self._command_failed("get", key)
             return None
+        return self._loaded(key, data)
 
-    def set(self, key: str, value: Any, ttl: int = None) -> bool:
+    async def aset(self, key: str, value: Any, ttl: int = None) -> bool:
         """
         Establece un valor en el caché
         """
+        key = self._physical_key(key)
         if not self.is_available():
             return False
 
         try:
             ttl = ttl or self.default_ttl
-            serialized_value = json.dumps(value)
-            self.redis_client.setex(key, ttl, serialized_value)
+            serialized_value = self._encode(key, value)
+            with self._timed("set", key):
+                await self.async_client.setex(key, ttl, serialized_value)
             logger.debug(f"Cache set for key: {key}")
+            if self.local is not None:
+                self.local.set(key, value, ttl)
+            await self._apublish_invalidation(key)
             return True
-        except (ConnectionError, RedisError, TypeError) as e:
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error encoding cache key {key}: {str(e)}")
+            return False
+        except (ConnectionError, RedisError) as e:
             logger.error(f"Error setting cache key {key}: {str(e)}")
-            self._is_connected = False
+            self._command_failed("set", key)
             return False
 
-    def delete(self, key: str) -> bool:
+    async def adelete(self, key: str) -> bool:
         """
         Elimina un valor del caché
         """
+        key = self._physical_key(key)
         if not self.is_available():
             return False
 
         try:
-            self.redis_client.delete(key)
+            with self._timed("delete", key):
+                await self.async_client.delete(key)
             logger.debug(f"Cache deleted for key: {key}")
+            if self.local is not None:
+                self.local.delete(key)
+            await self._apublish_invalidation(key)
             return True
         except (ConnectionError, RedisError) as e:
             logger.error(f"Error deleting cache key {key}: {str(e)}")
-            self._is_connected = False
+            self._command_failed("delete", key)
             return False
 
-    def clear(self) -> bool:
+    async def aget_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Obtiene varias llaves en un solo round trip (MGET)
+        Las llaves ausentes no aparecen en el resultado
+        """
+        physical = {self._physical_key(key): key for key in keys}
+        found, pending = self._local_get_many(list(physical))
+        if pending and self.is_available():
+            try:
+                with self._timed("get_many", pending[0]):
+                    payloads = await self.async_client.mget(pending)
+            except (ConnectionError, RedisError) as e:
+                logger.error(f"Error getting {len(pending)} cache keys: {str(e)}")
+                self._command_failed("get_many", pending[0])
+            else:
+                found.update(self._loaded_many(pending, payloads))
+        return {physical[key]: value for key, value in found.items()}
+
+    async def aset_many(self, mapping: Dict[str, Any], ttl: int = None) -> bool:
         """
-        Limpia todo el caché
+        Guarda varias llaves con el mismo TTL en un solo pipeline (incluye
+        las invalidaciones del L1 de los demás workers)
         """
+        if not mapping:
+            return True
         if not self.is_available():
             return False
 
+        mapping = {self._physical_key(key): value for key, value in mapping.items()}
+        ttl = ttl or self.default_ttl
         try:
-            self.redis_client.flushdb()
-            logger.info("Cache cleared")
+            async with self.async_client.pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.setex(key, ttl, self._encode(key, value))
+                    if self.local is not None:
+                        pipe.publish(
+                            settings.CACHE_INVALIDATION_CHANNEL,
+                            self._invalidation_message(key),
+                        )
+                with self._timed("set_many", next(iter(mapping))):
+                    await pipe.execute()
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error encoding cache keys: {str(e)}")
+            return False
+        except (ConnectionError, RedisError) as e:
+            logger.error(f"Error setting {len(mapping)} cache keys: {str(e)}")
+            self._command_failed("set_many", next(iter(mapping)))
+            return False
+
+        if self.local is not None:
+            for key, value in mapping.items():
+                self.local.set(key, value, ttl)
+        logger.debug(f"Cache set for {len(mapping)} keys")
+        return True
+
+    async def adelete_many(self, keys: List[str]) -> bool:
+        """
+        Elimina varias llaves con un solo DEL
+        """
+        if not keys:
             return True
+        if not self.is_available():
+            return False
+
+        keys = [self._physical_key(key) for key in keys]
+        try:
+            async with self.async_client.pipeline(transaction=False) as pipe:
+                pipe.delete(*keys)
+                if self.local is not None:
+                    for key in keys:
+                        pipe.publish(
+                            settings.CACHE_INVALIDATION_CHANNEL,
+                            self._invalidation_message(key),
+                        )
+                with self._timed("delete_many", keys[0]):
+                    await pipe.execute()
         except (ConnectionError, RedisError) as e:
-            logger.error(f"Error clearing cache: {str(e)}")
-            self._is_connected = False
+            logger.error(f"Error deleting {len(keys)} cache keys: {str(e)}")
+            self._command_failed("delete_many", keys[0])
+            return False
+
+        if self.local is not None:
+            for key in keys:
+                self.local.delete(key)
+        logger.debug(f"Cache deleted for {len(keys)} keys")
+        return True
+
+    async def aget_entries(self, keys: List[str]) -> Dict[str, CacheEntry]:
+        """
+        Obtiene varias entradas (stale-while-revalidate) en un solo round trip:
+        el valor de cada llave y su cabecera `meta:<key>`
+        """
+        stored = await self.aget_many([*keys, *(self._meta_key(key) for key in keys)])
+        entries = {}
+        for key in keys:
+            value = stored.get(key)
+            if value is None:
+                continue
+            entry = self._parse_entry(key, value, stored.get(self._meta_key(key)))
+            if entry is not None:
+                entries[key] = entry
+        return entries
+
+    async def aget_bodies(
+        self, keys: List[str], encoding: Optional[str] = None
+    ) -> Dict[str, CachedBody]:
+        """
+        Cuerpos pre-serializados de varias llaves en un solo round trip
+        """
+        body_keys = {
+            self._physical_key(self._body_key(key, encoding)): key for key in keys
+        }
+        found, pending = self._local_get_many(list(body_keys))
+        bodies = {body_keys[body_key]: value for body_key, value in found.items()}
+        if not pending or not self.is_available():
+            return bodies
+
+        try:
+            with self._timed("get_bodies", pending[0]):
+                payloads = await self.async_client.mget(pending)
+        except (ConnectionError, RedisError) as e:
+            logger.error(f"Error getting {len(pending)} cache bodies: {str(e)}")
+            self._command_failed("get_bodies", pending[0])
+            return bodies
+
+        for body_key, payload in zip(pending, payloads):
+            if not payload:
+                self._count_lookup("l2", body_key, False)
+                continue
+            self._count_lookup("l2", body_key, True, len(payload))
+            try:
+                value = self._parse_body(payload)
+            except ValueError as e:
+                logger.error(f"Error parsing cache body {body_key}: {str(e)}")
+                continue
+            if self.local is not None:
+                self.local.set(body_key, value)
+            bodies[body_keys[body_key]] = value
+        return bodies
+
+    async def ainvalidate_namespace(self, namespace: str) -> Optional[int]:
+        """
+        Invalida en O(1) todas las llaves de un namespace incrementando su
+        generación: las llaves anteriores quedan inalcanzables y expiran con
+        su TTL. Retorna la nueva generación (None si Redis no está disponible)
+        """
+        args = self._bump_generation_args(namespace)
+        if not self.is_available():
+            return None
+
+        try:
+            generation = await self.async_client.eval(*args)
+        except (ConnectionError, RedisError) as e:
+            logger.error(f"Error invalidating cache namespace {namespace}: {str(e)}")
+            self._command_failed(
+                "invalidate_namespace", GENERATION_KEY_PREFIX + namespace
+            )
+            return None
+        return self._bumped(namespace, generation)
+
+    async def aclear(self) -> bool:
+        """
+        Limpia todo el caché invalidando cada namespace (sin flushdb: no toca
+        locks, versionado ni llaves de otros componentes)
+        """
+        results = [
+            await self.ainvalidate_namespace(namespace)
+            for namespace in settings.CACHE_NAMESPACES
+        ]
+        if self.local is not None:
+            self.local.clear()
+        return all(result is not None for result in results)
+
+    async def aget_headers(self, keys: List[str]) -> Dict[str, CacheEntry]:
+        """
+        Cabeceras de varias entradas (expiración, metadatos y costo) en un
+        solo round trip, sin leer ni decodificar sus valores (value=None)
+        """
+        stored = await self.aget_many([self._meta_key(key) for key in keys])
+        headers = {}
+        for key in keys:
+            header = self._parse_entry(key, None, stored.get(self._meta_key(key)))
+            if header is not None:
+                headers[key] = header
+        return headers
+
+    async def aget_entry(self, key: str) -> Optional[CacheEntry]:
+        """
+        Obtiene una entrada con metadatos de expiración (stale-while-revalidate)
+        """
+        return (await self.aget_entries([key])).get(key)
+
+    async def aset_entry(
+        self,
+        key: str,
+        value: Any,
+        soft_ttl: int = None,
+        hard_ttl: int = None,
+        meta: Optional[Dict[str, Any]] = None,
+        store_body: bool = False,
+        compute_seconds: float = 0.0,
+    ) -> bool:
+        """
+        Guarda una entrada fresca por soft_ttl y servible hasta hard_ttl
+        El valor va en `<key>` y la expiración y metadatos en `meta:<key>`.
+        El ETag de la versión se calcula una sola vez y viaja en los
+        metadatos, así se valida leyendo solo la cabecera.
+        Con store_body=True se guarda además el cuerpo JSON final de la
+        respuesta en `body:<key>` junto con sus variantes comprimidas (la
+        compresión corre en un thread)
+        """
+        meta = dict(meta or {})
+        meta.setdefault("etag", compute_etag(value))
+        entry, hard_ttl = self._new_entry(
+            value, soft_ttl, hard_ttl, meta, compute_seconds
+        )
+        stored = await self.aset_many(
+            {
+                key: value,
+                self._meta_key(key): entry.header(),
+            },
+            ttl=hard_ttl,
+        )
+        if stored and store_body:
+            await self.aset_bodies(
+                key,
+                render_json(value),
+                entry.soft_expires_at,
+                hard_ttl,
+                entry.compute_seconds,
+            )
+        return stored
+
+    async def atouch_entry(
+        self, key: str, entry: CacheEntry, soft_ttl: int = None, hard_ttl: int = None
+    ) -> bool:
+        """
+        Extiende la vida de una entrada cuyo contenido no cambió (p. ej. un 304
+        del upstream): solo se reescribe la cabecera `meta:<key>` y el prefijo
+        de los cuerpos; al valor se le renueva el TTL con EXPIRE
+        """
+        touched, hard_ttl = self._new_entry(
+            entry.value, soft_ttl, hard_ttl, dict(entry.meta), entry.compute_seconds
+        )
+        if not await self.aset(self._meta_key(key), touched.header(), ttl=hard_ttl):
+            return False
+
+        body_keys = [self._physical_key(body_key) for body_key in self._body_keys(key)]
+        try:
+            async with self.async_client.pipeline(transaction=False) as pipe:
+                pipe.expire(self._physical_key(key), hard_ttl)
+                pipe.eval(
+                    TOUCH_BODIES_SCRIPT,
+                    len(body_keys),
+                    *body_keys,
+                    self._body_header(touched.soft_expires_at, touched.compute_seconds)[
+                        :-1
+                    ],
+                    hard_ttl,
+                )
+                with self._timed("touch_entry", key):
+                    await pipe.execute()
+        except (ConnectionError, RedisError) as e:
+            logger.error(f"Error touching cache bodies for {key}: {str(e)}")
+            self._command_failed("touch_entry", key)
+            return False
+
+        for body_key in body_keys:
+            if self.local is not None:
+                self.local.delete(body_key)
+            await self._apublish_invalidation(body_key)
+        return True
+
+    async def aset_bodies(
+        self,
+        key: str,
+        body: bytes,
+        soft_expires_at: float,
+        ttl: int = None,
+        compute_seconds: float = 0.0,
+        identity: bool = True,
+    ) -> bool:
+        """
+        Guarda el cuerpo sin comprimir y sus variantes comprimidas en un solo
+        pipeline (la compresión corre fuera del event loop). Las variantes que
+        ya no aplican (cuerpo bajo el umbral) se borran. Con identity=False
+        solo se guardan las variantes comprimidas (el cuerpo sin comprimir se
+        arma de otra forma, p. ej. el agregado de admin)
+        """
+        if not self.is_available():
+            return False
+
+        variants = await asyncio.to_thread(self._body_variants, body)
+        ttl = ttl or self.default_ttl
+        header = self._body_header(soft_expires_at, compute_seconds)
+        bodies = {self._physical_key(self._body_key(key)): body} if identity else {}
+        for encoding in BODY_ENCODERS:
+            if encoding in variants:
+                body_key = self._physical_key(self._body_key(key, encoding))
+                bodies[body_key] = variants[encoding]
+        stale = [
+            self._physical_key(self._body_key(key, encoding))
+            for encoding in BODY_ENCODERS
+            if encoding not in variants
+        ]
+        try:
+            async with self.async_client.pipeline(transaction=False) as pipe:
+                for body_key, data in bodies.items():
+                    pipe.setex(body_key, ttl, header + data)
+                if stale:
+                    pipe.delete(*stale)
+                with self._timed("set_bodies", key):
+                    await pipe.execute()
+        except (ConnectionError, RedisError) as e:
+            logger.error(f"Error setting cache bodies for {key}: {str(e)}")
+            self._command_failed("set_bodies", key)
+            return False
+
+        for body_key, data in bodies.items():
+            self._count_write(body_key, len(header) + len(data))
+        for body_key in [*bodies, *stale]:
+            if self.local is not None:
+                if body_key in bodies:
+                    cached = CachedBody(
+                        bodies[body_key], soft_expires_at, compute_seconds
+                    )
+                    self.local.set(body_key, cached, ttl)
+                else:
+                    self.local.delete(body_key)
+            await self._apublish_invalidation(body_key)
+        return True
+
+    async def aget_body(
+        self, key: str, encoding: Optional[str] = None
+    ) -> Optional[CachedBody]:
+        """
+        Obtiene el cuerpo y su prefijo (expiración suave y costo) sin
+        deserializar el JSON
+        """
+        body_key = self._physical_key(self._body_key(key, encoding))
+        value = self._local_get(body_key)
+        if value is not None:
+            return value
+
+        if not self.is_available():
+            return None
+
+        try:
+            with self._timed("get_body", body_key):
+                payload = await self.async_client.get(body_key)
+            if not payload:
+                self._count_lookup("l2", body_key, False)
+                return None
+            self._count_lookup("l2", body_key, True, len(payload))
+            value = self._parse_body(payload)
+            if self.local is not None:
+                self.local.set(body_key, value)
+            return value
+        except (ConnectionError, RedisError, ValueError) as e:
+            logger.error(f"Error getting cache body {body_key}: {str(e)}")
+            self._count_error("get_body", body_key)
+            return None
+
+    async def aget_body_encoding(self, key: str, encodings: List[str]) -> Optional[str]:
+        """
+        Primera variante comprimida guardada de `encodings` (la misma que
+        elegiría leer aget_body en orden), sin leer los cuerpos
+        """
+        body_keys = [
+            self._physical_key(self._body_key(key, encoding)) for encoding in encodings
+        ]
+        # Solo hace falta preguntar a Redis por las variantes anteriores a la
+        # primera que ya está en el L1
+        pending = []
+        for body_key in body_keys:
+            if self.local is not None and self.local.get(body_key) is not None:
+                break
+            pending.append(body_key)
+
+        if pending and self.is_available():
+            try:
+                async with self.async_client.pipeline(transaction=False) as pipe:
+                    for body_key in pending:
+                        pipe.exists(body_key)
+                    with self._timed("exists_body", pending[0]):
+                        found = await pipe.execute()
+                for encoding, exists in zip(encodings, found):
+                    if exists:
+                        return encoding
+            except (ConnectionError, RedisError) as e:
+                logger.error(f"Error checking cache bodies for {key}: {str(e)}")
+                self._count_error("exists_body", pending[0])
+
+        return encodings[len(pending)] if len(pending) < len(encodings) else None
+
+    async def aget_etag(self, key: str) -> Optional[str]:
+        """
+        Obtiene el ETag de la versión cacheada sin leer el payload
+        """
+        header = (await self.aget_headers([key])).get(key)
+        return header.meta.get("etag") if header is not None else None
+
+    async def aacquire_lock(self, name: str, ttl_ms: int) -> Optional[str]:
+        """
+        Intenta adquirir un lock de corta duración (SET NX PX)
+        Retorna el token del dueño o None si otro proceso lo tiene
+        """
+        if not self.is_available():
+            return None
+
+        token = uuid.uuid4().hex
+        try:
+            if await self.async_client.set(name, token, nx=True, px=ttl_ms):
+                logger.debug(f"Lock acquired: {name}")
+                return token
+            return None
+        except (ConnectionError, RedisError) as e:
+            logger.error(f"Error acquiring lock {name}: {str(e)}")
+            self._command_failed("acquire_lock", name)
+            return None
+
+    async def arelease_lock(self, name: str, token: str) -> bool:
+        """
+        Libera un lock si todavía pertenece al token indicado
+        """
+        if not self.is_available():
+            return False
+
+        try:
+            released = await self.async_client.eval(RELEASE_LOCK_SCRIPT, 1, name, token)
+            logger.debug(f"Lock released: {name}")
+            return bool(released)
+        except (ConnectionError, RedisError) as e:
+            logger.error(f"Error releasing lock {name}: {str(e)}")
+            self._command_failed("release_lock", name)
+            return False
+
+    async def ahgetall(self, key: str) -> Optional[Dict[str, str]]:
+        """
+        Lee un hash completo (campos y valores como texto)
+        Retorna None si Redis no está disponible
+        """
+        if not self.is_available():
+            return None
+
+        try:
+            data = await self.async_client.hgetall(key)
+            return {name.decode(): value.decode() for name, value in data.items()}
+        except (ConnectionError, RedisError) as e:
+            logger.error(f"Error reading hash {key}: {str(e)}")
+            self._command_failed("hgetall", key)
+            return None
+
+    async def ahset(self, key: str, mapping: Dict[str, str]) -> bool:
+        """
+        Escribe solo los campos indicados de un hash (sin expiración)
+        """
+        if not mapping:
+            return True
+        if not self.is_available():
             return False
 
+        try:
+            await self.async_client.hset(key, mapping=mapping)
+            return True
+        except (ConnectionError, RedisError) as e:
+            logger.error(f"Error writing hash {key}: {str(e)}")
+            self._command_failed("hset", key)
+            return False
+
+    async def ahincrby(self, key: str, name: str, amount: int = 1) -> Optional[int]:
+        """
+        Incrementa de forma atómica un contador dentro de un hash
+        """
+        if not self.is_available():
+            return None
+
+        try:
+            return int(await self.async_client.hincrby(key, name, amount))
+        except (ConnectionError, RedisError) as e:
+            logger.error(f"Error incrementing {key}:{name}: {str(e)}")
+            self._command_failed("hincrby", key)
+            return None
+
 
 # Instancia global del caché
 cache = RedisCache()
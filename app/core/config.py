@@ -1,3 +1,5 @@
+from typing import List, Literal
+
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
@@ -11,6 +13,7 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     ENVIRONMENT: str = Field(default="development")
     PAGINATION_DEFAULT_LIMIT: int = Field(default=10)
+    PAGINATION_MAX_LIMIT: int = Field(default=250)
     CREATE_INITIAL_DATA: bool = Field(default=False)
 
     # Database Configuration
@@ -24,6 +27,72 @@ class Settings(BaseSettings):
     REDIS_HOST: str = Field(default="ghibli_redis")
     REDIS_PORT: int = Field(default=6379)
     REDIS_TTL: int = Field(default=3600)
+    # Pool de conexiones compartido por el cliente asíncrono
+    REDIS_POOL_MAX_CONNECTIONS: int = Field(default=50)
+    REDIS_POOL_TIMEOUT: float = Field(default=2.0)
+    REDIS_SOCKET_TIMEOUT: float = Field(default=1.0)
+    REDIS_CONNECT_TIMEOUT: float = Field(default=1.0)
+    # Reconexión en segundo plano cuando Redis está caído
+    REDIS_RECONNECT_BACKOFF_BASE: float = Field(default=0.5)
+    REDIS_RECONNECT_BACKOFF_MAX: float = Field(default=30.0)
+    # Stale-while-revalidate: fresco hasta SOFT_TTL, servible hasta HARD_TTL
+    REDIS_SOFT_TTL: int = Field(default=3600)
+    REDIS_HARD_TTL: int = Field(default=86400)
+    # Lock de refresco entre workers (single-flight): sin valor viejo se
+    # espera hasta que el lock expira, con valor viejo solo WAIT_TIMEOUT
+    REDIS_LOCK_TTL_MS: int = Field(default=10000)
+    REDIS_LOCK_WAIT_TIMEOUT: float = Field(default=2.0)
+    REDIS_LOCK_POLL_INTERVAL: float = Field(default=0.05)
+    # Caché L1 en memoria por worker (invalidada vía pub/sub)
+    CACHE_L1_ENABLED: bool = Field(default=True)
+    CACHE_L1_MAX_ENTRIES: int = Field(default=256)
+    CACHE_L1_TTL: int = Field(default=30)
+    CACHE_INVALIDATION_CHANNEL: str = Field(default="cache:invalidate")
+    # Expiración anticipada probabilística (XFetch) antes del soft TTL,
+    # escalada por el costo de recalcular cada entrada; 0 la desactiva
+    CACHE_XFETCH_BETA: float = Field(default=1.0)
+    # Namespaces invalidables en O(1) subiendo su generación
+    CACHE_NAMESPACES: List[str] = Field(default=["ghibli", "users"])
+    # Endpoint /metrics (Prometheus); con varios workers definir también
+    # PROMETHEUS_MULTIPROC_DIR para agregarlas entre procesos
+    METRICS_ENABLED: bool = Field(default=True)
+    # Codec de los valores en Redis ("auto" usa orjson si está instalado)
+    CACHE_CODEC: Literal["auto", "json", "orjson", "msgpack"] = Field(default="auto")
+    CACHE_COMPRESSION: Literal["none", "zlib", "zstd"] = Field(default="zlib")
+    CACHE_COMPRESSION_THRESHOLD: int = Field(default=4096)
+
+    # Ghibli Upstream Client Configuration
+    GHIBLI_CONNECT_TIMEOUT: float = Field(default=2.0)
+    GHIBLI_READ_TIMEOUT: float = Field(default=5.0)
+    GHIBLI_POOL_MAX_CONNECTIONS: int = Field(default=20)
+    GHIBLI_POOL_MAX_KEEPALIVE: int = Field(default=10)
+    GHIBLI_POOL_KEEPALIVE_EXPIRY: float = Field(default=30.0)
+    GHIBLI_FANOUT_CONCURRENCY: int = Field(default=5)
+    # Reintentos con backoff exponencial + jitter dentro de un presupuesto total
+    GHIBLI_RETRY_ATTEMPTS: int = Field(default=3)
+    GHIBLI_RETRY_BACKOFF_BASE: float = Field(default=0.2)
+    GHIBLI_RETRY_BACKOFF_MAX: float = Field(default=2.0)
+    GHIBLI_RETRY_BUDGET: float = Field(default=8.0)
+    # Circuit breaker por endpoint
+    GHIBLI_BREAKER_FAILURE_THRESHOLD: int = Field(default=5)
+    GHIBLI_BREAKER_RECOVERY_TIMEOUT: float = Field(default=30.0)
+    # "fail": cualquier error aborta; "partial": devuelve lo obtenido + errores
+    GHIBLI_PARTIAL_FAILURE_POLICY: Literal["fail", "partial"] = Field(default="fail")
+    # Precarga al arrancar y refresco periódico de los datasets
+    GHIBLI_WARMUP_ENABLED: bool = Field(default=True)
+    GHIBLI_REFRESH_ENABLED: bool = Field(default=True)
+    GHIBLI_REFRESH_INTERVAL: int = Field(default=2700)
+    GHIBLI_REFRESH_JITTER: float = Field(default=0.1)
+    # Snapshots en disco para arranque en frío y caídas de la API
+    GHIBLI_SNAPSHOT_ENABLED: bool = Field(default=True)
+    GHIBLI_SNAPSHOT_DIR: str = Field(default="/tmp/ghibli_api/snapshots")
+    # Cache-Control max-age de las respuestas de /ghibli
+    GHIBLI_RESPONSE_MAX_AGE: int = Field(default=60)
+    # Variantes comprimidas del cuerpo generadas al refrescar (en orden de preferencia)
+    GHIBLI_RESPONSE_ENCODINGS: List[str] = Field(default=["br", "gzip"])
+    GHIBLI_RESPONSE_COMPRESSION_MIN_SIZE: int = Field(default=1024)
+    # Registros por chunk del export NDJSON en streaming
+    GHIBLI_EXPORT_CHUNK_SIZE: int = Field(default=100)
 
     # Workers Configuration
     WORKERS_PER_CORE: int = Field(default=1)
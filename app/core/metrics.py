@@ -0,0 +1,98 @@
+import os
+from typing import Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# Buckets en segundos: Redis responde en (sub)milisegundos y la API de
+# Ghibli en cientos de milisegundos
+CACHE_LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    1.0,
+)
+UPSTREAM_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Encode/decode en proceso: de decenas de microsegundos a decenas de ms
+CODEC_LATENCY_BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.1,
+)
+
+cache_requests = Counter(
+    "cache_requests",
+    "Cache lookups by key prefix, tier (l1/l2) and result (hit/miss)",
+    ["prefix", "tier", "result"],
+)
+cache_sets = Counter("cache_sets", "Values written to Redis by key prefix", ["prefix"])
+cache_errors = Counter(
+    "cache_errors",
+    "Failed cache operations by key prefix and operation",
+    ["prefix", "operation"],
+)
+cache_payload_bytes = Counter(
+    "cache_payload_bytes",
+    "Payload bytes read from and written to Redis by key prefix",
+    ["prefix", "direction"],
+)
+cache_uncompressed_bytes = Counter(
+    "cache_uncompressed_bytes",
+    "Encoded value bytes before compression by key prefix (the compression "
+    "ratio is cache_payload_bytes{direction=written} over this)",
+    ["prefix"],
+)
+cache_codec_latency = Histogram(
+    "cache_codec_duration_seconds",
+    "Time spent encoding and decoding cached values by key prefix and operation",
+    ["prefix", "operation"],
+    buckets=CODEC_LATENCY_BUCKETS,
+)
+cache_latency = Histogram(
+    "cache_operation_duration_seconds",
+    "Redis round trip latency by key prefix and operation",
+    ["prefix", "operation"],
+    buckets=CACHE_LATENCY_BUCKETS,
+)
+upstream_latency = Histogram(
+    "upstream_request_duration_seconds",
+    "Ghibli API request latency (one observation per attempt) by endpoint "
+    "and outcome",
+    ["endpoint", "outcome"],
+    buckets=UPSTREAM_LATENCY_BUCKETS,
+)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Métricas en formato de texto de Prometheus
+    Con varios workers (PROMETHEUS_MULTIPROC_DIR definido antes de arrancar)
+    cada proceso escribe sus valores en archivos mmap y aquí se suman los de
+    todos, así cualquier worker responde con el total
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,10 +1,13 @@
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import Session
 
-from app.api.v1.endpoints import auth, ghibli, user
+from app.api.v1.endpoints import auth
+from app.api.v1.endpoints import cache as cache_endpoints
+from app.api.v1.endpoints import ghibli, user
+from app.core.cache import cache
 from app.core.config import settings
 from app.core.initial_data import init_db as init_data
 from app.core.logging import (
@@ -13,7 +16,9 @@ from app.core.logging import (
     log_response_middleware,
     setup_logging,
 )
+from app.core.metrics import render_metrics
 from app.db.session import engine, init_db
+from app.services.ghibli import GhibliService
 
 logger = get_logger(__name__)
 
@@ -37,8 +42,16 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("Skipping initial data creation in production environment")
 
+    # Abrir el cliente HTTP compartido hacia la API de Ghibli
+    await GhibliService.open_client()
+    # Precargar los datasets y mantenerlos frescos en segundo plano
+    await GhibliService.start_background_refresh()
+
     logger.info("Application started successfully")
     yield
+    await GhibliService.stop_background_refresh()
+    await GhibliService.close_client()
+    await cache.aclose()
     logger.info("Application shutdown")
 
 
@@ -73,6 +86,9 @@ app.include_router(user.router, prefix=f"{settings.API_V1_STR}/users", tags=["us
 app.include_router(
     ghibli.router, prefix=f"{settings.API_V1_STR}/ghibli", tags=["ghibli"]
 )
+app.include_router(
+    cache_endpoints.router, prefix=f"{settings.API_V1_STR}/cache", tags=["cache"]
+)
 
 
 @app.get("/health")
@@ -82,3 +98,15 @@ async def health_check():
     """
     logger.info("Health check requested")
     return {"status": "healthy", "environment": settings.ENVIRONMENT}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Métricas de caché y de la API de Ghibli en formato Prometheus (agregadas
+    entre workers). Solo lee contadores locales: no toca Redis ni la API
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
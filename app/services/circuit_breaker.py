@@ -0,0 +1,146 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un endpoint de la API de Ghibli
+
+    closed: las llamadas pasan; tras `failure_threshold` fallos seguidos se
+    abre. open: las llamadas se rechazan sin tocar la red hasta que pasa
+    `recovery_timeout`. half_open: se deja pasar una sola llamada de prueba
+    (otra si la anterior no reportó en `recovery_timeout`); si funciona se
+    cierra y si falla se vuelve a abrir.
+
+    El estado es por proceso (cada worker decide con lo que ha visto).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_started_at: Optional[float] = None
+        self._last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if (
+            self._state == self.OPEN
+            and time.monotonic() - self._opened_at >= self.recovery_timeout
+        ):
+            self._state = self.HALF_OPEN
+            self._probe_started_at = None
+            logger.info(f"Circuit for {self.name} is half-open, allowing a probe")
+        return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Indica si se puede llamar a la API (en half-open solo una prueba)
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and (
+                self._probe_started_at is None
+                or time.monotonic() - self._probe_started_at >= self.recovery_timeout
+            ):
+                self._probe_started_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started_at = None
+
+    def record_failure(self, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._failures += 1
+            self._last_error = error
+            self._probe_started_at = None
+            if (
+                self._state == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                if self._state != self.OPEN:
+                    logger.warning(
+                        f"Circuit for {self.name} opened after "
+                        f"{self._failures} failures"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Estado del breaker para diagnóstico
+        """
+        with self._lock:
+            state = self._current_state()
+            retry_in = None
+            if state == self.OPEN:
+                elapsed = time.monotonic() - self._opened_at
+                retry_in = round(max(self.recovery_timeout - elapsed, 0.0), 3)
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "retry_in_seconds": retry_in,
+                "last_error": self._last_error,
+            }
+
+
+class CircuitBreakerRegistry:
+    """
+    Un breaker por endpoint, creado en el primer uso
+    """
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name,
+                    failure_threshold=settings.GHIBLI_BREAKER_FAILURE_THRESHOLD,
+                    recovery_timeout=settings.GHIBLI_BREAKER_RECOVERY_TIMEOUT,
+                )
+                self._breakers[name] = breaker
+            return breaker
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.status() for name, breaker in sorted(breakers.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._breakers.clear()
+
+
+# Instancia global de los breakers de la API de Ghibli
+circuit_breakers = CircuitBreakerRegistry()
@@ -1,12 +1,56 @@
-import requests
+import asyncio
+import base64
+import binascii
+import hashlib
+import math
+import random
+import time
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+import httpx
 from fastapi import HTTPException
 
-from app.core.cache import cache
+from app.core import metrics
+from app.core.cache import CachedBody, CacheEntry, cache, compute_etag, render_json
+from app.core.config import settings
 from app.core.logging import get_logger
 from app.models.user import UserRole
+from app.services.circuit_breaker import CircuitBreaker, circuit_breakers
+from app.services.indexes import id_index, relation_graph, search_index
+from app.services.snapshot import snapshot_store
+from app.services.versions import dataset_versions
 
 logger = get_logger(__name__)
 
+# Marca de "la versión vieja ya se sirvió" para los refrescos en segundo
+# plano: el refresco no necesita esperar el lock de otro worker
+STALE_SERVED = object()
+
+
+@dataclass
+class UpstreamResponse:
+    """
+    Respuesta de la API de Ghibli con sus validadores (ETag/Last-Modified)
+    """
+
+    data: Any
+    validators: Dict[str, str] = field(default_factory=dict)
+    not_modified: bool = False
+
 
 class GhibliService:
     BASE_URL = "https://ghibli.rest"
@@ -19,83 +63,1374 @@ class GhibliService:
         UserRole.VEHICLES: "/vehicles",
     }
 
+    # Cliente HTTP asíncrono compartido (pool de conexiones keep-alive)
+    _client: Optional[httpx.AsyncClient] = None
+
+    # Refrescos en curso por llave (single-flight dentro del worker)
+    _inflight: Dict[str, asyncio.Task] = {}
+    # Refrescos en segundo plano (stale-while-revalidate)
+    _background_tasks: Set[asyncio.Task] = set()
+    # Tarea de refresco periódico de todos los datasets
+    _refresher_task: Optional[asyncio.Task] = None
+    # Armado en curso de las variantes comprimidas del agregado de admin
+    _aggregate_task: Optional[asyncio.Task] = None
+    coalescing_stats: Dict[str, int] = {
+        "upstream_fetches": 0,
+        "collapsed_local": 0,
+        "collapsed_remote": 0,
+        "stale_served": 0,
+        "lock_wait_timeouts": 0,
+        "early_refreshes": 0,
+        "upstream_not_modified": 0,
+        "unchanged_content": 0,
+    }
+
     @classmethod
-    def _fetch_from_api(cls, endpoint: str) -> dict:
+    def _build_client(cls) -> httpx.AsyncClient:
         """
-        Obtiene datos directamente de la API
+        Construye el cliente HTTP asíncrono con timeouts y límites del pool
         """
-        try:
-            response = requests.get(f"{cls.BASE_URL}{endpoint}")
-            response.raise_for_status()
-            return response.json()
-        except (requests.RequestException, Exception) as e:
-            logger.error(f"Error accessing Ghibli API at {endpoint}: {str(e)}")
+        return httpx.AsyncClient(
+            base_url=cls.BASE_URL,
+            timeout=httpx.Timeout(
+                settings.GHIBLI_READ_TIMEOUT,
+                connect=settings.GHIBLI_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.GHIBLI_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GHIBLI_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.GHIBLI_POOL_KEEPALIVE_EXPIRY,
+            ),
+        )
+
+    @classmethod
+    async def open_client(cls) -> None:
+        """
+        Abre el cliente HTTP compartido (se invoca en el lifespan de la app)
+        """
+        if cls._client is None or cls._client.is_closed:
+            cls._client = cls._build_client()
+            logger.info("Ghibli API HTTP client opened")
+
+    @classmethod
+    async def close_client(cls) -> None:
+        """
+        Cierra el cliente HTTP compartido y libera sus conexiones
+        """
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+            logger.info("Ghibli API HTTP client closed")
+
+    @classmethod
+    def _get_client(cls) -> httpx.AsyncClient:
+        """
+        Retorna el cliente compartido, creándolo si el lifespan no lo abrió
+        """
+        if cls._client is None or cls._client.is_closed:
+            cls._client = cls._build_client()
+        return cls._client
+
+    @staticmethod
+    def _backoff_delay(attempt: int) -> float:
+        """
+        Backoff exponencial con jitter completo para el reintento `attempt`
+        """
+        ceiling = min(
+            settings.GHIBLI_RETRY_BACKOFF_MAX,
+            settings.GHIBLI_RETRY_BACKOFF_BASE * 2 ** (attempt - 1),
+        )
+        return random.uniform(0, ceiling)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """
+        Errores de red, 429 y 5xx se reintentan; el resto de 4xx no
+        """
+        response = getattr(error, "response", None)
+        if isinstance(error, httpx.HTTPStatusError) and (response is not None):
+            return response.status_code == 429 or response.status_code >= 500
+        return True
+
+    @classmethod
+    def _check_circuit(cls, endpoint: str) -> CircuitBreaker:
+        """
+        Retorna el breaker del endpoint o lanza 503 de inmediato si está abierto
+        """
+        breaker = circuit_breakers.get(endpoint)
+        if not breaker.allow_request():
+            logger.warning(f"Circuit open for {endpoint}, skipping Ghibli API call")
+            retry_in = breaker.status()["retry_in_seconds"] or 0
             raise HTTPException(
-                status_code=500, detail=f"Error accessing Ghibli API: {str(e)}"
-            ) from e
+                status_code=503,
+                detail="Ghibli API temporarily unavailable",
+                headers={"Retry-After": str(math.ceil(retry_in))},
+            )
+        return breaker
 
     @classmethod
-    def get_data_by_role(cls, role: UserRole):
+    def _should_retry(
+        cls, endpoint: str, error: Exception, attempt: int, deadline: float
+    ) -> Optional[float]:
         """
-        Obtiene datos de Studio Ghibli API según el rol del usuario
+        Retorna la espera antes del siguiente intento, o None si ya no quedan
+        intentos o el backoff se saldría del presupuesto de tiempo
         """
-        if role == UserRole.ADMIN:
-            return cls.get_all_data()
+        if attempt >= settings.GHIBLI_RETRY_ATTEMPTS or not cls._is_retryable(error):
+            return None
+        delay = cls._backoff_delay(attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        logger.warning(
+            f"Retrying Ghibli API at {endpoint} in {delay:.2f}s: {str(error)}"
+        )
+        return delay
+
+    @classmethod
+    def _api_error(
+        cls, breaker: CircuitBreaker, endpoint: str, error: Exception
+    ) -> HTTPException:
+        """
+        Registra el fallo en el breaker (solo si la API no respondió bien) y
+        lo convierte en HTTPException
+        """
+        if cls._is_retryable(error):
+            breaker.record_failure(str(error))
+        else:
+            # La API respondió (4xx): no cuenta como caída
+            breaker.record_success()
+        logger.error(f"Error accessing Ghibli API at {endpoint}: {str(error)}")
+        return HTTPException(
+            status_code=500, detail=f"Error accessing Ghibli API: {str(error)}"
+        )
+
+    @staticmethod
+    def _conditional_headers(validators: Optional[Dict[str, str]]) -> Dict[str, str]:
+        """
+        Cabeceras de revalidación a partir de los validadores guardados
+        """
+        headers = {}
+        if validators and validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators and validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    @staticmethod
+    def _response_validators(
+        headers: Any, previous: Optional[Dict[str, str]] = None
+    ) -> Dict[str, str]:
+        """
+        ETag/Last-Modified de la respuesta (un 304 puede omitirlos)
+        """
+        validators = dict(previous or {})
+        for name, header in (("etag", "ETag"), ("last_modified", "Last-Modified")):
+            value = headers.get(header)
+            if isinstance(value, str) and value:
+                validators[name] = value
+        return validators
+
+    @staticmethod
+    def _observe_upstream(endpoint: str, outcome: str, started: float) -> None:
+        """
+        Registra la duración de un intento contra la API (histograma por
+        endpoint y resultado)
+        """
+        metrics.upstream_latency.labels(endpoint, outcome).observe(
+            time.perf_counter() - started
+        )
+
+    @classmethod
+    async def _afetch_conditional(
+        cls, endpoint: str, validators: Optional[Dict[str, str]] = None
+    ) -> UpstreamResponse:
+        """
+        Obtiene datos de la API sin bloquear el event loop (con reintentos y
+        circuit breaker). Con validadores envía una petición condicional: un
+        304 no trae cuerpo y no se parsea nada
+        """
+        breaker = cls._check_circuit(endpoint)
+        deadline = time.monotonic() + settings.GHIBLI_RETRY_BUDGET
+        headers = cls._conditional_headers(validators)
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                remaining = max(deadline - time.monotonic(), 0.1)
+                response = await cls._get_client().get(
+                    endpoint,
+                    headers=headers,
+                    timeout=httpx.Timeout(
+                        min(settings.GHIBLI_READ_TIMEOUT, remaining),
+                        connect=min(settings.GHIBLI_CONNECT_TIMEOUT, remaining),
+                    ),
+                )
+                if headers and response.status_code == 304:
+                    breaker.record_success()
+                    cls._observe_upstream(endpoint, "not_modified", started)
+                    return UpstreamResponse(
+                        data=None,
+                        validators=cls._response_validators(
+                            response.headers, validators
+                        ),
+                        not_modified=True,
+                    )
+                response.raise_for_status()
+                data = response.json()
+                breaker.record_success()
+                cls._observe_upstream(endpoint, "ok", started)
+                return UpstreamResponse(
+                    data=data, validators=cls._response_validators(response.headers)
+                )
+            except Exception as e:
+                cls._observe_upstream(endpoint, "error", started)
+                delay = cls._should_retry(endpoint, e, attempt, deadline)
+                if delay is None:
+                    raise cls._api_error(breaker, endpoint, e) from e
+                await asyncio.sleep(delay)
+
+    @classmethod
+    async def _afetch_from_api(cls, endpoint: str) -> dict:
+        """
+        Obtiene datos de la API sin bloquear el event loop
+        """
+        return (await cls._afetch_conditional(endpoint)).data
+
+    @classmethod
+    def get_upstream_status(cls) -> Dict[str, Any]:
+        """
+        Diagnóstico del upstream: estado de los breakers, contadores, salud
+        de la conexión con Redis y hit ratio de cada nivel del caché
+        """
+        return {
+            "circuit_breakers": circuit_breakers.status(),
+            "cache": {**cache.get_health(), "tiers": cache.get_stats()},
+            "coalescing": cls.get_coalescing_stats(),
+        }
+
+    @classmethod
+    def get_coalescing_stats(cls) -> Dict[str, int]:
+        """
+        Retorna los contadores de fetches colapsados por single-flight
+        """
+        return dict(cls.coalescing_stats)
+
+    @classmethod
+    async def _single_flight(
+        cls,
+        cache_key: str,
+        loader: Callable[[], Awaitable[Any]],
+        stale: Any = None,
+    ) -> Any:
+        """
+        Coalesce los misses concurrentes de una llave: una única tarea por
+        llave en el worker y un lock en Redis entre workers. Todos los que
+        esperan (incluido quien la inició) la esperan con shield, así que
+        cancelar a uno no cancela el refresco de los demás
+        """
+        task = cls._inflight.get(cache_key)
+        if task is not None:
+            cls.coalescing_stats["collapsed_local"] += 1
+            logger.debug(f"Joining in-flight refresh for {cache_key}")
+        else:
+            task = cls._start_flight(cache_key, loader, stale)
+        return await asyncio.shield(task)
+
+    @classmethod
+    def _start_flight(
+        cls,
+        cache_key: str,
+        loader: Callable[[], Awaitable[Any]],
+        stale: Any = None,
+    ) -> asyncio.Task:
+        """
+        Lanza el refresco de la llave en una tarea propia, independiente de
+        quien lo pidió
+        """
+        task = asyncio.create_task(
+            cls._refresh_across_workers(cache_key, loader, stale)
+        )
+        cls._inflight[cache_key] = task
+        cls._background_tasks.add(task)
+        task.add_done_callback(partial(cls._on_flight_done, cache_key))
+        return task
+
+    @classmethod
+    def _on_flight_done(cls, cache_key: str, task: asyncio.Task) -> None:
+        if cls._inflight.get(cache_key) is task:
+            del cls._inflight[cache_key]
+        cls._background_tasks.discard(task)
+        # Marcar la excepción como recuperada si nadie esperaba la tarea
+        if not task.cancelled():
+            task.exception()
+
+    @classmethod
+    async def _refresh_across_workers(
+        cls,
+        cache_key: str,
+        loader: Callable[[], Awaitable[Any]],
+        stale: Any = None,
+    ) -> Any:
+        """
+        Solo el worker que obtiene el lock refresca la llave; los demás esperan
+        el valor refrescado (hasta que el lock expira) o usan el valor viejo.
+        Si el dueño libera el lock sin dejar un valor fresco, el siguiente en
+        tomarlo refresca; nadie llama al upstream sin el lock
+        """
+        if not cache.is_available():
+            cls.coalescing_stats["upstream_fetches"] += 1
+            return await loader()
+
+        lock_key = f"lock:{cache_key}"
+        token = await cache.aacquire_lock(lock_key, settings.REDIS_LOCK_TTL_MS)
+        if token:
+            return await cls._load_locked(lock_key, token, loader)
+
+        cls.coalescing_stats["collapsed_remote"] += 1
+        logger.debug(f"Another worker is refreshing {cache_key}, waiting")
+        now = time.monotonic()
+        stale_deadline = now + settings.REDIS_LOCK_WAIT_TIMEOUT
+        deadline = now + settings.REDIS_LOCK_TTL_MS / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.REDIS_LOCK_POLL_INTERVAL)
+            entry = await cache.aget_entry(cache_key)
+            if entry is not None and not entry.is_stale:
+                return entry.value
+            if stale is not None and time.monotonic() >= stale_deadline:
+                break
+            token = await cache.aacquire_lock(lock_key, settings.REDIS_LOCK_TTL_MS)
+            if token:
+                return await cls._load_locked(lock_key, token, loader)
+
+        if stale is not None:
+            cls.coalescing_stats["stale_served"] += 1
+            logger.warning(f"Refresh of {cache_key} timed out, serving stale data")
+            return stale
+
+        cls.coalescing_stats["lock_wait_timeouts"] += 1
+        logger.warning(f"Refresh of {cache_key} timed out waiting for another worker")
+        raise HTTPException(
+            status_code=503,
+            detail="Ghibli API temporarily unavailable",
+            headers={"Retry-After": str(math.ceil(settings.REDIS_LOCK_TTL_MS / 1000))},
+        )
 
+    @classmethod
+    async def _load_locked(
+        cls, lock_key: str, token: str, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Refresca la llave como dueño del lock y lo libera al terminar
+        """
+        try:
+            cls.coalescing_stats["upstream_fetches"] += 1
+            return await loader()
+        finally:
+            await cache.arelease_lock(lock_key, token)
+
+    @classmethod
+    def _schedule_refresh(
+        cls, cache_key: str, loader: Callable[[], Awaitable[Any]], stale: Any
+    ) -> None:
+        """
+        Programa un refresco en segundo plano si no hay uno en curso
+        """
+        if cache_key in cls._inflight:
+            return
+
+        logger.debug(f"Scheduling background refresh for {cache_key}")
+        task = cls._start_flight(cache_key, loader, stale)
+        task.add_done_callback(cls._on_background_refresh_done)
+
+    @classmethod
+    def _on_background_refresh_done(cls, task: asyncio.Task) -> None:
+        cls._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background refresh failed: {str(task.exception())}")
+
+    @classmethod
+    async def _get_or_refresh(
+        cls,
+        cache_key: str,
+        loader: Callable[[], Awaitable[Any]],
+        fallback: Optional[Callable[[], Any]] = None,
+        revalidate: bool = True,
+    ) -> Any:
+        """
+        Stale-while-revalidate: una entrada fresca se sirve directo, una vencida
+        (soft TTL) se sirve y se refresca en segundo plano, y sin entrada
+        (hard TTL) se refresca de forma síncrona. Si la API también falla se
+        usa el fallback (snapshot en disco). Una entrada fresca también puede
+        refrescarse en segundo plano antes de vencer (XFetch)
+        Con revalidate=False la decisión ya se tomó antes en el mismo request
+        (aget_response_etag) y la entrada solo se lee
+        """
+        entry = await cache.aget_entry(cache_key) if cache.is_available() else None
+        if entry is not None:
+            if not revalidate:
+                logger.info(f"Returning cached data for {cache_key}")
+            elif entry.is_stale:
+                logger.info(f"Returning stale data for {cache_key}")
+                cls._schedule_refresh(cache_key, loader, entry.value)
+            elif cls._refreshes_early(cache_key, entry):
+                cls._schedule_refresh(cache_key, loader, entry.value)
+            else:
+                logger.info(f"Returning cached data for {cache_key}")
+            return entry.value
+
+        return await cls._load_missing(cache_key, loader, fallback)
+
+    @classmethod
+    def _revalidate_in_background(
+        cls, cache_key: str, entry: Union[CacheEntry, CachedBody]
+    ) -> None:
+        """
+        Para respuestas servidas sin leer la entrada (304 o cuerpo
+        pre-serializado): si la versión ya venció, o si toca refrescarla
+        antes (XFetch), se refresca en segundo plano igual que en
+        _get_or_refresh
+        """
+        if entry.is_stale:
+            logger.info(f"Serving stale {cache_key}, refreshing in background")
+        elif not cls._refreshes_early(cache_key, entry):
+            return
+        endpoint = cache_key.partition(":")[2]
+        cls._schedule_refresh(
+            cache_key, lambda: cls._refresh_endpoint(endpoint), STALE_SERVED
+        )
+
+    @classmethod
+    def _refreshes_early(
+        cls, cache_key: str, entry: Union[CacheEntry, CachedBody]
+    ) -> bool:
+        """
+        Decide si una entrada todavía fresca se refresca por adelantado
+        (expiración anticipada probabilística, ver CacheEntry.refresh_early)
+        """
+        if not entry.refresh_early(settings.CACHE_XFETCH_BETA):
+            return False
+        cls.coalescing_stats["early_refreshes"] += 1
+        logger.info(
+            f"Refreshing {cache_key} early, "
+            f"{entry.soft_expires_at - time.time():.1f}s before expiry"
+        )
+        return True
+
+    @classmethod
+    async def _load_missing(
+        cls,
+        cache_key: str,
+        loader: Callable[[], Awaitable[Any]],
+        fallback: Optional[Callable[[], Any]] = None,
+    ) -> Any:
+        """
+        Carga una llave ausente del caché (single-flight) con el fallback
+        como último recurso
+        """
+        try:
+            return await cls._single_flight(cache_key, loader)
+        except HTTPException:
+            data = fallback() if fallback and settings.GHIBLI_SNAPSHOT_ENABLED else None
+            if data is None:
+                raise
+            logger.warning(f"Serving snapshot for {cache_key}, API unavailable")
+            return data
+
+    @classmethod
+    def _get_endpoint(cls, role: UserRole) -> str:
+        """
+        Retorna el endpoint asociado al rol o lanza 403 si no tiene acceso
+        """
         endpoint = cls.ROLE_ENDPOINTS.get(role)
         if not endpoint:
             raise HTTPException(
                 status_code=403, detail="Role not authorized to access Ghibli API"
             )
+        return endpoint
 
-        # Intentar obtener datos del caché solo si está disponible
-        if cache.is_available():
-            cache_key = f"ghibli:{endpoint}"
-            cached_data = cache.get(cache_key)
-            if cached_data:
-                logger.info(f"Returning cached data for {endpoint}")
-                return cached_data
+    @classmethod
+    async def aget_data_by_role(cls, role: UserRole, revalidate: bool = True):
+        """
+        Obtiene datos de Studio Ghibli API según el rol del usuario
+        """
+        if role == UserRole.ADMIN:
+            return await cls.aget_all_data(revalidate=revalidate)
 
-        # Si no hay caché o no hay datos en caché, obtener de la API
-        data = cls._fetch_from_api(endpoint)
+        return await cls._aget_endpoint_data(cls._get_endpoint(role), revalidate)
+
+    @classmethod
+    async def _aget_endpoint_data(cls, endpoint: str, revalidate: bool = True):
+        """
+        Obtiene el dataset de un endpoint (caché, API o snapshot)
+        """
+        return await cls._get_or_refresh(
+            f"ghibli:{endpoint}",
+            lambda: cls._refresh_endpoint(endpoint),
+            lambda: snapshot_store.load_data(endpoint.strip("/")),
+            revalidate,
+        )
+
+    @classmethod
+    def _get_resource_endpoint(cls, role: UserRole, resource: str) -> str:
+        """
+        Valida que el recurso exista y que el rol pueda consultarlo
+        """
+        endpoint = f"/{resource}"
+        if endpoint not in cls.ROLE_ENDPOINTS.values():
+            raise HTTPException(status_code=404, detail="Resource not found")
+        if role != UserRole.ADMIN and cls.ROLE_ENDPOINTS.get(role) != endpoint:
+            raise HTTPException(
+                status_code=403, detail="Role not authorized to access this resource"
+            )
+        return endpoint
+
+    @classmethod
+    async def aget_entity(
+        cls,
+        role: UserRole,
+        resource: str,
+        entity_id: str,
+        expand: Optional[str] = None,
+    ):
+        """
+        Obtiene un registro por id usando el índice del dataset
+        """
+        endpoint = cls._get_resource_endpoint(role, resource)
+        records = await cls._aget_endpoint_data(endpoint)
+
+        record = id_index.lookup(resource, records, entity_id)
+        if record is None:
+            raise HTTPException(
+                status_code=404, detail=f"{resource} record {entity_id} not found"
+            )
+
+        relations = cls._parse_list_param(expand)
+        if relations:
+            expanded = await cls._aexpand(role, resource, records, [record], relations)
+            return expanded[0]
+        return record
+
+    @classmethod
+    async def aget_changes(
+        cls, role: UserRole, resource: str, since: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Registros agregados, modificados y eliminados de un recurso después
+        de la versión `since` (0 = todo el dataset)
+        """
+        endpoint = cls._get_resource_endpoint(role, resource)
+        cache_key = f"ghibli:{endpoint}"
+        records = await cls._aget_endpoint_data(endpoint)
+
+        changes = await dataset_versions.achanges_since(cache_key, since)
+        if changes is not None and changes.version == 0 and records:
+            # Dataset cacheado antes de existir el versionado: se registra ahora
+            await cls._abootstrap_versions(cache_key, records)
+            changes = await dataset_versions.achanges_since(cache_key, since)
+            if changes is not None and changes.version == 0:
+                changes = None
+        if changes is None:
+            raise HTTPException(
+                status_code=503, detail="Change tracking temporarily unavailable"
+            )
+
+        by_id = id_index.get(resource, records)
+        return {
+            "resource": resource,
+            "since": since,
+            "version": changes.version,
+            "added": [by_id[i] for i in changes.added if i in by_id],
+            "modified": [by_id[i] for i in changes.modified if i in by_id],
+            "removed": changes.removed,
+        }
+
+    @classmethod
+    async def _abootstrap_versions(cls, cache_key: str, records: List[dict]) -> None:
+        """
+        Registra la primera versión de un dataset bajo el mismo lock que su
+        refresco, así llamadas concurrentes no crean versiones sin cambios
+        """
+        lock_key = f"lock:{cache_key}"
+        deadline = time.monotonic() + settings.REDIS_LOCK_TTL_MS / 1000
+        while time.monotonic() < deadline:
+            token = await cache.aacquire_lock(lock_key, settings.REDIS_LOCK_TTL_MS)
+            if token:
+                try:
+                    current = await dataset_versions.achanges_since(cache_key, 0)
+                    if current is not None and current.version == 0:
+                        await dataset_versions.aupdate(cache_key, records)
+                finally:
+                    await cache.arelease_lock(lock_key, token)
+                return
+
+            await asyncio.sleep(settings.REDIS_LOCK_POLL_INTERVAL)
+            current = await dataset_versions.achanges_since(cache_key, 0)
+            if current is None or current.version:
+                return
+
+    @staticmethod
+    def _parse_list_param(value: Optional[str]) -> Optional[List[str]]:
+        """
+        Convierte "a,b" en ["a", "b"]
+        """
+        if not value:
+            return None
+        return [item.strip() for item in value.split(",") if item.strip()]
+
+    @classmethod
+    async def _aexpand(
+        cls,
+        role: UserRole,
+        resource: str,
+        dataset: List[dict],
+        records: List[dict],
+        relations: List[str],
+        revalidate: bool = True,
+    ) -> List[dict]:
+        """
+        Embebe en cada registro los registros relacionados usando el grafo de
+        relaciones precalculado. Solo se pueden expandir recursos visibles
+        para el rol
+        """
+        endpoints = [cls._get_resource_endpoint(role, rel) for rel in relations]
+        targets = await asyncio.gather(
+            *(cls._aget_endpoint_data(endpoint, revalidate) for endpoint in endpoints)
+        )
+
+        relation_graph.ensure(resource, dataset)
+        for rel, target in zip(relations, targets):
+            relation_graph.ensure(rel, target)
+
+        expanded = []
+        for record in records:
+            node = (resource, str(record.get("id")))
+            item = dict(record)
+            for rel, target in zip(relations, targets):
+                related = (
+                    id_index.lookup(rel, target, neighbor_id)
+                    for _, neighbor_id in relation_graph.neighbors(node, rel)
+                )
+                item[rel] = [r for r in related if r is not None]
+            expanded.append(item)
+        return expanded
+
+    @staticmethod
+    def _encode_cursor(offset: int) -> str:
+        return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> int:
+        try:
+            offset = int(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail="Invalid cursor") from e
+        if offset < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        return offset
+
+    @staticmethod
+    def _project(records: List[dict], fields: Optional[List[str]]) -> List[dict]:
+        """
+        Deja solo los campos pedidos (sin mutar los registros cacheados)
+        """
+        if not fields:
+            return records
+        return [
+            {field: record[field] for field in fields if field in record}
+            for record in records
+        ]
+
+    @classmethod
+    def _paginate(
+        cls, records: List[dict], limit: Optional[int], cursor: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Corta una página de la lista a partir de un cursor opaco
+        """
+        offset = cls._decode_cursor(cursor) if cursor else 0
+        limit = limit or settings.PAGINATION_DEFAULT_LIMIT
+        end = offset + limit
+        return {
+            "items": records[offset:end],
+            "next_cursor": cls._encode_cursor(end) if end < len(records) else None,
+        }
+
+    @classmethod
+    async def aquery_data(
+        cls,
+        role: UserRole,
+        resource: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None,
+        expand: Optional[str] = None,
+        revalidate: bool = True,
+    ):
+        """
+        Aplica paginación, expansión de relaciones y proyección de campos
+        sobre los datos cacheados
+        """
+        if resource:
+            data = await cls._aget_endpoint_data(
+                cls._get_resource_endpoint(role, resource), revalidate
+            )
+        else:
+            data = await cls.aget_data_by_role(role, revalidate)
+
+        field_list = cls._parse_list_param(fields)
+        relations = cls._parse_list_param(expand)
+        paginate = limit is not None or cursor is not None
+
+        # Agregado de admin: la proyección aplica a cada sección
+        if isinstance(data, dict):
+            if paginate or relations:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Specify a resource to paginate or expand the admin dataset",
+                )
+            return {
+                name: (
+                    cls._project(section, field_list)
+                    if isinstance(section, list)
+                    else section
+                )
+                for name, section in data.items()
+            }
+
+        source = resource or cls._get_endpoint(role).strip("/")
+        if field_list and relations:
+            field_list = field_list + relations
+
+        if not paginate:
+            items = data
+            if relations:
+                items = await cls._aexpand(
+                    role, source, data, items, relations, revalidate
+                )
+            return cls._project(items, field_list)
+
+        page = cls._paginate(data, limit, cursor)
+        if relations:
+            page["items"] = await cls._aexpand(
+                role, source, data, page["items"], relations, revalidate
+            )
+        page["items"] = cls._project(page["items"], field_list)
+        return page
+
+    @classmethod
+    def _dataset_keys(
+        cls,
+        role: UserRole,
+        resource: Optional[str] = None,
+        expand: Optional[str] = None,
+    ) -> List[str]:
+        """
+        Llaves de caché de las que depende una respuesta (valida el rol)
+        """
+        if resource:
+            keys = [f"ghibli:{cls._get_resource_endpoint(role, resource)}"]
+        elif role == UserRole.ADMIN:
+            keys = [f"ghibli:{endpoint}" for endpoint in cls.ROLE_ENDPOINTS.values()]
+        else:
+            keys = [f"ghibli:{cls._get_endpoint(role)}"]
+
+        for rel in cls._parse_list_param(expand) or []:
+            keys.append(f"ghibli:{cls._get_resource_endpoint(role, rel)}")
+        return keys
+
+    @classmethod
+    async def aget_response_etag(
+        cls,
+        role: UserRole,
+        resource: Optional[str] = None,
+        revalidate: bool = True,
+        **params: Any,
+    ) -> Optional[str]:
+        """
+        ETag de la respuesta: combina los ETags guardados de los datasets
+        involucrados con los parámetros de la consulta, sin leer los payloads
+        Como un 304 se responde sin pasar por _get_or_refresh, aquí se
+        programa el refresco de los datasets que ya vencieron (o que toca
+        refrescar antes). Si retorna un ETag esa decisión ya está tomada y
+        las lecturas siguientes del request van con revalidate=False
+        """
+        keys = cls._dataset_keys(role, resource, params.get("expand"))
+        if not cache.is_available():
+            return None
+
+        headers = await cache.aget_headers(keys)
+        etags = []
+        for key in keys:
+            etag = headers[key].meta.get("etag") if key in headers else None
+            if not etag:
+                return None
+            etags.append(etag.strip('"'))
+        if revalidate:
+            for key in keys:
+                cls._revalidate_in_background(key, headers[key])
+
+        query = "&".join(
+            f"{name}={value}"
+            for name, value in sorted(params.items())
+            if value is not None
+        )
+        if len(etags) == 1 and not query:
+            return f'"{etags[0]}"'
+        digest = hashlib.sha256("|".join(etags + [query]).encode()).hexdigest()
+        return f'"{digest[:32]}"'
+
+    @classmethod
+    async def aget_response_body(
+        cls,
+        role: UserRole,
+        resource: Optional[str] = None,
+        encodings: Sequence[str] = (),
+        revalidate: bool = True,
+    ) -> Optional[Tuple[bytes, Optional[str]]]:
+        """
+        Cuerpo JSON pre-serializado de la respuesta por defecto (sin
+        parámetros) como (cuerpo, content_encoding). Se usa la primera
+        variante comprimida disponible de `encodings` o el cuerpo sin
+        comprimir. Una versión vencida (soft TTL) o que toca refrescar antes
+        (XFetch) se sirve igual y se refresca en segundo plano
+        """
+        keys = cls._dataset_keys(role, resource)
+        if not cache.is_available():
+            return None
+
+        if len(keys) > 1:
+            return await cls._aget_aggregate_body(keys, encodings, revalidate)
+
+        key = keys[0]
+        for encoding in [*encodings, None]:
+            cached = await cache.aget_body(key, encoding)
+            if cached is None:
+                continue
+            if revalidate:
+                cls._revalidate_in_background(key, cached)
+            return cached.body, encoding
+        return None
+
+    @classmethod
+    async def aget_response_encoding(
+        cls,
+        role: UserRole,
+        resource: Optional[str] = None,
+        encodings: Sequence[str] = (),
+    ) -> Optional[str]:
+        """
+        Codificación con la que aget_response_body serviría la respuesta por
+        defecto, sin leer los cuerpos: el 304 lleva así el mismo ETag (débil
+        o fuerte) que llevaría el 200
+        """
+        if not encodings or not cache.is_available():
+            return None
+
+        keys = cls._dataset_keys(role, resource)
+        key = keys[0]
+        if len(keys) > 1:
+            key = cls._aggregate_key(keys, await cache.aget_headers(keys))
+            if key is None:
+                return None
+        return await cache.aget_body_encoding(key, list(encodings))
+
+    @classmethod
+    async def _aget_aggregate_body(
+        cls, keys: List[str], encodings: Sequence[str] = (), revalidate: bool = True
+    ) -> Optional[Tuple[bytes, Optional[str]]]:
+        """
+        Cuerpo del agregado de admin. Las variantes comprimidas se guardan
+        aparte con la versión de los recursos en la llave; si la de la versión
+        vigente todavía no existe se arma en segundo plano y mientras tanto se
+        sirve sin comprimir, concatenando los cuerpos por recurso
+        """
+        if encodings:
+            headers = await cache.aget_headers(keys)
+            aggregate_key = cls._aggregate_key(keys, headers)
+            if aggregate_key is not None:
+                for encoding in encodings:
+                    cached = await cache.aget_body(aggregate_key, encoding)
+                    if cached is None:
+                        continue
+                    if revalidate:
+                        for key in keys:
+                            cls._revalidate_in_background(key, headers[key])
+                    return cached.body, encoding
+                cls._schedule_aggregate_variants(keys)
+
+        bodies = await cache.aget_bodies(keys)
+        if len(bodies) < len(keys):
+            return None
+        if revalidate:
+            for key in keys:
+                cls._revalidate_in_background(key, bodies[key])
+        return cls._stitch_aggregate(keys, bodies), None
+
+    @staticmethod
+    def _stitch_aggregate(keys: List[str], bodies: Dict[str, CachedBody]) -> bytes:
+        """
+        Une los cuerpos por recurso (un solo MGET): como render_json es
+        compacto, concatenarlos produce los mismos bytes que serializar el
+        agregado
+        """
+        parts = [
+            render_json(key.split("/", 1)[1]) + b":" + bodies[key].body for key in keys
+        ]
+        return b"{" + b",".join(parts) + b"}"
+
+    @staticmethod
+    def _aggregate_key(
+        keys: List[str], headers: Dict[str, CacheEntry]
+    ) -> Optional[str]:
+        """
+        Llave de las variantes del agregado para la versión vigente de los
+        recursos (hash de sus ETags): al cambiar un recurso la llave cambia y
+        las variantes viejas expiran solas
+        """
+        etags = [
+            headers[key].meta.get("etag") if key in headers else None for key in keys
+        ]
+        if not all(etags):
+            return None
+        digest = hashlib.sha256("|".join(etags).encode()).hexdigest()[:32]
+        return f"ghibli:aggregate:{digest}"
+
+    @classmethod
+    def _schedule_aggregate_variants(cls, keys: List[str]) -> None:
+        """
+        Arma en segundo plano las variantes comprimidas del agregado si no
+        hay un armado en curso
+        """
+        if cls._aggregate_task is not None and not cls._aggregate_task.done():
+            return
+        task = asyncio.create_task(cls._astore_aggregate_variants(keys))
+        cls._aggregate_task = task
+        cls._background_tasks.add(task)
+        task.add_done_callback(cls._on_background_refresh_done)
+
+    @classmethod
+    async def _astore_aggregate_variants(cls, keys: List[str]) -> bool:
+        """
+        Comprime el agregado una sola vez por versión de los recursos. Si un
+        recurso cambió entre la lectura de la cabecera y la del cuerpo (sus
+        soft_expires_at no coinciden) no se guarda nada
+        """
+        headers = await cache.aget_headers(keys)
+        aggregate_key = cls._aggregate_key(keys, headers)
+        if aggregate_key is None:
+            return False
+        bodies = await cache.aget_bodies(keys)
+        if any(
+            key not in bodies
+            or bodies[key].soft_expires_at != headers[key].soft_expires_at
+            for key in keys
+        ):
+            return False
+
+        parts = [headers[key] for key in keys]
+        ttl = int(min(part.hard_expires_at for part in parts) - time.time())
+        if ttl <= 0:
+            return False
+        stored = await cache.aset_bodies(
+            aggregate_key,
+            cls._stitch_aggregate(keys, bodies),
+            min(part.soft_expires_at for part in parts),
+            ttl,
+            max(part.compute_seconds for part in parts),
+            identity=False,
+        )
+        if stored:
+            logger.info(f"Stored compressed admin aggregate {aggregate_key}")
+        return stored
+
+    @classmethod
+    def _index_dataset(cls, name: str, data: Any) -> None:
+        """
+        Reconstruye los índices en memoria de un dataset recién cargado
+        """
+        if isinstance(data, list):
+            id_index.build(name, data)
+            search_index.index_dataset(name, data)
+            relation_graph.update(name, data)
+
+    @classmethod
+    async def asearch(cls, role: UserRole, query: str, limit: int = 20):
+        """
+        Busca en los datasets que el rol puede ver, sin consultar la API
+        si ya están en caché
+        """
+        if role == UserRole.ADMIN:
+            endpoints = list(cls.ROLE_ENDPOINTS.values())
+        else:
+            endpoints = [cls._get_endpoint(role)]
+
+        datasets = await asyncio.gather(
+            *(cls._aget_endpoint_data(endpoint) for endpoint in endpoints)
+        )
+        resources = []
+        for endpoint, records in zip(endpoints, datasets):
+            name = endpoint.strip("/")
+            search_index.ensure(name, records)
+            resources.append(name)
+
+        return search_index.search(query, resources, limit)
+
+    @classmethod
+    def export_ndjson(cls, role: UserRole) -> AsyncIterator[bytes]:
+        """
+        Export NDJSON de los datasets visibles para el rol (todos para admin)
+        El rol se valida antes de empezar a transmitir; el generador devuelto
+        produce un registro por línea, recurso por recurso
+        """
+        if role == UserRole.ADMIN:
+            endpoints = list(cls.ROLE_ENDPOINTS.values())
+        else:
+            endpoints = [cls._get_endpoint(role)]
+        return cls._aiter_ndjson(endpoints)
+
+    @classmethod
+    async def _aiter_ndjson(cls, endpoints: List[str]) -> AsyncIterator[bytes]:
+        """
+        Genera las líneas por chunks leyendo un dataset a la vez del caché,
+        así la memoria no crece con el tamaño total del export. Si un recurso
+        falla a mitad del stream se emite una línea de error y se continúa
+        """
+        chunk_size = max(1, settings.GHIBLI_EXPORT_CHUNK_SIZE)
+        for endpoint in endpoints:
+            name = endpoint.strip("/")
+            try:
+                records = await cls._aget_endpoint_data(endpoint)
+            except HTTPException as e:
+                logger.error(f"Export of {name} failed: {e.detail}")
+                yield render_json({"resource": name, "error": e.detail}) + b"\n"
+                continue
+
+            if not isinstance(records, list):
+                records = [records]
+            for start in range(0, len(records), chunk_size):
+                yield b"".join(
+                    render_json({"resource": name, "record": record}) + b"\n"
+                    for record in records[start : start + chunk_size]
+                )
+
+    @classmethod
+    async def _aextend_entry(
+        cls,
+        cache_key: str,
+        entry: CacheEntry,
+        validators: Dict[str, str],
+        reason: str = "upstream_not_modified",
+    ) -> Any:
+        """
+        El contenido no cambió (304 del upstream o mismos hashes por registro):
+        se extiende la vida de la entrada. La entrada puede venir del L1, así
+        que se trabaja sobre una copia de sus metadatos
+        """
+        cls.coalescing_stats[reason] += 1
+        entry = replace(entry, meta={**entry.meta, "upstream": validators})
+        await cache.atouch_entry(cache_key, entry)
+        await cls._save_missing_snapshot(cache_key.partition(":/")[2], entry.value)
+        logger.info(f"Content unchanged for {cache_key} ({reason}), TTL extended")
+        return entry.value
+
+    @classmethod
+    async def _ais_unchanged(
+        cls, cache_key: str, entry: Optional[CacheEntry], data: Any
+    ) -> bool:
+        """
+        Registra la nueva carga en el versionado y dice si el contenido es
+        idéntico al de la entrada en caché. La decisión se toma comparando con
+        el ETag de la propia entrada: el versionado solo sigue los cambios y
+        puede no coincidir con la entrada (escritura fallida, snapshot viejo)
+        """
+        if isinstance(data, list):
+            await dataset_versions.aupdate(cache_key, data)
+        return entry is not None and entry.meta.get("etag") == compute_etag(data)
+
+    @classmethod
+    async def _refresh_endpoint(cls, endpoint: str):
+        """
+        Obtiene un endpoint de la API (revalidando con ETag/Last-Modified si
+        ya hay una versión en caché) y lo guarda en caché
+        """
+        cache_key = f"ghibli:{endpoint}"
+        entry = await cache.aget_entry(cache_key) if cache.is_available() else None
+        validators = entry.meta.get("upstream") if entry is not None else None
+
+        started = time.perf_counter()
+        result = await cls._afetch_conditional(endpoint, validators)
+        if result.not_modified:
+            return await cls._aextend_entry(cache_key, entry, result.validators)
+
+        data = result.data
+        # Costo de recalcular la entrada, usado por la expiración anticipada
+        compute_seconds = time.perf_counter() - started
+        if await cls._ais_unchanged(cache_key, entry, data):
+            return await cls._aextend_entry(
+                cache_key, entry, result.validators, "unchanged_content"
+            )
+
+        await cls._save_snapshot(endpoint.strip("/"), data)
+        cls._index_dataset(endpoint.strip("/"), data)
 
-        # Intentar guardar en caché si está disponible
         if cache.is_available():
-            cache_key = f"ghibli:{endpoint}"
-            cache.set(cache_key, data)
+            await cache.aset_entry(
+                cache_key,
+                data,
+                meta={"upstream": result.validators},
+                store_body=True,
+                compute_seconds=compute_seconds,
+            )
             logger.info(f"Data fetched and cached for {endpoint}")
+            # El agregado de admin cambió: se recomprimen sus variantes
+            cls._schedule_aggregate_variants(
+                [f"ghibli:{path}" for path in cls.ROLE_ENDPOINTS.values()]
+            )
         else:
             logger.warning("Cache not available, serving data directly from API")
 
         return data
 
     @classmethod
-    def get_all_data(cls):
+    async def aget_all_data(
+        cls, partial_failure_policy: Optional[str] = None, revalidate: bool = True
+    ):
         """
-        Obtiene todos los datos de la API (solo para admin)
+        Obtiene todos los datos de la API (solo para admin): los recursos en
+        caché se leen en un solo round trip (los vencidos se sirven y se
+        refrescan en segundo plano) y los ausentes se cargan en paralelo con
+        concurrencia acotada
         """
-        if cache.is_available():
-            cache_key = "ghibli:all_data"
-            cached_data = cache.get(cache_key)
-            if cached_data:
-                logger.info("Returning cached all data")
-                return cached_data
+        policy = partial_failure_policy or settings.GHIBLI_PARTIAL_FAILURE_POLICY
+        endpoints = list(cls.ROLE_ENDPOINTS.values())
+        entries = (
+            await cache.aget_entries([f"ghibli:{endpoint}" for endpoint in endpoints])
+            if cache.is_available()
+            else {}
+        )
 
-        all_data = {}
-        try:
-            for endpoint in cls.ROLE_ENDPOINTS.values():
-                data = cls._fetch_from_api(endpoint)
-                all_data[endpoint.strip("/")] = data
-
-            # Intentar guardar en caché si está disponible
-            if cache.is_available() and all_data:
-                cache_key = "ghibli:all_data"
-                cache.set(cache_key, all_data)
-                logger.info("All data fetched and cached")
-
-            return all_data
-        except HTTPException as e:
-            logger.error(f"Error fetching all data: {str(e)}")
-            raise HTTPException(
-                status_code=500, detail="Error fetching data from Ghibli API"
-            ) from e
+        values = {}
+        missing = []
+        for endpoint in endpoints:
+            cache_key = f"ghibli:{endpoint}"
+            entry = entries.get(cache_key)
+            if entry is None:
+                missing.append(endpoint)
+                continue
+            if revalidate and (
+                entry.is_stale or cls._refreshes_early(cache_key, entry)
+            ):
+                cls._schedule_refresh(
+                    cache_key,
+                    lambda endpoint=endpoint: cls._refresh_endpoint(endpoint),
+                    entry.value,
+                )
+            values[endpoint] = entry.value
+
+        loaded, errors = await cls._aload_endpoints(missing) if missing else ({}, {})
+        values.update(loaded)
+        all_data = {
+            endpoint.strip("/"): values[endpoint]
+            for endpoint in endpoints
+            if endpoint in values
+        }
+
+        if errors:
+            logger.error(f"Error fetching all data: {errors}")
+            if policy != "partial" or not all_data:
+                # Si todos los circuitos están abiertos se responde 503 rápido
+                status_codes = {code for code, _ in errors.values()}
+                raise HTTPException(
+                    status_code=503 if status_codes == {503} else 500,
+                    detail="Error fetching data from Ghibli API",
+                )
+            # Respuesta parcial: los recursos que fallaron no quedan en caché
+            all_data["errors"] = {name: detail for name, (_, detail) in errors.items()}
+        return all_data
+
+    @classmethod
+    async def _aload_endpoints(
+        cls, endpoints: List[str]
+    ) -> Tuple[Dict[str, Any], Dict[str, Tuple[int, Any]]]:
+        """
+        Carga en paralelo (concurrencia acotada) endpoints ausentes del caché
+        Retorna los datos por endpoint y los errores por recurso como
+        (status, detalle)
+        """
+        semaphore = asyncio.Semaphore(settings.GHIBLI_FANOUT_CONCURRENCY)
+
+        async def load(endpoint: str):
+            async with semaphore:
+                return await cls._load_missing(
+                    f"ghibli:{endpoint}",
+                    lambda: cls._refresh_endpoint(endpoint),
+                    lambda: snapshot_store.load_data(endpoint.strip("/")),
+                )
+
+        results = await asyncio.gather(
+            *(load(endpoint) for endpoint in endpoints), return_exceptions=True
+        )
+
+        loaded = {}
+        errors = {}
+        for endpoint, result in zip(endpoints, results):
+            if isinstance(result, BaseException):
+                errors[endpoint.strip("/")] = (
+                    getattr(result, "status_code", 500),
+                    getattr(result, "detail", str(result)),
+                )
+            else:
+                loaded[endpoint] = result
+        return loaded, errors
+
+    @classmethod
+    async def _save_snapshot(cls, name: str, data: Any) -> None:
+        """
+        Persiste el dataset en disco sin bloquear el event loop
+        """
+        if settings.GHIBLI_SNAPSHOT_ENABLED:
+            await asyncio.to_thread(snapshot_store.save, name, data)
+
+    @classmethod
+    async def _save_missing_snapshot(cls, name: str, data: Any) -> None:
+        """
+        Persiste el dataset solo si aún no hay snapshot en disco (instancia
+        nueva con Redis ya caliente): si el contenido no cambia nunca se
+        llegaría a escribir y el fallback quedaría vacío
+        """
+        if not settings.GHIBLI_SNAPSHOT_ENABLED:
+            return
+
+        def save_if_missing() -> None:
+            if snapshot_store.load(name) is None:
+                snapshot_store.save(name, data)
+
+        await asyncio.to_thread(save_if_missing)
+
+    @classmethod
+    async def load_snapshots_into_cache(cls) -> int:
+        """
+        Arranque en frío: siembra en el caché las llaves ausentes con los
+        snapshots en disco. La expiración suave respeta la antigüedad del
+        snapshot, así que uno viejo se refresca en cuanto se lee
+        """
+        if not settings.GHIBLI_SNAPSHOT_ENABLED or not cache.is_available():
+            return 0
+
+        cache_keys = [f"ghibli:{endpoint}" for endpoint in cls.ROLE_ENDPOINTS.values()]
+        cached = await cache.aget_entries(cache_keys)
+        loaded = 0
+        for endpoint in cls.ROLE_ENDPOINTS.values():
+            cache_key = f"ghibli:{endpoint}"
+            snapshot = snapshot_store.load(endpoint.strip("/"))
+            if snapshot is None or cache_key in cached:
+                continue
+            remaining = int(settings.REDIS_SOFT_TTL - snapshot.age)
+            await cache.aset_entry(
+                cache_key,
+                snapshot.data,
+                soft_ttl=max(1, remaining),
+                store_body=True,
+            )
+            loaded += 1
+
+        logger.info(f"Loaded {loaded} snapshots into cache")
+        return loaded
+
+    @classmethod
+    def get_snapshot_status(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        Retorna la antigüedad de cada snapshot en disco
+        """
+        return snapshot_store.status()
+
+    @classmethod
+    async def warm_up(cls, force: bool = False) -> None:
+        """
+        Precarga todos los endpoints en el caché (el agregado de admin se arma
+        con ellos) en paralelo con la misma concurrencia acotada que el
+        agregado. Con force=False se omiten las llaves que siguen frescas
+        """
+        cache_keys = [f"ghibli:{endpoint}" for endpoint in cls.ROLE_ENDPOINTS.values()]
+        entries = await cache.aget_entries(cache_keys) if cache.is_available() else {}
+        endpoints = [
+            endpoint
+            for endpoint in cls.ROLE_ENDPOINTS.values()
+            if force
+            or f"ghibli:{endpoint}" not in entries
+            or entries[f"ghibli:{endpoint}"].is_stale
+        ]
+        _, errors = await cls._aload_endpoints(endpoints) if endpoints else ({}, {})
+        for name, (_, detail) in errors.items():
+            logger.warning(f"Warm-up of /{name} failed: {detail}")
+
+        loaded = len(cls.ROLE_ENDPOINTS) - len(errors)
+        logger.info(f"Warm-up finished: {loaded} datasets loaded")
+
+    @classmethod
+    async def _refresh_cycle(cls) -> bool:
+        """
+        Refresca todos los datasets si este worker gana el turno del intervalo
+        """
+        if not cache.is_available():
+            return False
+
+        # El lock no se libera: expira con el intervalo, así solo un worker
+        # refresca por intervalo
+        token = await cache.aacquire_lock(
+            "lock:ghibli:refresher", settings.GHIBLI_REFRESH_INTERVAL * 1000
+        )
+        if not token:
+            logger.debug("Another worker owns this refresh interval")
+            return False
+
+        await cls.warm_up(force=True)
+        return True
+
+    @classmethod
+    async def _refresh_loop(cls) -> None:
+        """
+        Bucle de refresco periódico con jitter
+        """
+        while True:
+            interval = settings.GHIBLI_REFRESH_INTERVAL
+            jitter = interval * settings.GHIBLI_REFRESH_JITTER
+            await asyncio.sleep(interval + random.uniform(-jitter, jitter))
+            try:
+                await cls._refresh_cycle()
+            except Exception as e:
+                logger.error(f"Scheduled refresh failed: {str(e)}")
+
+    @classmethod
+    async def start_background_refresh(cls) -> None:
+        """
+        Precarga los datasets y arranca el refresco periódico (lifespan)
+        La precarga desde la API corre en segundo plano: el arranque no espera
+        al upstream (mientras tanto se sirven los snapshots sembrados)
+        """
+        await cls.load_snapshots_into_cache()
+
+        if settings.GHIBLI_WARMUP_ENABLED:
+            task = asyncio.create_task(cls.warm_up())
+            cls._background_tasks.add(task)
+            task.add_done_callback(cls._on_background_refresh_done)
+
+        if settings.GHIBLI_REFRESH_ENABLED and cls._refresher_task is None:
+            cls._refresher_task = asyncio.create_task(cls._refresh_loop())
+            logger.info("Ghibli background refresher started")
+
+    @classmethod
+    async def stop_background_refresh(cls) -> None:
+        """
+        Detiene el refresco periódico y los refrescos pendientes
+        """
+        tasks = list(cls._background_tasks)
+        if cls._refresher_task is not None:
+            tasks.append(cls._refresher_task)
+            cls._refresher_task = None
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Ghibli background refresher stopped")
@@ -0,0 +1,301 @@
+import bisect
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class IdIndex:
+    """
+    Índices id -> registro por dataset
+
+    Cada índice se construye una sola vez por versión cargada del dataset: se
+    reconstruye solo cuando cambia la lista de registros que se le entrega
+    (una recarga desde la API o desde Redis al L1).
+    """
+
+    def __init__(self):
+        self._indexes: Dict[str, Tuple[List[dict], Dict[str, dict]]] = {}
+        self._lock = threading.Lock()
+
+    def build(self, name: str, records: List[dict]) -> Dict[str, dict]:
+        """
+        Construye (o reemplaza) el índice de un dataset
+        """
+        index = {
+            str(record["id"]): record
+            for record in records
+            if isinstance(record, dict) and "id" in record
+        }
+        with self._lock:
+            self._indexes[name] = (records, index)
+        logger.debug(f"Built id index for {name} with {len(index)} records")
+        return index
+
+    def get(self, name: str, records: List[dict]) -> Dict[str, dict]:
+        """
+        Retorna el índice del dataset, reconstruyéndolo si los registros cambiaron
+        """
+        current = self._indexes.get(name)
+        if current is not None and current[0] is records:
+            return current[1]
+        return self.build(name, records)
+
+    def lookup(self, name: str, records: List[dict], entity_id: str) -> Any:
+        """
+        Busca un registro por id en O(1)
+        """
+        return self.get(name, records).get(entity_id)
+
+
+class SearchIndex:
+    """
+    Índice invertido de texto sobre los datasets cacheados
+
+    Cada dataset se indexa de forma incremental: solo se tocan los postings de
+    los registros cuyo texto cambió. Las consultas buscan cada término por
+    token exacto o por prefijo sobre la lista ordenada de tokens.
+    """
+
+    FIELDS = {
+        "films": ("title", "original_title_romanised", "director", "description"),
+        "people": ("name",),
+        "locations": ("name", "climate", "terrain"),
+        "species": ("name", "classification"),
+        "vehicles": ("name", "vehicle_class", "description"),
+    }
+    TOKEN_RE = re.compile(r"\w+")
+
+    def __init__(self):
+        self._sources: Dict[str, List[dict]] = {}
+        self._doc_tokens: Dict[Tuple[str, str], Set[str]] = {}
+        self._labels: Dict[Tuple[str, str], str] = {}
+        self._postings: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+        self._sorted_tokens: List[str] = []
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        """
+        Normaliza (minúsculas, sin acentos) y separa en tokens
+        """
+        normalized = unicodedata.normalize("NFKD", text.lower())
+        stripped = "".join(c for c in normalized if not unicodedata.combining(c))
+        return cls.TOKEN_RE.findall(stripped)
+
+    def _record_tokens(self, resource: str, record: dict) -> Set[str]:
+        tokens = set()
+        for field_name in self.FIELDS.get(resource, ("name", "title")):
+            value = record.get(field_name)
+            if isinstance(value, str):
+                tokens.update(self.tokenize(value))
+        return tokens
+
+    def index_dataset(self, resource: str, records: List[dict]) -> None:
+        """
+        Actualiza el índice con la nueva versión de un dataset
+        """
+        with self._lock:
+            seen = set()
+            for record in records:
+                if not isinstance(record, dict) or "id" not in record:
+                    continue
+                doc = (resource, str(record["id"]))
+                seen.add(doc)
+                self._labels[doc] = record.get("title") or record.get("name") or ""
+                tokens = self._record_tokens(resource, record)
+                previous = self._doc_tokens.get(doc, set())
+                if tokens == previous:
+                    continue
+                for token in previous - tokens:
+                    self._discard_posting(token, doc)
+                for token in tokens - previous:
+                    self._postings[token].add(doc)
+                    self._dirty = True
+                self._doc_tokens[doc] = tokens
+
+            removed = [
+                doc
+                for doc in self._doc_tokens
+                if doc[0] == resource and doc not in seen
+            ]
+            for doc in removed:
+                for token in self._doc_tokens.pop(doc):
+                    self._discard_posting(token, doc)
+                self._labels.pop(doc, None)
+
+            self._sources[resource] = records
+        logger.debug(f"Search index updated for {resource}")
+
+    def _discard_posting(self, token: str, doc: Tuple[str, str]) -> None:
+        docs = self._postings.get(token)
+        if docs is None:
+            return
+        docs.discard(doc)
+        if not docs:
+            del self._postings[token]
+            self._dirty = True
+
+    def ensure(self, resource: str, records: List[dict]) -> None:
+        """
+        Indexa el dataset solo si no es la versión ya indexada
+        """
+        if self._sources.get(resource) is not records:
+            self.index_dataset(resource, records)
+
+    def _matches(self, term: str) -> Dict[Tuple[str, str], int]:
+        """
+        Documentos que contienen el término (2 puntos exacto, 1 por prefijo)
+        """
+        if self._dirty:
+            self._sorted_tokens = sorted(self._postings)
+            self._dirty = False
+
+        scores: Dict[Tuple[str, str], int] = {}
+        tokens = self._sorted_tokens
+        position = bisect.bisect_left(tokens, term)
+        while position < len(tokens) and tokens[position].startswith(term):
+            token = tokens[position]
+            weight = 2 if token == term else 1
+            for doc in self._postings.get(token, ()):
+                scores[doc] = max(scores.get(doc, 0), weight)
+            position += 1
+        return scores
+
+    def search(
+        self, query: str, resources: List[str], limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """
+        Busca documentos que contengan todos los términos de la consulta
+        """
+        terms = self.tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            scores: Optional[Dict[Tuple[str, str], int]] = None
+            for term in terms:
+                matches = {
+                    doc: score
+                    for doc, score in self._matches(term).items()
+                    if doc[0] in resources
+                }
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {
+                        doc: scores[doc] + score
+                        for doc, score in matches.items()
+                        if doc in scores
+                    }
+                if not scores:
+                    return []
+
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            return [
+                {
+                    "resource": resource,
+                    "id": entity_id,
+                    "label": self._labels.get((resource, entity_id), ""),
+                    "score": score,
+                }
+                for (resource, entity_id), score in ranked[:limit]
+            ]
+
+
+Node = Tuple[str, str]
+
+
+class RelationGraph:
+    """
+    Grafo de relaciones entre registros (films, people, locations, ...)
+
+    Los registros de ghibli.rest se refieren entre sí por URL. Al cargar un
+    dataset se resuelven sus URLs a aristas (recurso, id) y se mantiene
+    también el índice inverso, así `neighbors` responde en O(grado) sin
+    recorrer los datasets.
+    """
+
+    RESOURCES = ("films", "people", "locations", "species", "vehicles")
+
+    def __init__(self):
+        self._sources: Dict[str, List[dict]] = {}
+        self._forward: Dict[Node, Dict[str, List[Node]]] = {}
+        self._reverse: Dict[Node, Dict[str, Set[Node]]] = defaultdict(
+            lambda: defaultdict(set)
+        )
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse_url(cls, url: Any) -> Optional[Node]:
+        """
+        Convierte `https://ghibli.rest/people/<id>` en ("people", "<id>")
+        """
+        if not isinstance(url, str):
+            return None
+        parts = urlparse(url).path.strip("/").split("/")
+        if len(parts) < 2 or parts[-2] not in cls.RESOURCES or not parts[-1]:
+            return None
+        return parts[-2], parts[-1]
+
+    def _record_edges(self, record: dict) -> Dict[str, List[Node]]:
+        edges: Dict[str, List[Node]] = defaultdict(list)
+        for key, value in record.items():
+            if key == "url":
+                continue
+            for url in value if isinstance(value, list) else [value]:
+                target = self.parse_url(url)
+                if target is not None and target not in edges[target[0]]:
+                    edges[target[0]].append(target)
+        return dict(edges)
+
+    def update(self, resource: str, records: List[dict]) -> None:
+        """
+        Reemplaza las aristas salientes de un dataset recién cargado
+        """
+        with self._lock:
+            for node in [n for n in self._forward if n[0] == resource]:
+                for targets in self._forward.pop(node).values():
+                    for target in targets:
+                        self._reverse[target][resource].discard(node)
+
+            for record in records:
+                if not isinstance(record, dict) or "id" not in record:
+                    continue
+                node = (resource, str(record["id"]))
+                edges = self._record_edges(record)
+                self._forward[node] = edges
+                for targets in edges.values():
+                    for target in targets:
+                        self._reverse[target][resource].add(node)
+
+            self._sources[resource] = records
+        logger.debug(f"Relation graph updated for {resource}")
+
+    def ensure(self, resource: str, records: List[dict]) -> None:
+        """
+        Actualiza el grafo solo si el dataset no es la versión ya cargada
+        """
+        if self._sources.get(resource) is not records:
+            self.update(resource, records)
+
+    def neighbors(self, node: Node, resource: str) -> List[Node]:
+        """
+        Registros de `resource` relacionados con el nodo (en ambos sentidos)
+        """
+        forward = self._forward.get(node, {}).get(resource, [])
+        reverse = self._reverse.get(node, {}).get(resource, set())
+        return forward + sorted(reverse.difference(forward))
+
+
+# Instancias globales de los índices
+id_index = IdIndex()
+search_index = SearchIndex()
+relation_graph = RelationGraph()
@@ -0,0 +1,140 @@
+import json
+import mmap
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class Snapshot:
+    """
+    Copia en disco de un dataset obtenido de la API
+    """
+
+    name: str
+    saved_at: float
+    size: int
+    data: Any
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.saved_at
+
+
+class SnapshotStore:
+    """
+    Guarda cada dataset en un archivo `<name>.snap` con el formato:
+
+        {"name": ..., "saved_at": ...}\\n<payload JSON compacto>
+
+    La escritura es atómica (archivo temporal + os.replace) y la lectura se
+    hace sobre un mmap del archivo.
+    """
+
+    SUFFIX = ".snap"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # Snapshots ya leídos, indexados por nombre y validados por mtime
+        self._loaded: Dict[str, Tuple[float, Snapshot]] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}{self.SUFFIX}")
+
+    def save(self, name: str, data: Any) -> bool:
+        """
+        Persiste un dataset de forma atómica
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            header = json.dumps({"name": name, "saved_at": time.time()})
+            payload = json.dumps(data, separators=(",", ":"))
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.directory, prefix=f".{name}.", suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(header)
+                    f.write("\n")
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self._path(name))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            logger.debug(f"Snapshot saved for {name}")
+            return True
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Error saving snapshot {name}: {str(e)}")
+            return False
+
+    def load(self, name: str) -> Optional[Snapshot]:
+        """
+        Lee un snapshot del disco (o de memoria si no cambió desde la última
+        lectura)
+        """
+        path = self._path(name)
+        try:
+            mtime = os.stat(path).st_mtime
+            cached = self._loaded.get(name)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+            with open(path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mm:
+                header_end = mm.find(b"\n")
+                header = json.loads(mm[:header_end])
+                snapshot = Snapshot(
+                    name=name,
+                    saved_at=header["saved_at"],
+                    size=len(mm),
+                    data=json.loads(mm[header_end + 1 :]),
+                )
+            self._loaded[name] = (mtime, snapshot)
+            return snapshot
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error loading snapshot {name}: {str(e)}")
+            return None
+
+    def load_data(self, name: str) -> Optional[Any]:
+        """
+        Retorna solo el payload del snapshot, si existe
+        """
+        snapshot = self.load(name)
+        return snapshot.data if snapshot is not None else None
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Describe los snapshots disponibles (antigüedad y tamaño)
+        """
+        result = {}
+        if not os.path.isdir(self.directory):
+            return result
+
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(self.SUFFIX):
+                continue
+            snapshot = self.load(filename[: -len(self.SUFFIX)])
+            if snapshot is None:
+                continue
+            result[snapshot.name] = {
+                "saved_at": snapshot.saved_at,
+                "age_seconds": round(snapshot.age, 3),
+                "size_bytes": snapshot.size,
+            }
+        return result
+
+
+# Instancia global del almacén de snapshots
+snapshot_store = SnapshotStore(settings.GHIBLI_SNAPSHOT_DIR)
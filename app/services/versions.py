@@ -0,0 +1,212 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.cache import cache
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class RecordState:
+    """
+    Estado versionado de un registro: versión en que apareció, versión del
+    último cambio (o de su eliminación) y hash del contenido
+    """
+
+    created: int
+    modified: int
+    digest: Optional[str]
+
+    # Marca de registro eliminado en lugar del hash
+    REMOVED = "-"
+
+    @property
+    def removed(self) -> bool:
+        return self.digest is None
+
+    @classmethod
+    def parse(cls, raw: str) -> "RecordState":
+        created, modified, digest = raw.split(":", 2)
+        return cls(
+            int(created), int(modified), None if digest == cls.REMOVED else digest
+        )
+
+    def dump(self) -> str:
+        return f"{self.created}:{self.modified}:{self.digest or self.REMOVED}"
+
+
+@dataclass
+class DatasetUpdate:
+    """
+    Resultado de registrar una nueva carga de un dataset
+    """
+
+    version: int
+    changed: bool
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+
+class DatasetVersions:
+    """
+    Versión monotónica por recurso y hash de contenido por registro
+
+    Todo el estado de un recurso vive en un hash de Redis `versions:<key>`:
+    el campo `_version` es el contador y cada id de registro guarda
+    "<created>:<modified>:<sha>" ("-" como sha si fue eliminado). Una carga
+    sin cambios no incrementa la versión ni escribe nada; una con cambios
+    escribe solo los campos de los registros que cambiaron.
+    """
+
+    VERSION_FIELD = "_version"
+
+    @staticmethod
+    def _state_key(key: str) -> str:
+        return f"versions:{key}"
+
+    @staticmethod
+    def record_digest(record: Any) -> str:
+        """
+        Hash del contenido de un registro (JSON canónico)
+        """
+        canonical = json.dumps(record, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+    def _parse_state(self, raw: Optional[Dict[str, str]]) -> Optional[Dict[str, Any]]:
+        if raw is None:
+            return None
+        version = int(raw.pop(self.VERSION_FIELD, 0))
+        return {
+            "version": version,
+            "records": {
+                record_id: RecordState.parse(value) for record_id, value in raw.items()
+            },
+        }
+
+    async def _aload(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._parse_state(await cache.ahgetall(self._state_key(key)))
+
+    def _diff(
+        self, state: Dict[str, Any], records: List[dict]
+    ) -> Tuple[DatasetUpdate, Dict[str, str]]:
+        """
+        Compara una carga con el estado guardado sin escribir nada
+        Retorna el resultado (con la versión actual) y el hash de cada registro
+        """
+        previous = state["records"]
+        digests = {
+            str(record["id"]): self.record_digest(record)
+            for record in records
+            if isinstance(record, dict) and "id" in record
+        }
+        added = [
+            record_id
+            for record_id in digests
+            if record_id not in previous or previous[record_id].removed
+        ]
+        modified = [
+            record_id
+            for record_id, digest in digests.items()
+            if record_id in previous
+            and not previous[record_id].removed
+            and previous[record_id].digest != digest
+        ]
+        removed = [
+            record_id
+            for record_id, record_state in previous.items()
+            if not record_state.removed and record_id not in digests
+        ]
+        update = DatasetUpdate(
+            version=state["version"],
+            changed=not state["version"] or bool(added or modified or removed),
+            added=added,
+            modified=modified,
+            removed=removed,
+        )
+        return update, digests
+
+    @staticmethod
+    def _changed_fields(
+        key: str,
+        state: Dict[str, Any],
+        update: DatasetUpdate,
+        digests: Dict[str, str],
+    ) -> Dict[str, str]:
+        """
+        Campos del hash a escribir para la nueva versión (solo lo que cambió)
+        """
+        previous = state["records"]
+        version = update.version
+        changes = {}
+        for record_id in update.added:
+            changes[record_id] = RecordState(version, version, digests[record_id])
+        for record_id in update.modified:
+            created = previous[record_id].created
+            changes[record_id] = RecordState(created, version, digests[record_id])
+        for record_id in update.removed:
+            changes[record_id] = RecordState(previous[record_id].created, version, None)
+        logger.info(
+            f"{key} is now at version {version}: {len(update.added)} added, "
+            f"{len(update.modified)} modified, {len(update.removed)} removed"
+        )
+        return {
+            record_id: record_state.dump()
+            for record_id, record_state in changes.items()
+        }
+
+    async def aupdate(self, key: str, records: List[dict]) -> Optional[DatasetUpdate]:
+        """
+        Registra una carga del dataset y retorna qué cambió respecto de la
+        anterior (None si Redis no está disponible)
+        """
+        state = await self._aload(key)
+        if state is None:
+            return None
+
+        update, digests = self._diff(state, records)
+        if not update.changed:
+            return update
+
+        version = await cache.ahincrby(self._state_key(key), self.VERSION_FIELD)
+        if version is None:
+            return None
+        update.version = version
+        await cache.ahset(
+            self._state_key(key), self._changed_fields(key, state, update, digests)
+        )
+        return update
+
+    @staticmethod
+    def _since(state: Optional[Dict[str, Any]], since: int) -> Optional[DatasetUpdate]:
+        if state is None:
+            return None
+
+        result = DatasetUpdate(
+            version=state["version"], changed=state["version"] > since
+        )
+        for record_id, record_state in sorted(state["records"].items()):
+            if record_state.modified <= since:
+                continue
+            if record_state.removed:
+                # Si apareció y desapareció después de `since` el cliente no lo vio
+                if record_state.created <= since:
+                    result.removed.append(record_id)
+            elif record_state.created > since:
+                result.added.append(record_id)
+            else:
+                result.modified.append(record_id)
+        return result
+
+    async def achanges_since(self, key: str, since: int) -> Optional[DatasetUpdate]:
+        """
+        Ids agregados, modificados y eliminados después de la versión `since`
+        """
+        return self._since(await self._aload(key), since)
+
+
+# Instancia global del versionado de datasets
+dataset_versions = DatasetVersions()
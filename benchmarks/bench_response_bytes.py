@@ -0,0 +1,82 @@
+"""
+Benchmark: costo por request de servir /api/v1/ghibli/ desde el caché
+
+Compara el camino anterior (valor de Redis -> CacheSerializer.loads ->
+jsonable_encoder -> JSONResponse.render) con el camino de bytes
+pre-serializados (bytes de Redis -> quitar prefijo -> Response).
+
+Las entradas se arman con los formatos reales del caché: el valor con
+CacheSerializer (codec y compresión configurados) y el cuerpo con render_json
+y el prefijo de RedisCache._body_header, leído con RedisCache._parse_body.
+
+Uso: python -m benchmarks.bench_response_bytes
+"""
+
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from app.core.cache import CacheSerializer, RedisCache, render_json
+from app.core.config import settings
+
+
+def make_record(kind: str, i: int) -> dict:
+    return {
+        "id": f"{kind}-{i:04d}-2baf70d1-42bb-4437-b551",
+        "title": f"{kind.title()} {i}",
+        "name": f"{kind.title()} {i}",
+        "description": "The orphan Sheeta inherited a mysterious crystal " * 6,
+        "director": "Hayao Miyazaki",
+        "producer": "Isao Takahata",
+        "release_date": "1986",
+        "people": [f"https://ghibli.rest/people/{j}" for j in range(8)],
+        "url": f"https://ghibli.rest/{kind}/{i}",
+    }
+
+
+def make_payloads() -> dict:
+    films = [make_record("films", i) for i in range(22)]
+    all_data = {
+        kind: [make_record(kind, i) for i in range(count)]
+        for kind, count in (
+            ("films", 22),
+            ("people", 57),
+            ("locations", 24),
+            ("species", 7),
+            ("vehicles", 3),
+        )
+    }
+    return {"films": films, "all_data": all_data}
+
+
+def bench(name: str, payload, number: int = 2000) -> None:
+    serializer = CacheSerializer(
+        settings.CACHE_CODEC,
+        settings.CACHE_COMPRESSION,
+        settings.CACHE_COMPRESSION_THRESHOLD,
+    )
+    cached_value = serializer.dumps(payload)
+    body = render_json(payload)
+    cached_bytes = RedisCache._body_header(0.0, 0.0) + body
+
+    def decode_encode():
+        value = serializer.loads(cached_value)
+        return JSONResponse(jsonable_encoder(value)).body
+
+    def raw_bytes():
+        return RedisCache._parse_body(cached_bytes).body
+
+    assert decode_encode() == raw_bytes() == JSONResponse(payload).body
+
+    before = timeit.timeit(decode_encode, number=number) / number * 1e6
+    after = timeit.timeit(raw_bytes, number=number) / number * 1e6
+    print(
+        f"{name:<10} {len(body):>8} bytes  decode+encode {before:9.1f} us"
+        f"  raw bytes {after:7.1f} us  ({before / after:,.0f}x)"
+    )
+
+
+if __name__ == "__main__":
+    for name, payload in make_payloads().items():
+        bench(name, payload)
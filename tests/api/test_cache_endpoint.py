@@ -0,0 +1,61 @@
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from app.core.cache import cache
+from app.core.config import settings
+
+
+class TestCacheEndpoint:
+    """Tests for the cache administration endpoints"""
+
+    def test_invalidate_namespace_admin_only(
+        self,
+        client: TestClient,
+        superuser_token_headers,
+        normal_user_token_headers,
+    ):
+        """Test only admins can bump a namespace generation"""
+        url = f"{settings.API_V1_STR}/cache/namespaces/ghibli/invalidate"
+        with patch.object(
+            cache, "ainvalidate_namespace", AsyncMock(return_value=4)
+        ) as mock_invalidate:
+            response = client.post(url, headers=normal_user_token_headers)
+            assert response.status_code == 403
+            mock_invalidate.assert_not_called()
+
+            response = client.post(url, headers=superuser_token_headers)
+            assert response.status_code == 200
+            assert response.json() == {"namespace": "ghibli", "generation": 4}
+            mock_invalidate.assert_awaited_once_with("ghibli")
+
+    def test_invalidate_unknown_namespace(
+        self, client: TestClient, superuser_token_headers
+    ):
+        """Test unknown namespaces are rejected with 404"""
+        response = client.post(
+            f"{settings.API_V1_STR}/cache/namespaces/unknown/invalidate",
+            headers=superuser_token_headers,
+        )
+        assert response.status_code == 404
+
+    def test_invalidate_namespace_cache_unavailable(
+        self, client: TestClient, superuser_token_headers
+    ):
+        """Test a down Redis answers 503 instead of pretending it invalidated"""
+        with patch.object(cache, "ainvalidate_namespace", AsyncMock(return_value=None)):
+            response = client.post(
+                f"{settings.API_V1_STR}/cache/namespaces/ghibli/invalidate",
+                headers=superuser_token_headers,
+            )
+        assert response.status_code == 503
+
+    def test_get_namespaces(self, client: TestClient, superuser_token_headers):
+        """Test the current generation of each namespace is listed"""
+        with patch.object(cache, "generations", {"ghibli": 2}):
+            response = client.get(
+                f"{settings.API_V1_STR}/cache/namespaces",
+                headers=superuser_token_headers,
+            )
+        assert response.status_code == 200
+        assert response.json() == {"ghibli": 2, "users": 0}
@@ -1,14 +1,23 @@
-from unittest.mock import MagicMock, patch
+import gzip
+import json
+import time
+from unittest.mock import ANY, patch
 
+import httpx
 import pytest
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
+from app.api.v1.endpoints.ghibli import accepted_encodings
+from app.core.cache import CachedBody, CacheEntry, RedisCache
 from app.core.config import settings
 from app.core.logging import get_logger
 from app.models.user import UserRole
-from app.services.ghibli import GhibliService
+from app.services.circuit_breaker import circuit_breakers
+from app.services.ghibli import STALE_SERVED, GhibliService
+from app.services.snapshot import snapshot_store
+from app.services.versions import DatasetUpdate, DatasetVersions
 from tests.utils import create_user_in_db
 
 logger = get_logger(__name__)
@@ -49,6 +58,17 @@ def mock_ghibli_people_response():
     ]
 
 
+def mock_ghibli_client(routes: dict) -> httpx.AsyncClient:
+    """Build an async client whose transport answers from a path->payload map"""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=routes.get(request.url.path, []))
+
+    return httpx.AsyncClient(
+        base_url=GhibliService.BASE_URL, transport=httpx.MockTransport(handler)
+    )
+
+
 class TestGhibliEndpoint:
     """Tests for Ghibli API endpoints"""
 
@@ -79,10 +99,8 @@ class TestGhibliEndpoint:
         headers = {"Authorization": f"Bearer {tokens['access_token']}"}
 
         # Mock the Ghibli API response
-        with patch("app.services.ghibli.requests.get") as mock_get:
-            mock_get.return_value.json.return_value = mock_ghibli_films_response
-            mock_get.return_value.raise_for_status = MagicMock()
-
+        client_mock = mock_ghibli_client({"/films": mock_ghibli_films_response})
+        with patch.object(GhibliService, "_client", client_mock):
             response = client.get(
                 f"{settings.API_V1_STR}/ghibli/",
                 headers=headers,
@@ -103,24 +121,13 @@ class TestGhibliEndpoint:
     ):
         """Test getting all Ghibli data with admin role"""
         # Mock the Ghibli API responses for all endpoints
-        with patch("app.services.ghibli.requests.get") as mock_get:
-
-            def mock_get_response(*args, **kwargs):
-                url = args[0]
-                mock_response = MagicMock()
-                mock_response.raise_for_status = MagicMock()
-
-                if "/films" in url:
-                    mock_response.json.return_value = mock_ghibli_films_response
-                elif "/people" in url:
-                    mock_response.json.return_value = mock_ghibli_people_response
-                else:
-                    mock_response.json.return_value = []
-
-                return mock_response
-
-            mock_get.side_effect = mock_get_response
-
+        client_mock = mock_ghibli_client(
+            {
+                "/films": mock_ghibli_films_response,
+                "/people": mock_ghibli_people_response,
+            }
+        )
+        with patch.object(GhibliService, "_client", client_mock):
             response = client.get(
                 f"{settings.API_V1_STR}/ghibli/",
                 headers=superuser_token_headers,
@@ -139,3 +146,441 @@ class TestGhibliEndpoint:
         response = client.get(f"{settings.API_V1_STR}/ghibli/")
         assert response.status_code == 401
         assert "could not validate credentials" in response.json()["detail"].lower()
+
+    def test_get_snapshot_status_admin_only(
+        self,
+        client: TestClient,
+        superuser_token_headers,
+        normal_user_token_headers,
+    ):
+        """Test snapshot freshness is only visible to admins"""
+        snapshot_store.save("films", [])
+
+        response = client.get(
+            f"{settings.API_V1_STR}/ghibli/snapshots",
+            headers=normal_user_token_headers,
+        )
+        assert response.status_code == 403
+
+        response = client.get(
+            f"{settings.API_V1_STR}/ghibli/snapshots",
+            headers=superuser_token_headers,
+        )
+        assert response.status_code == 200
+        assert "age_seconds" in response.json()["films"]
+
+    def test_export_ndjson_streams_every_resource_for_admin(
+        self,
+        client: TestClient,
+        superuser_token_headers,
+        mock_ghibli_films_response,
+        mock_ghibli_people_response,
+    ):
+        """Test the admin export streams one record per line, resource by resource"""
+        client_mock = mock_ghibli_client(
+            {
+                "/films": mock_ghibli_films_response,
+                "/people": mock_ghibli_people_response,
+            }
+        )
+        with patch.object(GhibliService, "_client", client_mock):
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/export?format=ndjson",
+                headers=superuser_token_headers,
+            )
+
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/x-ndjson"
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            assert [line["resource"] for line in lines] == ["films", "people"]
+            assert lines[0]["record"]["title"] == "Castle in the Sky"
+
+    def test_export_rejects_unknown_format(
+        self,
+        client: TestClient,
+        normal_user_token_headers,
+    ):
+        """Test only the ndjson export format is accepted"""
+        response = client.get(
+            f"{settings.API_V1_STR}/ghibli/export?format=csv",
+            headers=normal_user_token_headers,
+        )
+        assert response.status_code == 422
+
+    def test_get_ghibli_changes_since_version(
+        self,
+        client: TestClient,
+        normal_user_token_headers,
+        mock_ghibli_films_response,
+    ):
+        """Test the changes endpoint returns records changed after a version"""
+        film = mock_ghibli_films_response[0]
+        changes = DatasetUpdate(
+            version=4, changed=True, modified=[film["id"]], removed=["gone"]
+        )
+        client_mock = mock_ghibli_client({"/films": mock_ghibli_films_response})
+        with patch.object(GhibliService, "_client", client_mock), patch(
+            "app.services.ghibli.dataset_versions", spec=DatasetVersions
+        ) as mock_versions:
+            mock_versions.achanges_since.return_value = changes
+
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/films/changes?since=3",
+                headers=normal_user_token_headers,
+            )
+
+            assert response.status_code == 200
+            body = response.json()
+            assert body["version"] == 4
+            assert body["added"] == []
+            assert body["modified"][0]["title"] == "Castle in the Sky"
+            assert body["removed"] == ["gone"]
+            mock_versions.achanges_since.assert_called_with("ghibli:/films", 3)
+
+    def test_get_upstream_diagnostics_admin_only(
+        self,
+        client: TestClient,
+        superuser_token_headers,
+        normal_user_token_headers,
+    ):
+        """Test circuit breaker state is only visible to admins"""
+        circuit_breakers.get("/films").record_failure("timed out")
+
+        response = client.get(
+            f"{settings.API_V1_STR}/ghibli/diagnostics",
+            headers=normal_user_token_headers,
+        )
+        assert response.status_code == 403
+
+        response = client.get(
+            f"{settings.API_V1_STR}/ghibli/diagnostics",
+            headers=superuser_token_headers,
+        )
+        assert response.status_code == 200
+        films = response.json()["circuit_breakers"]["/films"]
+        assert films["state"] == "closed"
+        assert films["consecutive_failures"] == 1
+        tiers = response.json()["cache"]["tiers"]
+        assert set(tiers) == {"l1", "l2"}
+        assert 0.0 <= tiers["l1"]["hit_ratio"] <= 1.0
+
+    def test_get_ghibli_entity_by_id(
+        self,
+        client: TestClient,
+        normal_user_token_headers,
+        mock_ghibli_films_response,
+    ):
+        """Test fetching a single film by id with the films role"""
+        film_id = mock_ghibli_films_response[0]["id"]
+        client_mock = mock_ghibli_client({"/films": mock_ghibli_films_response})
+        with patch.object(GhibliService, "_client", client_mock):
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/films/{film_id}",
+                headers=normal_user_token_headers,
+            )
+            assert response.status_code == 200
+            assert response.json()["title"] == "Castle in the Sky"
+
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/films/unknown-id",
+                headers=normal_user_token_headers,
+            )
+            assert response.status_code == 404
+
+    def test_get_ghibli_entity_role_gating(
+        self,
+        client: TestClient,
+        normal_user_token_headers,
+    ):
+        """Test a films user cannot read people records or unknown resources"""
+        response = client.get(
+            f"{settings.API_V1_STR}/ghibli/people/some-id",
+            headers=normal_user_token_headers,
+        )
+        assert response.status_code == 403
+
+        response = client.get(
+            f"{settings.API_V1_STR}/ghibli/starships/some-id",
+            headers=normal_user_token_headers,
+        )
+        assert response.status_code == 404
+
+    def test_get_ghibli_data_pagination_and_fields(
+        self,
+        client: TestClient,
+        normal_user_token_headers,
+    ):
+        """Test limit/cursor pagination with field projection"""
+        films = [
+            {"id": str(i), "title": f"Film {i}", "description": "..."} for i in range(5)
+        ]
+        client_mock = mock_ghibli_client({"/films": films})
+        with patch.object(GhibliService, "_client", client_mock):
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/",
+                params={"limit": 2, "fields": "id,title"},
+                headers=normal_user_token_headers,
+            )
+            assert response.status_code == 200
+            page = response.json()
+            assert page["items"] == [
+                {"id": "0", "title": "Film 0"},
+                {"id": "1", "title": "Film 1"},
+            ]
+
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/",
+                params={"limit": 2, "cursor": page["next_cursor"]},
+                headers=normal_user_token_headers,
+            )
+            assert [item["id"] for item in response.json()["items"]] == ["2", "3"]
+
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/",
+                params={"cursor": "not-a-cursor"},
+                headers=normal_user_token_headers,
+            )
+            assert response.status_code == 400
+
+    def test_search_ghibli_data(
+        self,
+        client: TestClient,
+        normal_user_token_headers,
+        mock_ghibli_films_response,
+        mock_ghibli_people_response,
+    ):
+        """Test search only covers the resources visible to the role"""
+        client_mock = mock_ghibli_client(
+            {
+                "/films": mock_ghibli_films_response,
+                "/people": mock_ghibli_people_response,
+            }
+        )
+        with patch.object(GhibliService, "_client", client_mock):
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/search",
+                params={"q": "cast"},
+                headers=normal_user_token_headers,
+            )
+            assert response.status_code == 200
+            results = response.json()
+            assert results[0]["id"] == mock_ghibli_films_response[0]["id"]
+
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/search",
+                params={"q": "pazu"},
+                headers=normal_user_token_headers,
+            )
+            assert response.json() == []
+
+    def test_get_ghibli_data_expand_relations(
+        self,
+        client: TestClient,
+        superuser_token_headers,
+        normal_user_token_headers,
+        mock_ghibli_films_response,
+        mock_ghibli_people_response,
+    ):
+        """Test films can embed related people; roles cannot expand hidden data"""
+        film_id = mock_ghibli_films_response[0]["id"]
+        people = [
+            {
+                **mock_ghibli_people_response[0],
+                "films": [f"https://ghibli.rest/films/{film_id}"],
+            }
+        ]
+        client_mock = mock_ghibli_client(
+            {"/films": mock_ghibli_films_response, "/people": people}
+        )
+        with patch.object(GhibliService, "_client", client_mock):
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/",
+                params={"resource": "films", "expand": "people", "fields": "id"},
+                headers=superuser_token_headers,
+            )
+            assert response.status_code == 200
+            film = response.json()[0]
+            assert film["id"] == film_id
+            assert [person["name"] for person in film["people"]] == ["Pazu"]
+
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/films/{film_id}",
+                params={"expand": "people"},
+                headers=normal_user_token_headers,
+            )
+            assert response.status_code == 403
+
+    def test_get_ghibli_data_conditional_get(
+        self,
+        client: TestClient,
+        normal_user_token_headers,
+        mock_ghibli_films_response,
+    ):
+        """Test a matching If-None-Match returns 304 without loading the payload"""
+        etag = '"abc123"'
+        client_mock = mock_ghibli_client({"/films": mock_ghibli_films_response})
+        with patch.object(
+            GhibliService, "aget_response_etag", return_value=etag
+        ), patch.object(GhibliService, "_client", client_mock):
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/",
+                headers=normal_user_token_headers,
+            )
+            assert response.status_code == 200
+            assert response.headers["ETag"] == etag
+            assert "max-age" in response.headers["Cache-Control"]
+
+            with patch.object(GhibliService, "aquery_data") as mock_query:
+                response = client.get(
+                    f"{settings.API_V1_STR}/ghibli/",
+                    headers={**normal_user_token_headers, "If-None-Match": etag},
+                )
+                assert response.status_code == 304
+                assert response.content == b""
+                mock_query.assert_not_called()
+
+    def test_get_ghibli_data_serves_cached_bytes(
+        self,
+        client: TestClient,
+        normal_user_token_headers,
+    ):
+        """Test the default response is served from pre-serialized bytes"""
+        body = b'[{"id":"cached"}]'
+        with patch.object(
+            GhibliService, "aget_response_body", return_value=(body, None)
+        ), patch.object(GhibliService, "aquery_data") as mock_query:
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/",
+                headers=normal_user_token_headers,
+            )
+
+            assert response.status_code == 200
+            assert response.content == body
+            assert response.headers["content-type"] == "application/json"
+            mock_query.assert_not_called()
+
+    def test_default_route_refreshes_early_by_compute_cost(
+        self,
+        client: TestClient,
+        normal_user_token_headers,
+    ):
+        """Test XFetch is decided once per request on the body and 304 routes"""
+        body = b'[{"id":"cached"}]'
+        soft = time.time() + 5
+        header = CacheEntry(
+            value=None,
+            soft_expires_at=soft,
+            hard_expires_at=soft + 60,
+            meta={"etag": '"abc"'},
+            compute_seconds=10,
+        )
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService, "_schedule_refresh"
+        ) as mock_schedule, patch.object(
+            GhibliService, "aquery_data"
+        ) as mock_query, patch(
+            "app.core.cache.random.random", return_value=0.9
+        ), patch.object(
+            settings, "CACHE_XFETCH_BETA", 1.0
+        ), patch.dict(
+            GhibliService.coalescing_stats, {"early_refreshes": 0}
+        ):
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_headers.return_value = {"ghibli:/films": header}
+            mock_cache.aget_body.side_effect = lambda key, encoding=None: (
+                None if encoding else CachedBody(body, soft, 10)
+            )
+
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/",
+                headers=normal_user_token_headers,
+            )
+            assert response.status_code == 200
+            assert response.content == body
+            mock_schedule.assert_called_once_with("ghibli:/films", ANY, STALE_SERVED)
+            assert GhibliService.coalescing_stats["early_refreshes"] == 1
+
+            mock_schedule.reset_mock()
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/",
+                headers={**normal_user_token_headers, "If-None-Match": '"abc"'},
+            )
+            assert response.status_code == 304
+            mock_schedule.assert_called_once_with("ghibli:/films", ANY, STALE_SERVED)
+            assert GhibliService.coalescing_stats["early_refreshes"] == 2
+            mock_query.assert_not_called()
+
+    def test_get_ghibli_data_serves_precompressed_variant(
+        self,
+        client: TestClient,
+        normal_user_token_headers,
+    ):
+        """Test Accept-Encoding selects the gzip variant stored at refresh time"""
+        body = b'[{"id":"cached"}]'
+        with patch.object(
+            GhibliService,
+            "aget_response_body",
+            return_value=(gzip.compress(body), "gzip"),
+        ) as mock_body, patch.object(
+            GhibliService, "aget_response_etag", return_value='"abc"'
+        ), patch.object(
+            gzip, "compress", side_effect=AssertionError("compressed per request")
+        ):
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/",
+                headers={**normal_user_token_headers, "Accept-Encoding": "gzip"},
+            )
+
+            assert response.status_code == 200
+            assert response.headers["content-encoding"] == "gzip"
+            assert response.headers["ETag"] == 'W/"abc"'
+            assert "Accept-Encoding" in response.headers["Vary"]
+            assert response.content == body
+            assert mock_body.call_args.args[2] == ["gzip"]
+
+    def test_not_modified_etag_matches_served_variant(
+        self,
+        client: TestClient,
+        normal_user_token_headers,
+    ):
+        """Test a 304 carries the same weak/strong ETag the 200 would carry"""
+        with patch.object(
+            GhibliService, "aget_response_etag", return_value='"abc"'
+        ), patch.object(
+            GhibliService, "aget_response_encoding", return_value="gzip"
+        ) as mock_encoding:
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/",
+                headers={
+                    **normal_user_token_headers,
+                    "Accept-Encoding": "gzip",
+                    "If-None-Match": 'W/"abc"',
+                },
+            )
+            assert response.status_code == 304
+            assert response.headers["ETag"] == 'W/"abc"'
+            assert mock_encoding.call_args.args[2] == ["gzip"]
+
+            mock_encoding.return_value = None
+            response = client.get(
+                f"{settings.API_V1_STR}/ghibli/",
+                headers={
+                    **normal_user_token_headers,
+                    "Accept-Encoding": "identity",
+                    "If-None-Match": '"abc"',
+                },
+            )
+            assert response.status_code == 304
+            assert response.headers["ETag"] == '"abc"'
+            assert mock_encoding.call_args.args[2] == []
+
+    def test_accepted_encodings_honours_q_values(self):
+        """Test encodings are ranked by q-value, then by server preference"""
+        with patch.object(settings, "GHIBLI_RESPONSE_ENCODINGS", ["br", "gzip"]):
+            assert accepted_encodings("gzip, br") == ["br", "gzip"]
+            assert accepted_encodings("gzip;q=1.0, br;q=0.5") == ["gzip", "br"]
+            assert accepted_encodings("br;q=0, *") == ["gzip"]
+            assert accepted_encodings("identity") == []
+            assert accepted_encodings(None) == []
@@ -0,0 +1,26 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+class TestMetricsEndpoint:
+    """Tests for the Prometheus metrics endpoint"""
+
+    def test_metrics_exposed_in_prometheus_format(self, client: TestClient):
+        """Test /metrics serves the cache and upstream metrics as text"""
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "# TYPE cache_requests_total counter" in response.text
+        assert "# TYPE upstream_request_duration_seconds histogram" in response.text
+        assert "# TYPE cache_codec_duration_seconds histogram" in response.text
+
+    def test_metrics_disabled(self, client: TestClient):
+        """Test /metrics answers 404 when disabled in settings"""
+        with patch.object(settings, "METRICS_ENABLED", False):
+            response = client.get("/metrics")
+
+        assert response.status_code == 404
@@ -10,11 +10,14 @@ from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel, create_engine
 from sqlmodel.pool import StaticPool
 
+from app.core.cache import cache
 from app.core.config import settings
 from app.core.logging import get_logger
 from app.db.session import get_session
 from app.main import app
 from app.models.user import UserRole
+from app.services.circuit_breaker import circuit_breakers
+from app.services.snapshot import snapshot_store
 from tests.utils import create_user_in_db
 
 logger = get_logger(__name__)
@@ -30,6 +33,39 @@ engine = create_engine(
 )
 
 
+@pytest.fixture(autouse=True, scope="session")
+def no_redis_reconnect():
+    """
+    Stop the background Redis reconnection started at import time (there is
+    no Redis in tests) so it never flips the connection state mid-test.
+    """
+    cache._reconnect_stop.set()
+    if cache._reconnect_thread is not None:
+        cache._reconnect_thread.join()
+
+
+@pytest.fixture(autouse=True)
+def isolated_snapshot_store(tmp_path, monkeypatch):
+    """
+    Point the snapshot store at a per-test directory so tests never share
+    (or leave behind) on-disk datasets.
+    """
+    monkeypatch.setattr(snapshot_store, "directory", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(snapshot_store, "_loaded", {})
+
+
+@pytest.fixture(autouse=True)
+def isolated_circuit_breakers(monkeypatch):
+    """
+    Start every test with closed circuits and no retry backoff, so upstream
+    failures in one test never leak into (or slow down) another.
+    """
+    monkeypatch.setattr(settings, "GHIBLI_RETRY_BACKOFF_BASE", 0.0)
+    circuit_breakers.reset()
+    yield
+    circuit_breakers.reset()
+
+
 @pytest.fixture(name="session")
 def session_fixture() -> Generator[Session, None, None]:
     """
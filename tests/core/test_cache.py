@@ -0,0 +1,508 @@
+import gzip
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from prometheus_client import REGISTRY
+from redis.exceptions import ConnectionError
+
+from app.core.cache import (
+    CODEC_AVAILABLE,
+    CachedBody,
+    CacheEntry,
+    CacheSerializer,
+    LocalCache,
+    RedisCache,
+    compute_etag,
+)
+from app.core.config import settings
+
+
+def sample(name: str, **labels) -> float:
+    """Current value of a Prometheus sample (0 if never observed)"""
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestLocalCache:
+    """Tests for the in-process L1 cache"""
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest untouched key is evicted when the cache is full"""
+        local = LocalCache(max_entries=2, ttl=60)
+        local.set("a", 1)
+        local.set("b", 2)
+        local.get("a")
+        local.set("c", 3)
+
+        assert local.get("a") == 1
+        assert local.get("b") is None
+        assert local.get("c") == 3
+
+    def test_expires_entries(self):
+        """Test entries are dropped once their TTL has elapsed"""
+        local = LocalCache(max_entries=10, ttl=60)
+        with patch("app.core.cache.time.monotonic", return_value=1000.0):
+            local.set("a", 1)
+        with patch("app.core.cache.time.monotonic", return_value=1061.0):
+            assert local.get("a") is None
+
+
+class TestCacheSerializer:
+    """Tests for the self-describing cache value format"""
+
+    value = {"films": [{"id": str(i), "title": "Castle in the Sky"} for i in range(50)]}
+
+    @pytest.mark.parametrize("codec", ["json", "orjson", "msgpack"])
+    def test_roundtrip_per_codec(self, codec):
+        """Test every available codec reads back what it wrote"""
+        if not CODEC_AVAILABLE[codec]:
+            pytest.skip(f"{codec} not installed")
+        serializer = CacheSerializer(codec, "none", threshold=0)
+
+        assert serializer.loads(serializer.dumps(self.value)) == self.value
+
+    def test_compresses_above_threshold(self):
+        """Test large payloads are compressed and small ones are not"""
+        serializer = CacheSerializer("json", "zlib", threshold=1024)
+
+        large, raw_size = serializer.encode(self.value)
+        small, _ = serializer.encode({"id": "1"})
+
+        assert len(large) < raw_size
+        assert small[CacheSerializer.HEADER_SIZE :] == b'{"id":"1"}'
+        assert serializer.loads(large) == self.value
+
+    def test_reads_values_written_by_other_configurations(self):
+        """Test the header lets any reader decode any writer's format"""
+        writer = CacheSerializer("json", "zlib", threshold=0)
+        reader = CacheSerializer("json", "none", threshold=0)
+
+        assert reader.loads(writer.dumps(self.value)) == self.value
+
+    def test_reads_legacy_json_text(self):
+        """Test entries written before the codec layer are still readable"""
+        serializer = CacheSerializer("auto", "zlib", threshold=0)
+
+        assert serializer.loads(b'{"films": []}') == {"films": []}
+
+
+class TestRedisCacheTiers:
+    """Tests for the L1 layer in front of Redis"""
+
+    @pytest.fixture
+    def redis_cache(self):
+        """RedisCache singleton wired to a mocked async Redis client"""
+        instance = RedisCache()
+        client = AsyncMock()
+        pipe = MagicMock()
+        pipe.execute = AsyncMock()
+        client.pipeline = MagicMock()
+        client.pipeline.return_value.__aenter__.return_value = pipe
+        with patch.object(instance, "redis_client", MagicMock()), patch.object(
+            instance, "async_client", client
+        ), patch.object(instance, "generations", {}), patch.object(
+            instance, "_is_connected", True
+        ), patch.object(
+            instance, "local", LocalCache(10, 60)
+        ), patch.object(
+            instance,
+            "stats",
+            {"l1": {"hits": 0, "misses": 0}, "l2": {"hits": 0, "misses": 0}},
+        ):
+            yield instance
+
+    @staticmethod
+    def stored_in(client) -> dict:
+        """Back SETEX (direct or pipelined)/GET/MGET of a mocked client with a dict"""
+        stored = {}
+        pipe = client.pipeline.return_value.__aenter__.return_value
+        client.setex.side_effect = lambda key, ttl, payload: stored.__setitem__(
+            key, payload
+        )
+        pipe.setex.side_effect = client.setex.side_effect
+        client.get.side_effect = stored.get
+        client.mget.side_effect = lambda keys: [stored.get(key) for key in keys]
+        return stored
+
+    @pytest.mark.asyncio
+    async def test_l1_hit_skips_redis(self, redis_cache):
+        """Test a second read is served from L1 without a Redis GET"""
+        redis_cache.async_client.get.return_value = b'{"films": []}'
+
+        assert await redis_cache.aget("ghibli:/films") == {"films": []}
+        assert await redis_cache.aget("ghibli:/films") == {"films": []}
+
+        redis_cache.async_client.get.assert_awaited_once_with("ghibli:/films")
+        stats = redis_cache.get_stats()
+        assert stats["l1"]["hits"] == 1
+        assert stats["l2"]["hits"] == 1
+        assert stats["l1"]["hit_ratio"] == 0.5
+
+    @pytest.mark.asyncio
+    async def test_metrics_per_key_prefix(self, redis_cache):
+        """Test lookups, writes, payload bytes and latency are exported per prefix"""
+        before = {
+            "l2_miss": sample(
+                "cache_requests_total", prefix="users", tier="l2", result="miss"
+            ),
+            "l2_hit": sample(
+                "cache_requests_total", prefix="users", tier="l2", result="hit"
+            ),
+            "l1_hit": sample(
+                "cache_requests_total", prefix="users", tier="l1", result="hit"
+            ),
+            "sets": sample("cache_sets_total", prefix="users"),
+            "read": sample(
+                "cache_payload_bytes_total", prefix="users", direction="read"
+            ),
+            "gets": sample(
+                "cache_operation_duration_seconds_count",
+                prefix="users",
+                operation="get",
+            ),
+        }
+        redis_cache.async_client.get.side_effect = [None, b'{"id": 1}']
+
+        assert await redis_cache.aget("users:1") is None
+        assert await redis_cache.aget("users:1") == {"id": 1}
+        assert await redis_cache.aget("users:1") == {"id": 1}
+        await redis_cache.aset("users:2", {"id": 2})
+
+        assert sample(
+            "cache_requests_total", prefix="users", tier="l2", result="miss"
+        ) == (before["l2_miss"] + 1)
+        assert sample(
+            "cache_requests_total", prefix="users", tier="l2", result="hit"
+        ) == (before["l2_hit"] + 1)
+        assert sample(
+            "cache_requests_total", prefix="users", tier="l1", result="hit"
+        ) == (before["l1_hit"] + 1)
+        assert sample("cache_sets_total", prefix="users") == before["sets"] + 1
+        assert sample(
+            "cache_payload_bytes_total", prefix="users", direction="read"
+        ) == before["read"] + len(b'{"id": 1}')
+        assert sample(
+            "cache_operation_duration_seconds_count", prefix="users", operation="get"
+        ) == (before["gets"] + 2)
+
+    @pytest.mark.asyncio
+    async def test_set_publishes_invalidation(self, redis_cache):
+        """Test writes are announced to other workers"""
+        await redis_cache.aset("ghibli:/films", [])
+
+        redis_cache.async_client.publish.assert_awaited_once()
+        channel, message = redis_cache.async_client.publish.call_args.args
+        assert message == f"{redis_cache.instance_id}:ghibli:/films"
+
+    def test_invalidation_from_other_worker_drops_l1_key(self, redis_cache):
+        """Test a pub/sub message from another worker evicts the L1 key"""
+        redis_cache.local.set("ghibli:/films", [])
+        redis_cache.local.set("ghibli:/people", [])
+
+        redis_cache._on_invalidation({"data": "other-worker:ghibli:/films"})
+        assert redis_cache.local.get("ghibli:/films") is None
+        assert redis_cache.local.get("ghibli:/people") == []
+
+        redis_cache._on_invalidation({"data": "other-worker:*"})
+        assert len(redis_cache.local) == 0
+
+    @pytest.mark.asyncio
+    async def test_set_entry_stores_etag_in_header(self, redis_cache):
+        """Test the dataset ETag is computed once and readable from the header"""
+        pipe = redis_cache.async_client.pipeline.return_value.__aenter__.return_value
+        await redis_cache.aset_entry("ghibli:/films", [{"id": "1"}])
+
+        keys = [call.args[0] for call in pipe.setex.call_args_list]
+        assert keys == ["ghibli:/films", "meta:ghibli:/films"]
+        pipe.execute.assert_awaited_once()
+        assert await redis_cache.aget_etag("ghibli:/films") == compute_etag(
+            [{"id": "1"}]
+        )
+        entry = await redis_cache.aget_entry("ghibli:/films")
+        assert entry.meta["etag"] == compute_etag([{"id": "1"}])
+
+    @pytest.mark.asyncio
+    async def test_codec_metrics_per_prefix(self, redis_cache):
+        """Test encode/decode timings and uncompressed bytes are exported"""
+        before = {
+            "encodes": sample(
+                "cache_codec_duration_seconds_count", prefix="users", operation="encode"
+            ),
+            "decodes": sample(
+                "cache_codec_duration_seconds_count", prefix="users", operation="decode"
+            ),
+            "raw": sample("cache_uncompressed_bytes_total", prefix="users"),
+        }
+        payload, raw_size = redis_cache.serializer.encode({"id": 1})
+        redis_cache.async_client.get.return_value = payload
+
+        await redis_cache.aset("users:1", {"id": 1})
+        redis_cache.local.clear()
+        assert await redis_cache.aget("users:1") == {"id": 1}
+
+        assert sample(
+            "cache_codec_duration_seconds_count", prefix="users", operation="encode"
+        ) == (before["encodes"] + 1)
+        assert sample(
+            "cache_codec_duration_seconds_count", prefix="users", operation="decode"
+        ) == (before["decodes"] + 1)
+        assert sample("cache_uncompressed_bytes_total", prefix="users") == (
+            before["raw"] + raw_size
+        )
+
+    @pytest.mark.asyncio
+    async def test_aset_bodies_writes_a_single_pipeline(self, redis_cache):
+        """Test the body and its variants go to Redis in one round trip"""
+        pipe = redis_cache.async_client.pipeline.return_value.__aenter__.return_value
+        body = b'[{"id":"1","title":"Castle in the Sky"}]' * 100
+
+        with patch.object(settings, "GHIBLI_RESPONSE_ENCODINGS", ["gzip"]):
+            assert await redis_cache.aset_bodies(
+                "ghibli:/films", body, 1234.5, compute_seconds=0.25
+            )
+
+        pipe.execute.assert_awaited_once()
+        keys = [call.args[0] for call in pipe.setex.call_args_list]
+        assert keys == ["body:ghibli:/films", "body:ghibli:/films:gzip"]
+        variant = await redis_cache.aget_body("ghibli:/films", "gzip")
+        assert variant.soft_expires_at == 1234.5
+        assert gzip.decompress(variant.body) == body
+
+        redis_cache.local.clear()
+        payload = pipe.setex.call_args_list[0].args[2]
+        redis_cache.async_client.get.return_value = payload
+        assert await redis_cache.aget_body("ghibli:/films") == CachedBody(
+            body, 1234.5, 0.25
+        )
+
+    @pytest.mark.asyncio
+    async def test_aset_bodies_drops_variants_for_small_bodies(self, redis_cache):
+        """Test bodies under the threshold are stored uncompressed only"""
+        pipe = redis_cache.async_client.pipeline.return_value.__aenter__.return_value
+
+        assert await redis_cache.aset_bodies("ghibli:/films", b"[]", 1234.5)
+
+        assert [call.args[0] for call in pipe.setex.call_args_list] == [
+            "body:ghibli:/films"
+        ]
+        assert "body:ghibli:/films:gzip" in pipe.delete.call_args.args
+
+    @pytest.mark.asyncio
+    async def test_body_encoding_checks_variants_without_reading(self, redis_cache):
+        """Test the served variant is found from L1 or EXISTS, in preference order"""
+        pipe = redis_cache.async_client.pipeline.return_value.__aenter__.return_value
+        pipe.execute.return_value = [0, 1]
+
+        encoding = await redis_cache.aget_body_encoding("ghibli:/films", ["br", "gzip"])
+
+        assert encoding == "gzip"
+        assert [call.args[0] for call in pipe.exists.call_args_list] == [
+            "body:ghibli:/films:br",
+            "body:ghibli:/films:gzip",
+        ]
+        redis_cache.async_client.get.assert_not_called()
+
+        pipe.reset_mock()
+        redis_cache.local.set("body:ghibli:/films:br", CachedBody(b"br", 1234.5))
+        assert await redis_cache.aget_body_encoding("ghibli:/films", ["br"]) == "br"
+        pipe.execute.assert_not_called()
+
+        pipe.execute.return_value = [0]
+        assert await redis_cache.aget_body_encoding("ghibli:/films", ["gzip"]) is None
+
+    def test_entry_refreshes_early_by_compute_cost(self):
+        """Test XFetch refreshes sooner the closer to expiry and costlier it is"""
+        now = time.time()
+        entry = CacheEntry(value=[1], soft_expires_at=now + 1, hard_expires_at=now + 60)
+        # -ln(1 - 0.9) ~ 2.3 veces el costo de recalcular
+        with patch("app.core.cache.random.random", return_value=0.9):
+            assert not entry.refresh_early(beta=1.0)
+            entry.compute_seconds = 0.5
+            assert entry.refresh_early(beta=1.0)
+            assert not entry.refresh_early(beta=0)
+            entry.soft_expires_at = now + 30
+            assert not entry.refresh_early(beta=1.0)
+
+    @pytest.mark.asyncio
+    async def test_entry_compute_cost_round_trips(self, redis_cache):
+        """Test the compute cost is stored with the entry and defaults to 0"""
+        await redis_cache.aset_entry("ghibli:/films", [1], compute_seconds=0.25)
+
+        entry = await redis_cache.aget_entry("ghibli:/films")
+        assert entry.compute_seconds == 0.25
+        legacy = {"value": 1, "soft_expires_at": 0, "hard_expires_at": 0}
+        assert CacheEntry.from_dict(legacy).compute_seconds == 0
+
+    @pytest.mark.asyncio
+    async def test_touch_entry_extends_without_rewriting_value(self, redis_cache):
+        """Test touching an entry rewrites only its header and body prefixes"""
+        pipe = redis_cache.async_client.pipeline.return_value.__aenter__.return_value
+        await redis_cache.aset_entry(
+            "ghibli:/films", [{"id": "1"}], soft_ttl=1, meta={"etag": '"abc"'}
+        )
+        stale = await redis_cache.aget_entry("ghibli:/films")
+        stale.soft_expires_at = 0
+        pipe.reset_mock()
+
+        assert await redis_cache.atouch_entry("ghibli:/films", stale, soft_ttl=60)
+
+        key, ttl, header = redis_cache.async_client.setex.call_args.args
+        redis_cache.async_client.setex.assert_awaited_once()
+        assert key == "meta:ghibli:/films"
+        assert len(header) < 200
+        pipe.setex.assert_not_called()
+        pipe.expire.assert_called_once_with("ghibli:/films", ttl)
+        touched = await redis_cache.aget_entry("ghibli:/films")
+        assert not touched.is_stale
+        assert touched.value == [{"id": "1"}]
+        assert touched.meta == {"etag": '"abc"'}
+
+        script_args = pipe.eval.call_args.args
+        assert "body:ghibli:/films" in script_args
+        assert len(script_args[-2]) == 30
+
+    @pytest.mark.asyncio
+    async def test_get_many_uses_l1_then_a_single_mget(self, redis_cache):
+        """Test only L1 misses are fetched, all in one MGET"""
+        redis_cache.local.set("ghibli:/films", ["cached"])
+        payload = redis_cache.serializer.dumps(["from redis"])
+        redis_cache.async_client.mget.return_value = [payload, None]
+
+        values = await redis_cache.aget_many(
+            ["ghibli:/films", "ghibli:/people", "missing"]
+        )
+
+        assert values == {"ghibli:/films": ["cached"], "ghibli:/people": ["from redis"]}
+        redis_cache.async_client.mget.assert_awaited_once_with(
+            ["ghibli:/people", "missing"]
+        )
+        redis_cache.async_client.get.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_set_and_delete_many_use_one_pipeline(self, redis_cache):
+        """Test batched writes and deletes go through a single pipeline each"""
+        pipe = redis_cache.async_client.pipeline.return_value.__aenter__.return_value
+
+        assert await redis_cache.aset_many({"a": 1, "b": 2}, ttl=60)
+        assert [call.args[0] for call in pipe.setex.call_args_list] == ["a", "b"]
+        assert pipe.publish.call_count == 2
+        assert await redis_cache.aget("b") == 2
+
+        assert await redis_cache.adelete_many(["a", "b"])
+        pipe.delete.assert_called_once_with("a", "b")
+        assert pipe.execute.await_count == 2
+        assert redis_cache.local.get("a") is None
+        redis_cache.async_client.setex.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_namespace_generation_changes_physical_keys(self, redis_cache):
+        """Test bumping a namespace makes its keys (and derived keys) unreachable"""
+        stored = self.stored_in(redis_cache.async_client)
+        redis_cache.async_client.eval.return_value = 1
+        await redis_cache.aset("ghibli:/films", [1])
+        await redis_cache.aset("lock:ghibli:/films", "token")
+        redis_cache.local.clear()
+
+        assert await redis_cache.ainvalidate_namespace("ghibli") == 1
+        assert await redis_cache.aget("ghibli:/films") is None
+        assert await redis_cache.aget("lock:ghibli:/films") == "token"
+
+        await redis_cache.aset_entry("ghibli:/films", [2])
+        assert set(stored) >= {
+            "ghibli:g1:/films",
+            "meta:ghibli:g1:/films",
+        }
+        redis_cache.local.clear()
+        entries = await redis_cache.aget_entries(["ghibli:/films"])
+        assert entries["ghibli:/films"].value == [2]
+        redis_cache.async_client.flushdb.assert_not_called()
+
+    def test_generation_from_other_worker_is_applied(self, redis_cache):
+        """Test a generation bump published by another worker is picked up"""
+        redis_cache._on_invalidation({"data": b"other-worker:ns:ghibli:7"})
+
+        assert redis_cache.get_generations()["ghibli"] == 7
+        assert redis_cache._physical_key("body:ghibli:/films:gzip") == (
+            "body:ghibli:g7:/films:gzip"
+        )
+
+    @pytest.mark.asyncio
+    async def test_clear_bumps_every_namespace(self, redis_cache):
+        """Test aclear() invalidates namespaces instead of flushing the database"""
+        redis_cache.async_client.eval.return_value = 3
+
+        assert await redis_cache.aclear()
+
+        keys = [call.args[2] for call in redis_cache.async_client.eval.call_args_list]
+        assert keys == ["ns:" + namespace for namespace in settings.CACHE_NAMESPACES]
+        redis_cache.async_client.flushdb.assert_not_called()
+
+
+class TestRedisCacheHealth:
+    """Tests for the degraded mode and background reconnection"""
+
+    @pytest.fixture
+    def down_cache(self):
+        """RedisCache singleton marked as down with a fresh reconnector"""
+        instance = RedisCache()
+        with patch.object(instance, "_is_connected", False), patch.object(
+            instance, "_reconnect_thread", None
+        ), patch.object(instance, "_reconnect_stop", threading.Event()), patch.object(
+            instance, "_down_since", None
+        ), patch.object(
+            settings, "REDIS_RECONNECT_BACKOFF_BASE", 0.0
+        ):
+            yield instance
+            instance._reconnect_stop.set()
+
+    def test_is_available_does_not_connect_on_request_path(self, down_cache):
+        """Test a down cache answers from memory without reconnecting"""
+        with patch.object(down_cache, "_connect") as mock_connect:
+            assert not down_cache.is_available()
+            assert not down_cache.is_available()
+
+            mock_connect.assert_not_called()
+            assert down_cache.get_health()["state"] == "down"
+
+    def test_reconnects_in_background_with_backoff(self, down_cache):
+        """Test the reconnector retries until Redis answers again"""
+        attempts = []
+
+        def connect():
+            attempts.append(time.time())
+            down_cache._is_connected = len(attempts) == 3
+
+        with patch.object(down_cache, "_connect", side_effect=connect):
+            down_cache._mark_down()
+            down_cache._reconnect_thread.join(timeout=5)
+
+        assert len(attempts) == 3
+        assert down_cache.is_available()
+        assert down_cache.get_health() == {"state": "up"}
+
+    @pytest.mark.asyncio
+    async def test_failed_command_marks_cache_down(self, down_cache):
+        """Test a Redis error flips the cache to degraded mode"""
+        with patch.object(down_cache, "_is_connected", True), patch.object(
+            down_cache, "async_client", AsyncMock()
+        ), patch.object(down_cache, "_mark_down") as mock_mark_down:
+            down_cache.async_client.setex.side_effect = ConnectionError("down")
+            errors = sample("cache_errors_total", prefix="ghibli", operation="set")
+
+            assert not await down_cache.aset("ghibli:/films", [])
+            mock_mark_down.assert_called_once()
+            assert (
+                sample("cache_errors_total", prefix="ghibli", operation="set")
+                == errors + 1
+            )
+
+    def test_backoff_is_exponential_and_capped(self):
+        """Test reconnection delays double up to the configured maximum"""
+        instance = RedisCache()
+        with patch.object(settings, "REDIS_RECONNECT_BACKOFF_BASE", 1.0), patch.object(
+            settings, "REDIS_RECONNECT_BACKOFF_MAX", 4.0
+        ), patch("app.core.cache.random.uniform", side_effect=lambda low, high: high):
+            delays = [instance._reconnect_delay(attempt) for attempt in range(5)]
+
+        assert delays == [1.0, 2.0, 4.0, 4.0, 4.0]
@@ -0,0 +1,59 @@
+from unittest.mock import patch
+
+from app.services.circuit_breaker import CircuitBreaker
+
+
+class TestCircuitBreaker:
+    """Tests for the per-endpoint circuit breaker state machine"""
+
+    def make_breaker(self) -> CircuitBreaker:
+        return CircuitBreaker("/films", failure_threshold=2, recovery_timeout=30)
+
+    def test_opens_after_consecutive_failures(self):
+        """Test the circuit opens at the threshold and rejects calls"""
+        breaker = self.make_breaker()
+        breaker.record_failure("boom")
+        assert breaker.allow_request()
+
+        breaker.record_failure("boom")
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+        assert breaker.status()["last_error"] == "boom"
+
+    def test_success_resets_failure_count(self):
+        """Test only consecutive failures count towards opening"""
+        breaker = self.make_breaker()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_allows_a_single_probe(self):
+        """Test after the recovery timeout only one probe call is let through"""
+        breaker = self.make_breaker()
+        with patch("app.services.circuit_breaker.time.monotonic", return_value=100):
+            breaker.record_failure()
+            breaker.record_failure()
+
+        with patch("app.services.circuit_breaker.time.monotonic", return_value=131):
+            assert breaker.state == CircuitBreaker.HALF_OPEN
+            assert breaker.allow_request()
+            assert not breaker.allow_request()
+
+            breaker.record_success()
+            assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_failed_probe_reopens(self):
+        """Test a failing probe sends the circuit back to open"""
+        breaker = self.make_breaker()
+        with patch("app.services.circuit_breaker.time.monotonic", return_value=100):
+            breaker.record_failure()
+            breaker.record_failure()
+
+        with patch("app.services.circuit_breaker.time.monotonic", return_value=131):
+            assert breaker.allow_request()
+            breaker.record_failure()
+
+            assert breaker.state == CircuitBreaker.OPEN
+            assert breaker.status()["retry_in_seconds"] == 30
@@ -1,11 +1,34 @@
-from unittest.mock import MagicMock, patch
+import asyncio
+import time
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
 
+import httpx
 import pytest
-import requests
 from fastapi import HTTPException
+from prometheus_client import REGISTRY
 
+from app.core.cache import (
+    CachedBody,
+    CacheEntry,
+    RedisCache,
+    cache,
+    compute_etag,
+    render_json,
+)
+from app.core.config import settings
 from app.models.user import UserRole
-from app.services.ghibli import GhibliService
+from app.services.circuit_breaker import CircuitBreaker, circuit_breakers
+from app.services.ghibli import STALE_SERVED, GhibliService, UpstreamResponse
+from app.services.snapshot import snapshot_store
+from app.services.versions import DatasetUpdate, DatasetVersions
+
+
+def make_entry(value, soft_in: float = 60, hard_in: float = 600) -> CacheEntry:
+    """Build a cache entry whose soft/hard expiry is relative to now"""
+    now = time.time()
+    return CacheEntry(
+        value=value, soft_expires_at=now + soft_in, hard_expires_at=now + hard_in
+    )
 
 
 class TestGhibliService:
@@ -22,96 +45,922 @@ class TestGhibliService:
             }
         ]
 
-    def test_get_data_by_role_with_cache(
+    @pytest.mark.asyncio
+    async def test_aget_data_by_role_with_cache(
         self,
         mock_ghibli_films_response,
     ):
         """Test getting data from cache when cache is available and has data"""
-        with patch("app.services.ghibli.cache") as mock_cache:
-            # Setup mock cache
+        with patch("app.services.ghibli.cache", spec=RedisCache) as mock_cache:
             mock_cache.is_available.return_value = True
-            mock_cache.get.return_value = mock_ghibli_films_response
+            mock_cache.aget_entry.return_value = make_entry(mock_ghibli_films_response)
 
-            # Get data for films role
-            data = GhibliService.get_data_by_role(UserRole.FILMS)
+            data = await GhibliService.aget_data_by_role(UserRole.FILMS)
 
-            # Verify cache was checked and API was not called
-            mock_cache.is_available.assert_called_once()
-            mock_cache.get.assert_called_once_with("ghibli:/films")
+            mock_cache.aget_entry.assert_called_once_with("ghibli:/films")
+            mock_cache.aset_entry.assert_not_called()
             assert data == mock_ghibli_films_response
 
-    def test_get_data_by_role_without_cache(
+    @pytest.mark.asyncio
+    async def test_aget_data_by_role_cache_unavailable(
         self,
         mock_ghibli_films_response,
     ):
-        """Test getting data from API when cache misses"""
-        with patch("app.services.ghibli.cache") as mock_cache, patch(
-            "app.services.ghibli.requests.get"
-        ) as mock_get:
-            # Setup mocks
-            mock_cache.is_available.return_value = True
-            mock_cache.get.return_value = None
-            mock_get.return_value = MagicMock(
-                json=lambda: mock_ghibli_films_response,
-                raise_for_status=MagicMock(),
-            )
+        """Test getting data from the API when cache is unavailable"""
+        client = httpx.AsyncClient(
+            base_url=GhibliService.BASE_URL,
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, json=mock_ghibli_films_response)
+            ),
+        )
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(GhibliService, "_client", client):
+            mock_cache.is_available.return_value = False
 
-            # Get data for films role
-            data = GhibliService.get_data_by_role(UserRole.FILMS)
+            data = await GhibliService.aget_data_by_role(UserRole.FILMS)
 
-            # Verify cache was checked and API was called
-            mock_cache.is_available.assert_called()
-            mock_cache.get.assert_called_once_with("ghibli:/films")
-            mock_get.assert_called_once_with(f"{GhibliService.BASE_URL}/films")
-            mock_cache.set.assert_called_once_with(
-                "ghibli:/films", mock_ghibli_films_response
-            )
+            mock_cache.aget_entry.assert_not_called()
             assert data == mock_ghibli_films_response
 
-    def test_get_data_by_role_cache_unavailable(
+    @pytest.mark.asyncio
+    async def test_aget_data_by_role_invalid_role(self):
+        """Test handling of invalid role"""
+        with pytest.raises(HTTPException) as exc_info:
+            await GhibliService.aget_data_by_role("invalid_role")
+
+        assert exc_info.value.status_code == 403
+        assert "not authorized" in str(exc_info.value.detail).lower()
+
+    @pytest.mark.asyncio
+    async def test_aget_data_by_role_uses_shared_client(
         self,
         mock_ghibli_films_response,
     ):
-        """Test getting data when cache is unavailable"""
-        with patch("app.services.ghibli.cache") as mock_cache, patch(
-            "app.services.ghibli.requests.get"
-        ) as mock_get:
-            # Setup mocks
+        """Test async path fetches through the pooled client and caches the result"""
+        requested = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requested.append(request.url.path)
+            return httpx.Response(200, json=mock_ghibli_films_response)
+
+        client = httpx.AsyncClient(
+            base_url=GhibliService.BASE_URL, transport=httpx.MockTransport(handler)
+        )
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(GhibliService, "_client", client):
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entry.return_value = None
+
+            data = await GhibliService.aget_data_by_role(UserRole.FILMS)
+
+            assert requested == ["/films"]
+            mock_cache.aset_entry.assert_called_once_with(
+                "ghibli:/films",
+                mock_ghibli_films_response,
+                meta={"upstream": {}},
+                store_body=True,
+                compute_seconds=ANY,
+            )
+            assert data == mock_ghibli_films_response
+
+    @pytest.mark.asyncio
+    async def test_upstream_requests_are_timed(self, mock_ghibli_films_response):
+        """Test each upstream attempt is observed with its endpoint and outcome"""
+        labels = {"endpoint": "/films", "outcome": "ok"}
+        before = (
+            REGISTRY.get_sample_value("upstream_request_duration_seconds_count", labels)
+            or 0
+        )
+        client = httpx.AsyncClient(
+            base_url=GhibliService.BASE_URL,
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, json=mock_ghibli_films_response)
+            ),
+        )
+        with patch.object(GhibliService, "_client", client):
+            await GhibliService._afetch_conditional("/films")
+
+        assert (
+            REGISTRY.get_sample_value("upstream_request_duration_seconds_count", labels)
+            == before + 1
+        )
+
+    @pytest.mark.asyncio
+    async def test_aget_data_by_role_api_error(self):
+        """Test async path maps upstream errors to HTTP 500"""
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectTimeout("timed out", request=request)
+
+        client = httpx.AsyncClient(
+            base_url=GhibliService.BASE_URL, transport=httpx.MockTransport(handler)
+        )
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(GhibliService, "_client", client):
+            mock_cache.is_available.return_value = False
+
+            with pytest.raises(HTTPException) as exc_info:
+                await GhibliService.aget_data_by_role(UserRole.FILMS)
+
+            assert exc_info.value.status_code == 500
+
+    @pytest.mark.asyncio
+    async def test_aget_all_data_fetches_concurrently(self):
+        """Test admin fan-out issues the endpoint requests in parallel"""
+        in_flight = 0
+        max_in_flight = 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return httpx.Response(200, json=[{"id": request.url.path}])
+
+        client = httpx.AsyncClient(
+            base_url=GhibliService.BASE_URL, transport=httpx.MockTransport(handler)
+        )
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(GhibliService, "_client", client), patch(
+            "app.services.ghibli.settings.GHIBLI_FANOUT_CONCURRENCY", 3
+        ):
             mock_cache.is_available.return_value = False
-            mock_get.return_value = MagicMock(
-                json=lambda: mock_ghibli_films_response,
-                raise_for_status=MagicMock(),
+
+            data = await GhibliService.aget_all_data()
+
+            assert max_in_flight == 3
+            assert set(data) == {"films", "people", "locations", "species", "vehicles"}
+
+    @pytest.mark.asyncio
+    async def test_aget_all_data_partial_failure_policy(self):
+        """Test partial policy returns successful sections plus error markers"""
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/species":
+                return httpx.Response(502)
+            return httpx.Response(200, json=[])
+
+        client = httpx.AsyncClient(
+            base_url=GhibliService.BASE_URL, transport=httpx.MockTransport(handler)
+        )
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(GhibliService, "_client", client):
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entries.return_value = {}
+            mock_cache.aget_entry.return_value = None
+
+            data = await GhibliService.aget_all_data(partial_failure_policy="partial")
+            assert "species" not in data
+            assert "species" in data["errors"]
+            assert data["films"] == []
+            stored = [call.args[0] for call in mock_cache.aset_entry.call_args_list]
+            assert "ghibli:/films" in stored
+            assert "ghibli:/species" not in stored
+
+            with pytest.raises(HTTPException) as exc_info:
+                await GhibliService.aget_all_data(partial_failure_policy="fail")
+            assert exc_info.value.status_code == 500
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_are_coalesced(self, mock_ghibli_films_response):
+        """Test concurrent misses on one key trigger a single upstream fetch"""
+        calls = 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json=mock_ghibli_films_response)
+
+        client = httpx.AsyncClient(
+            base_url=GhibliService.BASE_URL, transport=httpx.MockTransport(handler)
+        )
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(GhibliService, "_client", client):
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entry.return_value = None
+            mock_cache.aacquire_lock.return_value = "token"
+            before = GhibliService.get_coalescing_stats()
+
+            results = await asyncio.gather(
+                *(GhibliService.aget_data_by_role(UserRole.FILMS) for _ in range(5))
+            )
+
+            after = GhibliService.get_coalescing_stats()
+            assert calls == 1
+            assert all(result == mock_ghibli_films_response for result in results)
+            assert after["collapsed_local"] - before["collapsed_local"] == 4
+            mock_cache.arelease_lock.assert_called_once_with(
+                "lock:ghibli:/films", "token"
             )
 
-            # Get data for films role
-            data = GhibliService.get_data_by_role(UserRole.FILMS)
+    @pytest.mark.asyncio
+    async def test_cancelled_owner_does_not_cancel_joiners(
+        self, mock_ghibli_films_response
+    ):
+        """Test cancelling the request that started a refresh spares the others"""
+        release = asyncio.Event()
+
+        async def fetch(endpoint, validators=None):
+            await release.wait()
+            return UpstreamResponse(data=mock_ghibli_films_response)
+
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService, "_afetch_conditional", side_effect=fetch
+        ) as mock_fetch:
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entry.return_value = None
+            mock_cache.aacquire_lock.return_value = "token"
+
+            owner = asyncio.create_task(GhibliService.aget_data_by_role(UserRole.FILMS))
+            await asyncio.sleep(0)
+            joiner = asyncio.create_task(
+                GhibliService.aget_data_by_role(UserRole.FILMS)
+            )
+            await asyncio.sleep(0)
+            owner.cancel()
+            release.set()
+
+            assert await joiner == mock_ghibli_films_response
+            assert owner.cancelled()
+            mock_fetch.assert_awaited_once()
+            mock_cache.arelease_lock.assert_called_once_with(
+                "lock:ghibli:/films", "token"
+            )
+
+    @pytest.mark.asyncio
+    async def test_waits_for_refresh_from_other_worker(
+        self, mock_ghibli_films_response
+    ):
+        """Test a worker that loses the lock waits for the refreshed value"""
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService, "_afetch_conditional"
+        ) as mock_fetch, patch(
+            "app.services.ghibli.settings.REDIS_LOCK_POLL_INTERVAL", 0
+        ):
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entry.side_effect = [
+                None,
+                None,
+                make_entry(mock_ghibli_films_response),
+            ]
+            mock_cache.aacquire_lock.return_value = None
+
+            data = await GhibliService.aget_data_by_role(UserRole.FILMS)
 
-            # Verify cache was checked but not used
-            mock_cache.is_available.assert_called()
-            mock_cache.get.assert_not_called()
-            mock_get.assert_called_once_with(f"{GhibliService.BASE_URL}/films")
             assert data == mock_ghibli_films_response
+            mock_fetch.assert_not_called()
 
-    def test_get_data_by_role_api_error(self):
-        """Test handling of API errors"""
-        with patch("app.services.ghibli.cache") as mock_cache, patch(
-            "app.services.ghibli.requests.get"
-        ) as mock_get:
-            # Setup mocks
-            mock_cache.is_available.return_value = False
-            mock_get.side_effect = requests.RequestException("API Error")
+    @pytest.mark.asyncio
+    async def test_takes_over_lock_released_without_a_value(
+        self, mock_ghibli_films_response
+    ):
+        """Test a waiting worker refreshes once the owner gives up the lock"""
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService,
+            "_afetch_conditional",
+            return_value=UpstreamResponse(mock_ghibli_films_response),
+        ) as mock_fetch, patch(
+            "app.services.ghibli.settings.REDIS_LOCK_POLL_INTERVAL", 0
+        ):
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entry.return_value = None
+            mock_cache.aacquire_lock.side_effect = [None, None, "token"]
+
+            data = await GhibliService.aget_data_by_role(UserRole.FILMS)
+
+            assert data == mock_ghibli_films_response
+            mock_fetch.assert_called_once()
+            mock_cache.arelease_lock.assert_called_once_with(
+                "lock:ghibli:/films", "token"
+            )
+
+    @pytest.mark.asyncio
+    async def test_lock_wait_timeout_fails_fast_without_fetching(self):
+        """Test a worker that never gets the lock answers 503 instead of fetching"""
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService, "_afetch_conditional"
+        ) as mock_fetch, patch(
+            "app.services.ghibli.settings.REDIS_LOCK_POLL_INTERVAL", 0
+        ), patch(
+            "app.services.ghibli.settings.REDIS_LOCK_TTL_MS", 20
+        ), patch.object(
+            settings, "GHIBLI_SNAPSHOT_ENABLED", False
+        ):
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entry.return_value = None
+            mock_cache.aacquire_lock.return_value = None
 
-            # Verify error handling
             with pytest.raises(HTTPException) as exc_info:
-                GhibliService.get_data_by_role(UserRole.FILMS)
+                await GhibliService.aget_data_by_role(UserRole.FILMS)
+
+            assert exc_info.value.status_code == 503
+            mock_fetch.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_served_and_refreshed_in_background(
+        self, mock_ghibli_films_response
+    ):
+        """Test an entry past its soft TTL is returned at once and refreshed"""
+        stale_data = [{"id": "old"}]
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService,
+            "_afetch_conditional",
+            return_value=UpstreamResponse(data=mock_ghibli_films_response),
+        ) as mock_fetch:
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entry.return_value = make_entry(stale_data, soft_in=-1)
+            mock_cache.aacquire_lock.return_value = "token"
+
+            data = await GhibliService.aget_data_by_role(UserRole.FILMS)
+            assert data == stale_data
+
+            await asyncio.gather(*GhibliService._background_tasks)
+            mock_fetch.assert_awaited_once_with("/films", None)
+            mock_cache.aset_entry.assert_called_once_with(
+                "ghibli:/films",
+                mock_ghibli_films_response,
+                meta={"upstream": {}},
+                store_body=True,
+                compute_seconds=ANY,
+            )
+
+    @pytest.mark.asyncio
+    async def test_fresh_entry_refreshed_early_near_expiry(
+        self, mock_ghibli_films_response
+    ):
+        """Test a fresh entry close to expiry may be refreshed ahead of time"""
+        cached = [{"id": "cached"}]
+        entry = make_entry(cached, soft_in=1)
+        entry.compute_seconds = 2.0
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService,
+            "_afetch_conditional",
+            return_value=UpstreamResponse(data=mock_ghibli_films_response),
+        ) as mock_fetch, patch(
+            "app.core.cache.random.random", return_value=0.9
+        ), patch.dict(
+            GhibliService.coalescing_stats, {"early_refreshes": 0}
+        ):
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entry.return_value = entry
+            mock_cache.aacquire_lock.return_value = "token"
+
+            data = await GhibliService.aget_data_by_role(UserRole.FILMS)
+            assert data == cached
+
+            await asyncio.gather(*GhibliService._background_tasks)
+            mock_fetch.assert_awaited_once_with("/films", None)
+            assert GhibliService.coalescing_stats["early_refreshes"] == 1
+            assert mock_cache.aset_entry.call_args.kwargs["compute_seconds"] >= 0
+
+    @pytest.mark.asyncio
+    async def test_warm_up_loads_every_dataset(self):
+        """Test warm-up fetches each endpoint once and stores no aggregate blob"""
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService, "_afetch_conditional", return_value=UpstreamResponse([])
+        ) as mock_fetch:
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entries.return_value = {}
+            mock_cache.aget_entry.return_value = None
+            mock_cache.aacquire_lock.return_value = "token"
+
+            await GhibliService.warm_up()
+
+            assert mock_fetch.await_count == len(GhibliService.ROLE_ENDPOINTS)
+            mock_cache.aget_entries.assert_awaited_once()
+            stored = [call.args[0] for call in mock_cache.aset_entry.call_args_list]
+            assert sorted(stored) == sorted(
+                f"ghibli:{endpoint}"
+                for endpoint in GhibliService.ROLE_ENDPOINTS.values()
+            )
+
+    @pytest.mark.asyncio
+    async def test_warm_up_uses_bounded_fan_out(self):
+        """Test warm-up loads datasets concurrently, capped by the fan-out limit"""
+        running = 0
+        peak = 0
+
+        async def fetch(endpoint, validators=None):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return UpstreamResponse([])
+
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService, "_afetch_conditional", side_effect=fetch
+        ), patch.object(
+            settings, "GHIBLI_FANOUT_CONCURRENCY", 2
+        ):
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entries.return_value = {}
+            mock_cache.aget_entry.return_value = None
+            mock_cache.aacquire_lock.return_value = "token"
+
+            await GhibliService.warm_up()
+
+            assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_startup_does_not_wait_for_warm_up(self):
+        """Test the lifespan hook schedules warm-up instead of awaiting it"""
+        release = asyncio.Event()
+
+        async def slow_warm_up():
+            await release.wait()
+
+        with patch.object(
+            GhibliService, "load_snapshots_into_cache", return_value=0
+        ), patch.object(
+            GhibliService, "warm_up", side_effect=slow_warm_up
+        ) as mock_warm_up, patch.object(
+            settings, "GHIBLI_WARMUP_ENABLED", True
+        ), patch.object(
+            settings, "GHIBLI_REFRESH_ENABLED", False
+        ):
+            await asyncio.wait_for(GhibliService.start_background_refresh(), 1)
+
+            await asyncio.sleep(0)
+            mock_warm_up.assert_awaited_once()
+            assert GhibliService._background_tasks
+            release.set()
+            await GhibliService.stop_background_refresh()
 
+    @pytest.mark.asyncio
+    async def test_refresh_cycle_skipped_when_other_worker_owns_interval(self):
+        """Test only the worker holding the interval lock refreshes"""
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(GhibliService, "warm_up") as mock_warm_up:
+            mock_cache.is_available.return_value = True
+            mock_cache.aacquire_lock.return_value = None
+
+            assert await GhibliService._refresh_cycle() is False
+            mock_warm_up.assert_not_called()
+
+            mock_cache.aacquire_lock.return_value = "token"
+            assert await GhibliService._refresh_cycle() is True
+            mock_warm_up.assert_awaited_once_with(force=True)
+
+    @pytest.mark.asyncio
+    async def test_serves_snapshot_when_cache_and_api_unavailable(
+        self, mock_ghibli_films_response
+    ):
+        """Test the on-disk snapshot is served when Redis and upstream are down"""
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService,
+            "_afetch_conditional",
+            return_value=UpstreamResponse(mock_ghibli_films_response),
+        ):
+            mock_cache.is_available.return_value = False
+            await GhibliService.aget_data_by_role(UserRole.FILMS)
+
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService,
+            "_afetch_conditional",
+            side_effect=HTTPException(status_code=500, detail="down"),
+        ):
+            mock_cache.is_available.return_value = False
+            data = await GhibliService.aget_data_by_role(UserRole.FILMS)
+
+        assert data == mock_ghibli_films_response
+
+    @pytest.mark.asyncio
+    async def test_transient_errors_are_retried(self, mock_ghibli_films_response):
+        """Test 5xx responses are retried with backoff before succeeding"""
+        responses = [httpx.Response(503), httpx.Response(200, json=[])]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return responses.pop(0)
+
+        client = httpx.AsyncClient(
+            base_url=GhibliService.BASE_URL, transport=httpx.MockTransport(handler)
+        )
+        with patch.object(GhibliService, "_client", client):
+            assert await GhibliService._afetch_from_api("/films") == []
+
+        assert responses == []
+        assert circuit_breakers.get("/films").state == CircuitBreaker.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_client_errors_are_not_retried(self):
+        """Test 4xx responses fail at once and do not trip the breaker"""
+        calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            return httpx.Response(404)
+
+        client = httpx.AsyncClient(
+            base_url=GhibliService.BASE_URL, transport=httpx.MockTransport(handler)
+        )
+        with patch.object(GhibliService, "_client", client):
+            with pytest.raises(HTTPException):
+                await GhibliService._afetch_from_api("/films")
+
+        assert calls == 1
+        assert circuit_breakers.get("/films").status()["consecutive_failures"] == 0
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_fast_with_503(self):
+        """Test an open circuit skips the network and returns 503 at once"""
+        calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            raise httpx.ConnectError("refused", request=request)
+
+        client = httpx.AsyncClient(
+            base_url=GhibliService.BASE_URL, transport=httpx.MockTransport(handler)
+        )
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(GhibliService, "_client", client), patch.object(
+            settings, "GHIBLI_BREAKER_FAILURE_THRESHOLD", 1
+        ):
+            mock_cache.is_available.return_value = False
+
+            with pytest.raises(HTTPException) as exc_info:
+                await GhibliService.aget_data_by_role(UserRole.FILMS)
             assert exc_info.value.status_code == 500
-            assert "error accessing ghibli api" in str(exc_info.value.detail).lower()
+            attempts = calls
 
-    def test_get_data_by_role_invalid_role(self):
-        """Test handling of invalid role"""
+            with pytest.raises(HTTPException) as exc_info:
+                await GhibliService.aget_data_by_role(UserRole.FILMS)
+            assert exc_info.value.status_code == 503
+            assert "Retry-After" in exc_info.value.headers
+            assert calls == attempts
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_serves_last_good_payload(self):
+        """Test an open circuit serves the snapshot instead of calling upstream"""
+        snapshot_store.save("films", [{"id": "1"}])
+        with patch.object(settings, "GHIBLI_BREAKER_FAILURE_THRESHOLD", 1):
+            circuit_breakers.get("/films").record_failure()
+
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(GhibliService, "_get_client") as mock_client:
+            mock_cache.is_available.return_value = False
+
+            data = await GhibliService.aget_data_by_role(UserRole.FILMS)
+
+            assert data == [{"id": "1"}]
+            mock_client.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_refresh_stores_upstream_validators(self, mock_ghibli_films_response):
+        """Test the upstream ETag/Last-Modified are kept with the cached entry"""
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(
+                200,
+                json=mock_ghibli_films_response,
+                headers={"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024"},
+            )
+
+        client = httpx.AsyncClient(
+            base_url=GhibliService.BASE_URL, transport=httpx.MockTransport(handler)
+        )
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(GhibliService, "_client", client):
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entry.return_value = None
+
+            await GhibliService._refresh_endpoint("/films")
+
+            assert mock_cache.aset_entry.call_args.kwargs["meta"] == {
+                "upstream": {"etag": '"v1"', "last_modified": "Mon, 01 Jan 2024"}
+            }
+
+    @pytest.mark.asyncio
+    async def test_not_modified_extends_ttl_without_parsing(self):
+        """Test a 304 revalidation only extends the cached entry"""
+        stale = make_entry([{"id": "1"}], soft_in=-1)
+        stale.meta = {"etag": '"ours"', "upstream": {"etag": '"v1"'}}
+        sent = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            sent.update(request.headers)
+            return httpx.Response(304, headers={"ETag": '"v2"'})
+
+        client = httpx.AsyncClient(
+            base_url=GhibliService.BASE_URL, transport=httpx.MockTransport(handler)
+        )
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(GhibliService, "_client", client), patch.object(
+            GhibliService, "_index_dataset"
+        ) as mock_index:
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entry.return_value = stale
+
+            data = await GhibliService._refresh_endpoint("/films")
+
+            assert data == [{"id": "1"}]
+            assert sent["if-none-match"] == '"v1"'
+            mock_cache.atouch_entry.assert_called_once()
+            key, touched = mock_cache.atouch_entry.call_args.args
+            assert key == "ghibli:/films"
+            assert touched.meta == {"etag": '"ours"', "upstream": {"etag": '"v2"'}}
+            # La entrada leída (compartida con el L1) no se modifica
+            assert stale.meta == {"etag": '"ours"', "upstream": {"etag": '"v1"'}}
+            mock_cache.aset_entry.assert_not_called()
+            mock_index.assert_not_called()
+            # Sin snapshot previo se escribe uno con el valor cacheado
+            assert snapshot_store.load("films").data == [{"id": "1"}]
+
+    @pytest.mark.asyncio
+    async def test_unchanged_content_is_not_rewritten(self):
+        """Test a refresh whose content did not change only extends the TTL"""
+        entry = make_entry([{"id": "1"}], soft_in=-1)
+        entry.meta = {"etag": compute_etag([{"id": "1"}])}
+        client = AsyncMock()
+        pipe = MagicMock()
+        pipe.execute = AsyncMock()
+        client.pipeline = MagicMock()
+        client.pipeline.return_value.__aenter__.return_value = pipe
+        with patch.object(cache, "async_client", client), patch.object(
+            cache, "_is_connected", True
+        ), patch.object(cache, "generations", {}), patch.object(
+            cache, "local", None
+        ), patch.object(
+            cache, "aget_entry", return_value=entry
+        ), patch.object(
+            cache, "aset_entry"
+        ) as mock_set_entry, patch.object(
+            GhibliService,
+            "_afetch_conditional",
+            return_value=UpstreamResponse([{"id": "1"}]),
+        ), patch(
+            "app.services.ghibli.dataset_versions", spec=DatasetVersions
+        ) as mock_versions:
+            mock_versions.aupdate.return_value = DatasetUpdate(version=3, changed=False)
+
+            data = await GhibliService._refresh_endpoint("/films")
+
+            assert data == [{"id": "1"}]
+            mock_set_entry.assert_not_called()
+            # Solo la cabecera de la entrada se reescribe: el valor no
+            written = [call.args[0] for call in client.setex.call_args_list]
+            assert written == ["meta:ghibli:/films"]
+            pipe.setex.assert_not_called()
+            pipe.expire.assert_any_call("ghibli:/films", ANY)
+            assert snapshot_store.load("films").data == [{"id": "1"}]
+
+    @pytest.mark.asyncio
+    async def test_new_content_is_stored_even_if_versions_say_unchanged(self):
+        """Test the entry ETag, not the version hash, decides if content changed"""
+        entry = make_entry([{"id": "1", "t": "old"}], soft_in=-1)
+        entry.meta = {"etag": compute_etag(entry.value)}
+        new = [{"id": "1", "t": "new"}]
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService, "_afetch_conditional", return_value=UpstreamResponse(new)
+        ), patch(
+            "app.services.ghibli.dataset_versions", spec=DatasetVersions
+        ) as mock_versions:
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entry.return_value = entry
+            # El versionado ya registró la carga, pero la entrada quedó vieja
+            mock_versions.aupdate.return_value = DatasetUpdate(version=3, changed=False)
+
+            data = await GhibliService._refresh_endpoint("/films")
+
+            assert data == new
+            mock_cache.atouch_entry.assert_not_called()
+            assert mock_cache.aset_entry.call_args.args == ("ghibli:/films", new)
+            mock_versions.aupdate.assert_called_once_with("ghibli:/films", new)
+
+    @pytest.mark.asyncio
+    async def test_changes_bootstrap_waits_for_lock_owner(self):
+        """Test concurrent first /changes calls register the version only once"""
+        versions = [DatasetUpdate(version=0, changed=False)] * 2 + [
+            DatasetUpdate(version=1, changed=True)
+        ] * 2
+        with patch.object(
+            GhibliService, "_aget_endpoint_data", return_value=[{"id": "1"}]
+        ), patch("app.services.ghibli.cache", spec=RedisCache) as mock_cache, patch(
+            "app.services.ghibli.dataset_versions", spec=DatasetVersions
+        ) as mock_versions, patch(
+            "app.services.ghibli.settings.REDIS_LOCK_POLL_INTERVAL", 0
+        ):
+            mock_cache.aacquire_lock.return_value = None
+            mock_versions.achanges_since.side_effect = versions
+
+            changes = await GhibliService.aget_changes(UserRole.FILMS, "films")
+
+            assert changes["version"] == 1
+            mock_versions.aupdate.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_export_ndjson_yields_bounded_chunks(self):
+        """Test the export is produced in chunks and reports failed resources"""
+        datasets = {"/films": [{"id": str(i)} for i in range(5)]}
+
+        async def endpoint_data(endpoint):
+            if endpoint not in datasets:
+                raise HTTPException(status_code=503, detail="down")
+            return datasets[endpoint]
+
+        with patch.object(
+            GhibliService, "_aget_endpoint_data", side_effect=endpoint_data
+        ), patch.object(settings, "GHIBLI_EXPORT_CHUNK_SIZE", 2):
+            chunks = [
+                chunk async for chunk in GhibliService.export_ndjson(UserRole.ADMIN)
+            ]
+
+        assert [chunk.count(b"\n") for chunk in chunks[:3]] == [2, 2, 1]
+        assert b'{"resource":"people","error":"down"}\n' in chunks
+
+    def test_export_ndjson_checks_role_before_streaming(self):
+        """Test unauthorized roles fail before any byte is streamed"""
         with pytest.raises(HTTPException) as exc_info:
-            GhibliService.get_data_by_role("invalid_role")
+            GhibliService.export_ndjson("invalid_role")
 
         assert exc_info.value.status_code == 403
-        assert "not authorized" in str(exc_info.value.detail).lower()
+
+    @pytest.mark.asyncio
+    async def test_load_snapshots_into_cache_on_cold_start(self):
+        """Test cold start seeds missing cache keys from snapshots"""
+        snapshot_store.save("films", [{"id": "1"}])
+
+        with patch("app.services.ghibli.cache", spec=RedisCache) as mock_cache:
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entry.return_value = None
+
+            loaded = await GhibliService.load_snapshots_into_cache()
+
+            assert loaded == 1
+            key, data = mock_cache.aset_entry.call_args.args
+            assert key == "ghibli:/films"
+            assert data == [{"id": "1"}]
+
+    @pytest.mark.asyncio
+    async def test_aget_response_etag(self):
+        """Test response ETags come from stored dataset ETags plus query params"""
+        header = make_entry(None)
+        header.meta = {"etag": '"dataset"'}
+        with patch("app.services.ghibli.cache", spec=RedisCache) as mock_cache:
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_headers.return_value = {"ghibli:/films": header}
+
+            assert await GhibliService.aget_response_etag(UserRole.FILMS) == '"dataset"'
+            mock_cache.aget_headers.assert_called_once_with(["ghibli:/films"])
+            mock_cache.aget_many.assert_not_called()
+
+            paged = await GhibliService.aget_response_etag(UserRole.FILMS, limit=2)
+            assert paged not in (None, '"dataset"')
+            assert paged == await GhibliService.aget_response_etag(
+                UserRole.FILMS, limit=2
+            )
+
+            mock_cache.aget_headers.return_value = {}
+            assert await GhibliService.aget_response_etag(UserRole.FILMS) is None
+
+    @pytest.mark.asyncio
+    async def test_etag_of_stale_dataset_schedules_refresh(self):
+        """Test a stale dataset still validates (304) and is refreshed behind it"""
+        header = make_entry(None, soft_in=-1)
+        header.meta = {"etag": '"dataset"'}
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService, "_schedule_refresh"
+        ) as mock_schedule:
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_headers.return_value = {"ghibli:/films": header}
+
+            assert await GhibliService.aget_response_etag(UserRole.FILMS) == '"dataset"'
+
+            mock_schedule.assert_called_once_with("ghibli:/films", ANY, STALE_SERVED)
+
+            mock_schedule.reset_mock()
+            header.soft_expires_at = time.time() + 60
+            await GhibliService.aget_response_etag(UserRole.FILMS)
+            mock_schedule.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_aget_all_data_assembled_from_resource_keys(self):
+        """Test the admin view reads every resource in one batch, no upstream"""
+        entries = {
+            f"ghibli:{endpoint}": make_entry([{"id": endpoint}])
+            for endpoint in GhibliService.ROLE_ENDPOINTS.values()
+        }
+        with patch(
+            "app.services.ghibli.cache", spec=RedisCache
+        ) as mock_cache, patch.object(
+            GhibliService, "_afetch_conditional"
+        ) as mock_fetch:
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_entries.return_value = entries
+
+            data = await GhibliService.aget_all_data()
+
+            assert list(data) == ["films", "people", "locations", "species", "vehicles"]
+            assert data["people"] == [{"id": "/people"}]
+            mock_cache.aget_entries.assert_awaited_once_with(list(entries))
+            mock_cache.aget_entry.assert_not_called()
+            mock_fetch.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_aggregate_body_concatenates_resource_bodies(self):
+        """Test the admin body is stitched from per-resource bodies byte-exactly"""
+        datasets = {
+            endpoint.strip("/"): [{"id": endpoint, "title": "Ponyo"}]
+            for endpoint in GhibliService.ROLE_ENDPOINTS.values()
+        }
+        soft = time.time() + 60
+        with patch("app.services.ghibli.cache", spec=RedisCache) as mock_cache:
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_bodies.return_value = {
+                f"ghibli:/{name}": CachedBody(render_json(data), soft)
+                for name, data in datasets.items()
+            }
+
+            mock_cache.aget_headers.return_value = {}
+
+            body, encoding = await GhibliService.aget_response_body(
+                UserRole.ADMIN, encodings=["gzip"]
+            )
+
+            assert body == render_json(datasets)
+            assert encoding is None
+
+    @pytest.mark.asyncio
+    async def test_aggregate_compressed_variant_stored_and_served(self):
+        """Test the admin aggregate keeps a gzip variant per resource version"""
+        keys = [
+            f"ghibli:{endpoint}" for endpoint in GhibliService.ROLE_ENDPOINTS.values()
+        ]
+        datasets = {key.split("/", 1)[1]: [{"id": key}] for key in keys}
+        soft = time.time() + 60
+        headers = {}
+        for key in keys:
+            headers[key] = make_entry(None, soft_in=60)
+            headers[key].soft_expires_at = soft
+            headers[key].meta = {"etag": f'"{key}"'}
+        bodies = {
+            key: CachedBody(render_json(datasets[key.split("/", 1)[1]]), soft)
+            for key in keys
+        }
+        with patch("app.services.ghibli.cache", spec=RedisCache) as mock_cache:
+            mock_cache.is_available.return_value = True
+            mock_cache.aget_headers.return_value = headers
+            mock_cache.aget_bodies.return_value = bodies
+
+            assert await GhibliService._astore_aggregate_variants(keys)
+
+            aggregate_key, body, *_ = mock_cache.aset_bodies.call_args.args
+            assert aggregate_key.startswith("ghibli:aggregate:")
+            assert body == render_json(datasets)
+            assert mock_cache.aset_bodies.call_args.kwargs["identity"] is False
+
+            gzipped = CachedBody(b"gz", soft)
+            mock_cache.aget_body.side_effect = lambda key, encoding=None: (
+                gzipped if (key, encoding) == (aggregate_key, "gzip") else None
+            )
+            mock_cache.aget_bodies.reset_mock()
+            assert await GhibliService.aget_response_body(
+                UserRole.ADMIN, encodings=["gzip"]
+            ) == (b"gz", "gzip")
+            mock_cache.aget_bodies.assert_not_called()
+
+            # Un recurso cambió entre la cabecera y el cuerpo: no se guarda
+            mock_cache.aset_bodies.reset_mock()
+            bodies[keys[0]] = CachedBody(b"[]", soft + 1)
+            assert not await GhibliService._astore_aggregate_variants(keys)
+            mock_cache.aset_bodies.assert_not_called()
@@ -0,0 +1,112 @@
+import pytest
+
+from app.services.indexes import IdIndex, RelationGraph, SearchIndex
+
+
+class TestIdIndex:
+    """Tests for the per-dataset id indexes"""
+
+    def test_lookup_by_id(self):
+        """Test records are found by id and unknown ids return None"""
+        index = IdIndex()
+        records = [{"id": "a", "name": "Pazu"}, {"id": "b", "name": "Sheeta"}]
+
+        assert index.lookup("people", records, "b") == records[1]
+        assert index.lookup("people", records, "z") is None
+
+    def test_index_built_once_per_dataset_version(self):
+        """Test the index is reused until a different record list is loaded"""
+        index = IdIndex()
+        records = [{"id": "a"}]
+
+        first = index.get("people", records)
+        assert index.get("people", records) is first
+
+        reloaded = [{"id": "a"}, {"id": "b"}]
+        assert index.get("people", reloaded) is not first
+        assert "b" in index.get("people", reloaded)
+
+
+class TestSearchIndex:
+    """Tests for the inverted full-text index"""
+
+    @pytest.fixture
+    def index(self):
+        index = SearchIndex()
+        index.index_dataset(
+            "films",
+            [
+                {"id": "1", "title": "Castle in the Sky", "description": "Laputa"},
+                {"id": "2", "title": "Spirited Away", "description": "Chihiro"},
+            ],
+        )
+        index.index_dataset("people", [{"id": "p1", "name": "Pazu"}])
+        return index
+
+    def test_token_and_prefix_matching(self, index):
+        """Test exact tokens rank above prefix matches"""
+        results = index.search("castle", ["films"])
+        assert [r["id"] for r in results] == ["1"]
+        assert results[0]["label"] == "Castle in the Sky"
+
+        assert [r["id"] for r in index.search("spir aw", ["films"])] == ["2"]
+
+    def test_results_limited_to_visible_resources(self, index):
+        """Test resources outside the caller's role are not returned"""
+        assert index.search("pazu", ["films"]) == []
+        assert index.search("pazu", ["people"])[0]["id"] == "p1"
+
+    def test_incremental_reindex(self, index):
+        """Test changed and removed records are reflected after a refresh"""
+        index.index_dataset(
+            "films", [{"id": "1", "title": "Howl's Moving Castle", "description": ""}]
+        )
+
+        assert [r["id"] for r in index.search("howl", ["films"])] == ["1"]
+        assert index.search("laputa", ["films"]) == []
+        assert index.search("spirited", ["films"]) == []
+
+    def test_accents_are_normalized(self):
+        """Test accented text matches unaccented queries"""
+        index = SearchIndex()
+        index.index_dataset(
+            "films",
+            [{"id": "1", "title": "x", "original_title_romanised": "Tenkū no shiro"}],
+        )
+        assert index.search("tenku", ["films"])[0]["id"] == "1"
+
+
+class TestRelationGraph:
+    """Tests for the precomputed relationship graph"""
+
+    def test_neighbors_follow_links_in_both_directions(self):
+        """Test a film reaches people that link to it and vice versa"""
+        graph = RelationGraph()
+        graph.update(
+            "films",
+            [{"id": "f1", "people": ["https://ghibli.rest/people/"]}],
+        )
+        graph.update(
+            "people",
+            [
+                {"id": "p1", "films": ["https://ghibli.rest/films/f1"]},
+                {"id": "p2", "films": []},
+            ],
+        )
+
+        assert graph.neighbors(("films", "f1"), "people") == [("people", "p1")]
+        assert graph.neighbors(("people", "p1"), "films") == [("films", "f1")]
+        assert graph.neighbors(("people", "p2"), "films") == []
+
+    def test_update_replaces_previous_edges(self):
+        """Test reloading a dataset drops edges that no longer exist"""
+        graph = RelationGraph()
+        graph.update(
+            "people", [{"id": "p1", "films": ["https://ghibli.rest/films/f1"]}]
+        )
+        graph.update(
+            "people", [{"id": "p1", "films": ["https://ghibli.rest/films/f2"]}]
+        )
+
+        assert graph.neighbors(("films", "f1"), "people") == []
+        assert graph.neighbors(("films", "f2"), "people") == [("people", "p1")]
@@ -0,0 +1,46 @@
+import os
+
+from app.services.snapshot import SnapshotStore
+
+
+class TestSnapshotStore:
+    """Tests for the on-disk dataset snapshot store"""
+
+    def test_save_and_load_roundtrip(self, tmp_path):
+        """Test a saved dataset is read back with its metadata"""
+        store = SnapshotStore(str(tmp_path))
+        data = [{"id": "1", "title": "Castle in the Sky"}]
+
+        assert store.save("films", data) is True
+        snapshot = store.load("films")
+
+        assert snapshot.data == data
+        assert snapshot.name == "films"
+        assert snapshot.size == os.path.getsize(tmp_path / "films.snap")
+        assert snapshot.age >= 0
+
+    def test_save_leaves_no_temporary_files(self, tmp_path):
+        """Test atomic writes replace the target and clean up temp files"""
+        store = SnapshotStore(str(tmp_path))
+        store.save("films", [1])
+        store.save("films", [2])
+
+        assert os.listdir(tmp_path) == ["films.snap"]
+        assert store.load_data("films") == [2]
+
+    def test_missing_snapshot(self, tmp_path):
+        """Test loading an unknown dataset returns None"""
+        store = SnapshotStore(str(tmp_path / "missing"))
+
+        assert store.load("films") is None
+        assert store.status() == {}
+
+    def test_status_reports_each_snapshot(self, tmp_path):
+        """Test status lists age and size per dataset"""
+        store = SnapshotStore(str(tmp_path))
+        store.save("films", [])
+        store.save("people", [])
+
+        status = store.status()
+        assert set(status) == {"films", "people"}
+        assert status["films"]["size_bytes"] > 0
@@ -0,0 +1,82 @@
+from collections import defaultdict
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.versions import DatasetVersions
+
+
+@pytest.fixture
+def hashes():
+    """Back the version store with in-memory Redis hashes"""
+    store = defaultdict(dict)
+
+    def hincrby(key, name, amount=1):
+        store[key][name] = str(int(store[key].get(name, 0)) + amount)
+        return int(store[key][name])
+
+    with patch("app.services.versions.cache") as mock_cache:
+        mock_cache.ahgetall = AsyncMock(side_effect=lambda key: dict(store[key]))
+        mock_cache.ahincrby = AsyncMock(side_effect=hincrby)
+        mock_cache.ahset = AsyncMock(
+            side_effect=lambda key, mapping: store[key].update(mapping)
+        )
+        yield store
+
+
+class TestDatasetVersions:
+    """Tests for per-resource versions and per-record content hashes"""
+
+    key = "ghibli:/films"
+
+    @pytest.mark.asyncio
+    async def test_first_load_adds_every_record(self, hashes):
+        """Test the first load becomes version 1 with every record added"""
+        versions = DatasetVersions()
+        update = await versions.aupdate(self.key, [{"id": "1"}, {"id": "2"}])
+
+        assert update.version == 1
+        assert update.changed
+        assert update.added == ["1", "2"]
+
+    @pytest.mark.asyncio
+    async def test_unchanged_load_writes_nothing(self, hashes):
+        """Test identical content keeps the version and skips Redis writes"""
+        versions = DatasetVersions()
+        await versions.aupdate(self.key, [{"id": "1"}])
+        before = dict(hashes["versions:" + self.key])
+
+        update = await versions.aupdate(self.key, [{"id": "1"}])
+
+        assert not update.changed
+        assert update.version == 1
+        assert hashes["versions:" + self.key] == before
+
+    @pytest.mark.asyncio
+    async def test_changes_since_version(self, hashes):
+        """Test added, modified and removed records are reported after a version"""
+        versions = DatasetVersions()
+        await versions.aupdate(self.key, [{"id": "1", "t": "a"}, {"id": "2"}])
+        update = await versions.aupdate(self.key, [{"id": "1", "t": "b"}, {"id": "3"}])
+
+        assert update.version == 2
+        changes = await versions.achanges_since(self.key, 1)
+        assert changes.added == ["3"]
+        assert changes.modified == ["1"]
+        assert changes.removed == ["2"]
+
+        assert (await versions.achanges_since(self.key, 2)).added == []
+        assert (await versions.achanges_since(self.key, 0)).removed == []
+
+    @pytest.mark.asyncio
+    async def test_readded_record_is_reported_as_added(self, hashes):
+        """Test a record removed and restored later shows up as added"""
+        versions = DatasetVersions()
+        await versions.aupdate(self.key, [{"id": "1"}])
+        await versions.aupdate(self.key, [])
+        await versions.aupdate(self.key, [{"id": "1"}])
+
+        changes = await versions.achanges_since(self.key, 2)
+        assert changes.version == 3
+        assert changes.added == ["1"]
+        assert changes.removed == []